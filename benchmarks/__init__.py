@@ -0,0 +1,5 @@
+"""
+Benchmarks for the gocd commands against a local fake Go server.
+
+Run with ``python -m benchmarks.run``, see ``--help`` for the options.
+"""
@@ -0,0 +1,45 @@
+"""
+Runs one gocd command and reports how long it took and its peak memory.
+
+Each command is run in a process of its own so the peak RSS is the
+command's and not the benchmark harness'. Usage::
+
+    python -m benchmarks.client <server url> <command> <subcommand> [args...]
+
+The report is a JSON object on stdout, the command's own output is thrown
+away.
+"""
+import json
+import os
+import resource
+import sys
+import time
+
+from gocd_cli.server import Server
+from gocd_cli.utils import run_command
+
+
+def peak_rss():
+    """The peak resident set size of this process in bytes"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, OS X bytes
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def main(argv):
+    url, args = argv[0], argv[1:]
+    report = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+
+    server = Server(url)
+    started_at = time.time()
+    exit_code, _ = run_command(server, *args)
+    wall_time = time.time() - started_at
+    server.close()
+
+    json.dump(dict(exit_code=exit_code, wall_time=wall_time, peak_rss=peak_rss()), report)
+    report.write('\n')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,378 @@
+"""
+A stand-in for a Go server with any number of synthetic pipelines.
+
+Every response is generated from the pipeline's position in the list, so
+a server with 10k pipelines costs no more to start than one with 10. The
+pipelines are a mix of states:
+
+* every 50th pipeline is paused
+* every 10th pipeline has failed
+* every 25th pipeline has been building for longer than check's warning time
+* the rest have passed
+
+Triggering a pipeline starts a run that's building for `run_time` seconds
+and then passes.
+
+Every request and the bytes going each way are counted in `stats`.
+"""
+import json
+import re
+import socket
+import threading
+import time
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+GROUP_SIZE = 50
+PAGE_SIZE = 10  # Pipeline instances per page of history, same as Go
+
+PIPELINE_PATH = re.compile(r'^/go/api/pipelines/(?P<name>[^/]+)/(?P<action>[a-zA-Z]+)'
+                           r'(?:/(?P<number>\d+))?$')
+CONSOLE_PATH = re.compile(r'^/go/files/(?P<name>[^/]+)/(?P<counter>\d+)/[^/]+/\d+/[^/]+/'
+                          r'cruise-output/console.log$')
+
+
+def pipeline_name(index):
+    return 'pipeline-{0:05d}'.format(index)
+
+
+class FakeGoHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        # Like Go's own Jetty, don't hold back the tail of a response
+        # waiting for the client to ACK the rest (Nagle's algorithm).
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        BaseHTTPRequestHandler.setup(self)
+
+    def do_GET(self):
+        self._respond(*self.server.get(self.path.split('?')[0], self.headers))
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self._respond(*self.server.post(self.path.split('?')[0]))
+
+    def _respond(self, status, body, content_type='application/json'):
+        if not isinstance(body, str):
+            body = json.dumps(body)
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        head = [
+            '{0} {1} {2}'.format(self.protocol_version, status, self.responses[status][0]),
+            'Content-Type: {0}'.format(content_type),
+            'Content-Length: {0}'.format(len(body)),
+        ]
+        head = '\r\n'.join(head) + '\r\n\r\n'
+        self.wfile.write(head + body)
+
+        self.server.count(
+            received=len(self.raw_requestline) + len(str(self.headers)) +
+            int(self.headers.get('Content-Length') or 0),
+            sent=len(head) + len(body),
+        )
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeGoServer(ThreadingMixIn, HTTPServer):
+    """A fake Go server listening on localhost
+
+    Args:
+      pipelines (int): how many pipelines there are. Default: 10
+      latency (float): seconds to wait before answering every request.
+        Default: 0
+      history_size (int): how many times each pipeline has run. Default: 100
+      stages (int): stages per pipeline. Default: 3
+      jobs (int): jobs per stage. Default: 2
+      console_size (int): bytes in each job's console log. Default: 256 KiB
+      run_time (float): how many seconds a triggered pipeline runs for.
+        Default: 5
+    """
+    daemon_threads = True
+    request_queue_size = 1024  # Clients with many connections at once
+
+    def __init__(self, pipelines=10, latency=0, history_size=100, stages=3, jobs=2,
+                 console_size=256 * 1024, run_time=5):
+        HTTPServer.__init__(self, ('127.0.0.1', 0), FakeGoHandler)
+        self.pipelines = pipelines
+        self.latency = latency
+        self.history_size = history_size
+        self.stages = stages
+        self.jobs = jobs
+        self.run_time = run_time
+        self.console = self._console_log(console_size)
+
+        self.triggered = {}  # pipeline name: [started at]
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self.reset_stats()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}/'.format(self.server_address[1])
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,))
+        self._thread.daemon = True
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = dict(requests=0, bytes_received=0, bytes_sent=0)
+
+    def count(self, received, sent):
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['bytes_received'] += received
+            self.stats['bytes_sent'] += sent
+
+    def state(self, index):
+        """The state of the latest run of the pipeline at `index`"""
+        if index % 50 == 49:
+            return 'paused'
+        elif index % 10 == 3:
+            return 'failed'
+        elif index % 25 == 7:
+            return 'building'
+
+        return 'passed'
+
+    def find(self, state):
+        """Returns the name of the first pipeline in `state`"""
+        return next(
+            pipeline_name(index) for index in range(self.pipelines)
+            if self.state(index) == state
+        )
+
+    def get(self, path, headers):
+        if path == '/go/api/config/pipeline_groups':
+            return 200, self._pipeline_groups()
+        elif path == '/go/api/dashboard':
+            return 200, self._dashboard(), 'application/vnd.go.cd.v1+json'
+
+        match = CONSOLE_PATH.match(path)
+        if match:
+            return self._console(headers.get('Range'))
+
+        match = PIPELINE_PATH.match(path)
+        index = self._index(match.group('name')) if match else None
+        if index is None:
+            return 404, 'Not found', 'text/plain'
+
+        action, number = match.group('action'), match.group('number')
+        if action == 'status':
+            return 200, self._status(index)
+        elif action == 'history':
+            return 200, self._history(index, int(number or 0))
+        elif action == 'instance' and number:
+            counter = int(number)
+            if 0 < counter <= self._latest_counter(index):
+                return 200, self._instance(index, counter)
+
+        return 404, 'Not found', 'text/plain'
+
+    def post(self, path):
+        match = PIPELINE_PATH.match(path)
+        index = self._index(match.group('name')) if match else None
+        if index is None:
+            return 404, 'Not found', 'text/plain'
+
+        action = match.group('action')
+        if action == 'schedule':
+            with self._lock:
+                self.triggered.setdefault(pipeline_name(index), []).append(time.time())
+            return 202, 'Request to schedule pipeline accepted', 'text/plain'
+        elif action in ('releaseLock', 'pause', 'unpause'):
+            return 200, 'OK', 'text/plain'
+
+        return 404, 'Not found', 'text/plain'
+
+    def _index(self, name):
+        if not name.startswith('pipeline-'):
+            return None
+
+        try:
+            index = int(name[len('pipeline-'):])
+        except ValueError:
+            return None
+
+        return index if index < self.pipelines else None
+
+    def _latest_counter(self, index):
+        return self.history_size + len(self.triggered.get(pipeline_name(index), []))
+
+    def _pipeline_groups(self):
+        return [
+            dict(
+                name='group-{0}'.format(group),
+                pipelines=[
+                    dict(name=pipeline_name(index), label='${COUNT}', materials=[],
+                         stages=[dict(name='stage-{0}'.format(i)) for i in range(self.stages)])
+                    for index in range(start, min(start + GROUP_SIZE, self.pipelines))
+                ],
+            )
+            for group, start in enumerate(range(0, self.pipelines, GROUP_SIZE))
+        ]
+
+    def _status(self, index):
+        paused = self.state(index) == 'paused'
+        return dict(
+            paused=paused,
+            pausedCause='Benchmarking' if paused else '',
+            pausedBy='admin' if paused else '',
+            locked=False,
+            schedulable=not paused,
+        )
+
+    def _history(self, index, offset):
+        latest = self._latest_counter(index)
+        counters = range(latest - offset, max(latest - offset - PAGE_SIZE, 0), -1)
+
+        return dict(
+            pipelines=[self._instance(index, counter) for counter in counters],
+            pagination=dict(offset=offset, total=latest, page_size=PAGE_SIZE),
+        )
+
+    def _instance(self, index, counter):
+        name = pipeline_name(index)
+        now = time.time()
+        triggered = self.triggered.get(name, [])
+        building = False
+
+        if counter > self.history_size:
+            scheduled_at = triggered[counter - self.history_size - 1]
+            building = now - scheduled_at < self.run_time
+            result = 'Passed'
+        elif counter == self.history_size and not triggered:
+            state = self.state(index)
+            building = state == 'building'
+            result = 'Failed' if state == 'failed' else 'Passed'
+            scheduled_at = now - 45 * 60 if building else now - 60 * 60
+        else:
+            result = 'Passed'
+            scheduled_at = now - (self.history_size - counter + 1) * 60 * 60
+
+        stages = []
+        for stage in range(self.stages):
+            # A building pipeline is in its first stage, the others are
+            # still to be scheduled
+            scheduled = not building or stage == 0
+            stage_result = 'Unknown' if building else (
+                result if stage == self.stages - 1 else 'Passed')
+            stages.append(dict(
+                id=index * 1000 + counter * 10 + stage,
+                name='stage-{0}'.format(stage),
+                counter='1',
+                scheduled=scheduled,
+                approval_type='success',
+                approved_by='changes',
+                result=stage_result,
+                rerun_of_counter=None,
+                operate_permission=True,
+                can_run=not building,
+                jobs=[
+                    dict(
+                        id=index * 10000 + counter * 100 + stage * 10 + job,
+                        name='job-{0}'.format(job),
+                        state='Building' if building else 'Completed',
+                        result='Unknown' if building else stage_result,
+                        scheduled_date=int(scheduled_at * 1000),
+                    )
+                    for job in range(self.jobs)
+                ] if scheduled else [],
+            ))
+
+        return dict(
+            id=index * 1000 + counter,
+            name=name,
+            counter=counter,
+            label=str(counter),
+            natural_order=float(counter),
+            can_run=not building,
+            comment=None,
+            preparing_to_schedule=False,
+            build_cause=dict(
+                approver='',
+                trigger_forced=counter > self.history_size,
+                trigger_message='modified by dev <dev@example.com>',
+                material_revisions=[dict(
+                    changed=True,
+                    material=dict(description='URL: https://git.example.com/{0}.git'.format(name),
+                                  fingerprint='{0:040x}'.format(index), type='Git', id=index),
+                    modifications=[dict(
+                        email_address=None,
+                        id=counter,
+                        modified_time=int(scheduled_at * 1000),
+                        user_name='dev <dev@example.com>',
+                        comment='Change number {0} of {1}'.format(counter, name),
+                        revision='{0:040x}'.format(index * 100000 + counter),
+                    )],
+                )],
+            ),
+            stages=stages,
+        )
+
+    def _dashboard(self):
+        groups = []
+        for group in self._pipeline_groups():
+            pipelines = []
+            for pipeline in group['pipelines']:
+                index = self._index(pipeline['name'])
+                instance = self._instance(index, self._latest_counter(index))
+                pipelines.append({
+                    'name': pipeline['name'],
+                    'locked': False,
+                    'pause_info': dict(paused=self.state(index) == 'paused',
+                                       paused_by=None, pause_reason=None),
+                    '_embedded': {'instances': [{
+                        '_links': {'self': {'href': '{0}go/api/pipelines/{1}/instance/{2}'.format(
+                            self.url, pipeline['name'], instance['counter'],
+                        )}},
+                        'label': instance['label'],
+                        'schedule_at': instance['stages'][0]['jobs'][0]['scheduled_date'],
+                        'triggered_by': 'changes',
+                        '_embedded': {'stages': [
+                            dict(name=stage['name'], counter=stage['counter'],
+                                 status='Building' if stage['scheduled'] and any(
+                                     job['state'] != 'Completed' for job in stage['jobs']
+                                 ) else stage['result'],
+                                 approved_by=stage['approved_by'])
+                            for stage in instance['stages']
+                        ]},
+                    }]},
+                })
+
+            groups.append(dict(name=group['name'], _embedded=dict(pipelines=pipelines)))
+
+        return {'_embedded': {'pipeline_groups': groups}}
+
+    def _console(self, byte_range):
+        if byte_range:
+            offset = int(byte_range.split('=', 1)[1].split('-', 1)[0])
+            if offset >= len(self.console):
+                return 416, '', 'text/plain'
+
+            return 206, self.console[offset:], 'text/plain'
+
+        return 200, self.console, 'text/plain'
+
+    def _console_log(self, size):
+        lines = []
+        length = 0
+        while length < size:
+            line = '[go] {0:08d} Running task: make test OK, everything is fine\n'.format(
+                len(lines))
+            lines.append(line)
+            length += len(line)
+
+        return ''.join(lines)[:size]
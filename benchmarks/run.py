@@ -0,0 +1,220 @@
+"""
+Benchmarks the hot paths of the gocd commands against a fake Go server.
+
+Every scenario is run against a fresh :class:`benchmarks.fake_server.FakeGoServer`
+for each pipeline count and reports the wall time, the number of requests,
+the bytes sent and received and the peak RSS of the gocd process.
+
+Usage::
+
+    python -m benchmarks.run [--pipelines=10,1000,10000] [--latency=0.01]
+                             [--scenarios=check-all,list] [--save=results.json]
+                             [--compare=results.json]
+
+With ``--compare`` the results are checked against an earlier ``--save``
+and it exits 1 if any scenario makes more requests, transfers more bytes
+or is slower/bigger by more than ``--tolerance``.
+"""
+from __future__ import print_function
+
+import json
+import os
+import subprocess
+import sys
+from collections import OrderedDict
+from optparse import OptionParser
+
+from benchmarks.fake_server import FakeGoServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = OrderedDict((
+    ('check-all', lambda fake, options: [
+        'pipeline', 'check-all', '--concurrency={0}'.format(options.concurrency),
+    ]),
+    ('list', lambda fake, options: [
+        'pipeline', 'list', '--concurrency={0}'.format(options.concurrency),
+    ]),
+    ('trigger', lambda fake, options: [
+        'pipeline', 'trigger', fake.find('passed'), '--wait-until-finished=true',
+    ]),
+    ('retrigger-failed', lambda fake, options: [
+        'pipeline', 'retrigger-failed', fake.find('failed'),
+    ]),
+))
+
+COLUMNS = (
+    ('scenario', '{0:<18}', lambda result: result['scenario']),
+    ('pipelines', '{0:>9}', lambda result: result['pipelines']),
+    ('exit', '{0:>4}', lambda result: result['exit_code']),
+    ('wall (s)', '{0:>9}', lambda result: '{0:.3f}'.format(result['wall_time'])),
+    ('requests', '{0:>9}', lambda result: result['requests']),
+    ('sent', '{0:>10}', lambda result: format_bytes(result['bytes_sent'])),
+    ('received', '{0:>10}', lambda result: format_bytes(result['bytes_received'])),
+    ('peak RSS', '{0:>10}', lambda result: format_bytes(result['peak_rss'])),
+)
+
+# Counted exactly, any increase is a regression
+EXACT_METRICS = ('requests', 'bytes_sent', 'bytes_received')
+# Noisy, only an increase larger than the tolerance is a regression
+MEASURED_METRICS = ('wall_time', 'peak_rss')
+
+
+def format_bytes(size):
+    for unit in ('B', 'KiB', 'MiB'):
+        if size < 1024:
+            return '{0:.0f} {1}'.format(size, unit) if unit == 'B' else \
+                '{0:.1f} {1}'.format(size, unit)
+        size /= 1024.0
+
+    return '{0:.1f} GiB'.format(size)
+
+
+def run_scenario(fake, args):
+    """Runs the gocd command `args` against the `fake` server in a new process
+
+    Returns:
+      dict: exit_code, wall_time, requests, bytes_sent, bytes_received and
+        peak_rss, bytes are counted from the gocd process' point of view.
+    """
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(
+        filter(None, (ROOT, os.environ.get('PYTHONPATH')))
+    ))
+    fake.reset_stats()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'benchmarks.client', fake.url] + list(args),
+        stdout=subprocess.PIPE,
+        cwd=ROOT,
+        env=env,
+    )
+    stdout, _ = process.communicate()
+    if process.returncode != 0:
+        raise RuntimeError('Running "{0}" failed with exit code {1}'.format(
+            ' '.join(args), process.returncode))
+
+    result = json.loads(stdout.strip().splitlines()[-1])
+    result.update(
+        requests=fake.stats['requests'],
+        bytes_sent=fake.stats['bytes_received'],
+        bytes_received=fake.stats['bytes_sent'],
+    )
+
+    return result
+
+
+def run(options):
+    """Runs every scenario for every pipeline count in `options`
+
+    Yields:
+      dict: the fastest of ``options.repeat`` runs of each scenario
+    """
+    for pipelines in options.pipelines:
+        for scenario in options.scenarios:
+            runs = []
+            for _ in range(options.repeat):
+                fake = FakeGoServer(
+                    pipelines=pipelines,
+                    latency=options.latency,
+                    history_size=options.history_size,
+                    stages=options.stages,
+                    jobs=options.jobs,
+                    console_size=options.console_size,
+                    run_time=options.run_time,
+                ).start()
+                try:
+                    runs.append(run_scenario(fake, SCENARIOS[scenario](fake, options)))
+                finally:
+                    fake.stop()
+
+            result = min(runs, key=lambda result: result['wall_time'])
+            result.update(scenario=scenario, pipelines=pipelines)
+            yield result
+
+
+def compare(results, baseline, tolerance):
+    """Returns a list of messages for every metric that regressed from the `baseline`"""
+    baseline = dict(((result['scenario'], result['pipelines']), result) for result in baseline)
+    regressions = []
+
+    for result in results:
+        before = baseline.get((result['scenario'], result['pipelines']))
+        if not before:
+            continue
+
+        for metric in EXACT_METRICS + MEASURED_METRICS:
+            allowed = before[metric] * (1 + tolerance if metric in MEASURED_METRICS else 1)
+            if result[metric] > allowed:
+                regressions.append('{0} with {1} pipelines: {2} went from {3} to {4}'.format(
+                    result['scenario'], result['pipelines'], metric, before[metric],
+                    result[metric],
+                ))
+
+    return regressions
+
+
+def parse_args(argv):
+    parser = OptionParser(usage='python -m benchmarks.run [options]')
+    parser.add_option('--pipelines', default='10,1000,10000',
+                      help='comma separated pipeline counts. Default: %default')
+    parser.add_option('--scenarios', default=','.join(SCENARIOS),
+                      help='comma separated scenarios to run. Default: %default')
+    parser.add_option('--latency', type='float', default=0.0,
+                      help='seconds the fake server waits before every response. '
+                           'Default: %default')
+    parser.add_option('--concurrency', type='int', default=1,
+                      help='the concurrency flag for check-all and list. Default: %default')
+    parser.add_option('--history-size', type='int', default=100,
+                      help='runs in every pipeline\'s history. Default: %default')
+    parser.add_option('--stages', type='int', default=3,
+                      help='stages per pipeline. Default: %default')
+    parser.add_option('--jobs', type='int', default=2, help='jobs per stage. Default: %default')
+    parser.add_option('--console-size', type='int', default=256 * 1024,
+                      help='bytes in every job\'s console log. Default: %default')
+    parser.add_option('--run-time', type='float', default=5,
+                      help='seconds a triggered pipeline runs for. Default: %default')
+    parser.add_option('--repeat', type='int', default=1,
+                      help='runs of each scenario, the fastest is reported. Default: %default')
+    parser.add_option('--save', help='write the results as JSON to this file')
+    parser.add_option('--compare', help='compare with results saved earlier')
+    parser.add_option('--tolerance', type='float', default=0.25,
+                      help='allowed relative increase in wall time and peak RSS when '
+                           'comparing. Default: %default')
+
+    options, _ = parser.parse_args(argv)
+    options.pipelines = [int(count) for count in options.pipelines.split(',')]
+    options.scenarios = options.scenarios.split(',')
+    for scenario in options.scenarios:
+        if scenario not in SCENARIOS:
+            parser.error('unknown scenario "{0}", choose from: {1}'.format(
+                scenario, ', '.join(SCENARIOS)))
+
+    return options
+
+
+def main(argv):
+    options = parse_args(argv)
+
+    print(' '.join(fmt.format(name) for name, fmt, _ in COLUMNS))
+    results = []
+    for result in run(options):
+        results.append(result)
+        print(' '.join(fmt.format(value(result)) for _, fmt, value in COLUMNS))
+        sys.stdout.flush()
+
+    if options.save:
+        with open(options.save, 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+    if options.compare:
+        with open(options.compare) as fp:
+            regressions = compare(results, json.load(fp), options.tolerance)
+
+        if regressions:
+            print('\nRegressions:\n{0}'.format('\n'.join(regressions)))
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
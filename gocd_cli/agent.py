@@ -0,0 +1,183 @@
+"""
+An agent that keeps decrypted settings in memory, much like ssh-agent
+keeps decrypted keys.
+
+The first gocd process to decrypt a ``*_encrypted`` setting hands the
+plaintext to the agent, and later processes ask the agent instead of
+importing the encryption module and decrypting it again. Every secret is
+forgotten `ttl` seconds after it was stored.
+
+Secrets are stored under a hash of the encryption module and the
+ciphertext, so only a process that has read the ciphertext from the
+settings can get the plaintext, and the socket is only accessible to the
+user that started the agent.
+
+The protocol is one JSON object per line and connection. The client sends
+one of ``{"get": key}``, ``{"put": key, "value": plaintext}``,
+``{"status": true}`` or ``{"stop": true}`` and the agent answers with one
+JSON object.
+"""
+import hashlib
+import json
+import os
+import socket
+import SocketServer
+import threading
+import time
+
+from gocd_cli.daemon import UnixSocketServer, connect, send
+from gocd_cli.utils import expand_user
+
+DEFAULT_SOCKET = '~/.gocd/agent.sock'
+#: Seconds to wait for the agent before decrypting without it
+TIMEOUT = 2
+
+
+def socket_path(path=None):
+    """Returns the path of the agent socket
+
+    Uses `path` when given, then the environment variable
+    ``GOCD_AGENT_SOCKET`` and lastly `DEFAULT_SOCKET`. An empty
+    ``GOCD_AGENT_SOCKET`` turns the agent off and then None is returned.
+    """
+    if path:
+        return expand_user(path)
+
+    path = os.environ.get('GOCD_AGENT_SOCKET', DEFAULT_SOCKET)
+    return expand_user(path) if path else None
+
+
+def secret_key(encryption_module, ciphertext):
+    """The key a secret is stored under in the agent"""
+    return hashlib.sha256('{0}\n{1}'.format(encryption_module, ciphertext)).hexdigest()
+
+
+def request(message, path=None, timeout=None):
+    """Sends `message` to the agent and returns its answer
+
+    Args:
+      message (dict): the message to send
+      path (str): the agent socket. Default: see :func:`socket_path`
+      timeout (float): seconds to wait for the agent. Default: `TIMEOUT`
+
+    Returns:
+      dict: the answer or None when no agent is running, or it couldn't
+        be talked to in time.
+    """
+    path = socket_path(path)
+    if not path:
+        return None
+
+    try:
+        sock = connect(path, TIMEOUT if timeout is None else timeout)
+        if sock is None:
+            return None
+
+        try:
+            return next(send(sock, message), None)
+        finally:
+            sock.close()
+    except (socket.error, ValueError):  # Includes socket.timeout
+        return None
+
+
+def get_or_decrypt(encryption_module, ciphertext, decrypt, path=None):
+    """Returns the plaintext for `ciphertext` from the agent, or decrypts
+    it with `decrypt` and hands it to the agent when it doesn't have it.
+
+    Args:
+      encryption_module (str): the name of the encryption module
+      ciphertext (str): the value to decrypt
+      decrypt: a function that takes no arguments and returns the plaintext
+      path (str): the agent socket. Default: see :func:`socket_path`
+
+    Returns:
+      str: the plaintext
+    """
+    key = secret_key(encryption_module, ciphertext)
+    answer = request(dict(get=key), path)
+    if answer and answer.get('value') is not None:
+        return answer['value']
+
+    plaintext = decrypt()
+    if answer is not None:  # An agent is running, but didn't have it
+        request(dict(put=key, value=plaintext), path)
+
+    return plaintext
+
+
+class AgentRequestHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:  # Someone checking whether the agent is running
+            return
+
+        message = json.loads(line)
+        if 'get' in message:
+            answer = dict(value=self.server.get(message['get']))
+        elif 'put' in message:
+            self.server.put(message['put'], message['value'])
+            answer = dict(ok=True)
+        elif message.get('status'):
+            answer = self.server.status()
+        elif message.get('stop'):
+            answer = dict(ok=True)
+            threading.Thread(target=self.server.shutdown).start()
+        else:
+            answer = dict(error='Unknown message')
+
+        self.wfile.write('{0}\n'.format(json.dumps(answer)))
+
+
+class AgentServer(UnixSocketServer):
+    """Keeps secrets in memory and serves them on a Unix socket
+
+    Args:
+      path (str): where to create the socket, any stale socket is replaced
+      ttl (float): how many seconds a secret is kept after it was stored,
+        0 means until the agent stops. Default: 3600
+    """
+    def __init__(self, path, ttl=3600):
+        self.ttl = ttl
+        self.started_at = time.time()
+        self._secrets = {}  # key: (value, expires_at)
+        self._lock = threading.Lock()
+
+        UnixSocketServer.__init__(self, path, AgentRequestHandler)
+
+    def serve_forever(self, poll_interval=0.5):
+        try:
+            UnixSocketServer.serve_forever(self, poll_interval)
+        finally:
+            self.server_close()
+            with self._lock:
+                self._secrets.clear()
+
+    def get(self, key):
+        with self._lock:
+            value, expires_at = self._secrets.get(key, (None, None))
+            if expires_at and expires_at <= time.time():
+                del self._secrets[key]
+                return None
+
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._secrets[key] = (value, time.time() + self.ttl if self.ttl else None)
+
+    def status(self):
+        now = time.time()
+        with self._lock:
+            for key, (_, expires_at) in self._secrets.items():
+                if expires_at and expires_at <= now:
+                    del self._secrets[key]
+
+            secrets = len(self._secrets)
+
+        return dict(
+            pid=os.getpid(),
+            uptime=int(now - self.started_at),
+            secrets=secrets,
+            ttl=self.ttl,
+        )
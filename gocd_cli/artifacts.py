@@ -0,0 +1,243 @@
+"""
+Lists and downloads the artifacts of a job.
+
+Files are streamed to disk in chunks. Until a download is complete it's
+kept next to its destination with a ``.part`` suffix. An interrupted
+download, in this or an earlier run, continues from where it stopped
+with a range request.
+
+Go stores the md5 of every artifact in ``cruise-output/md5.checksum``.
+A downloaded file is checked against it, and a file that's already on
+disk with the right md5 isn't downloaded again.
+"""
+import errno
+import hashlib
+import httplib
+import os
+import socket
+import time
+from urllib import quote
+from urllib2 import HTTPError
+
+from gocd_cli.retry import backoff_intervals
+
+ARTIFACTS_PATH = 'go/files/{pipeline}/{counter}/{stage}/{stage_counter}/{job}'
+CHECKSUMS_PATH = 'cruise-output/md5.checksum'
+CHUNK_SIZE = 64 * 1024  # bytes
+
+
+class ChecksumMismatch(Exception):
+    """The md5 of a downloaded file isn't what Go has stored for it"""
+
+
+class UnsafePath(Exception):
+    """An artifact path that would be written outside the destination"""
+
+
+def artifacts_path(pipeline, counter, stage, stage_counter, job):
+    return ARTIFACTS_PATH.format(
+        pipeline=pipeline,
+        counter=counter,
+        stage=stage,
+        stage_counter=stage_counter,
+        job=job,
+    )
+
+
+def file_path(base_path, path):
+    """The path on the Go server of the artifact `path` of a job"""
+    return '{0}/{1}'.format(base_path, quote(path))
+
+
+def destination_path(destination, path):
+    """Where the artifact `path` of a job is written inside the directory
+    `destination`
+
+    Raises:
+      UnsafePath: when `path` is absolute or its ``..`` parts leave
+        `destination`
+    """
+    destination = os.path.abspath(destination)
+    target = os.path.normpath(os.path.join(destination, *path.split('/')))
+    if path.startswith('/') or not target.startswith(os.path.join(destination, '')):
+        raise UnsafePath('"{0}" is outside of the destination'.format(path))
+
+    return target
+
+
+def list_files(nodes, prefix=''):
+    """Flattens the tree of an artifact listing into the paths of its files
+
+    Args:
+      nodes (list): the listing as returned by `gocd.api.Artifact.list`
+
+    Returns:
+      list: the paths relative to the job's artifacts, e.g. ``dist/app.jar``
+    """
+    paths = []
+    for node in nodes:
+        path = '{0}{1}'.format(prefix, node['name'])
+        if node.get('type') == 'folder':
+            paths.extend(list_files(node.get('files') or [], path + '/'))
+        else:
+            paths.append(path)
+
+    return paths
+
+
+def select_files(paths, selected):
+    """The `paths` that are one of, or in a directory in, `selected`"""
+    selected = [path.strip('/') for path in selected]
+    return [
+        path for path in paths
+        if any(path == prefix or path.startswith(prefix + '/') for prefix in selected)
+    ]
+
+
+def parse_checksums(text):
+    """Parses the ``md5.checksum`` file Go stores for every job
+
+    It's a Java properties file of artifact path to its md5.
+
+    Returns:
+      dict: path to md5 hex digest
+    """
+    checksums = {}
+    for line in (text or '').splitlines():
+        line = line.strip()
+        if not line or line[0] in '#!':
+            continue
+
+        key, value = _split_property(line)
+        checksums[key] = value.strip().lower()
+
+    return checksums
+
+
+def _split_property(line):
+    key = []
+    characters = iter(line)
+    for character in characters:
+        if character == '\\':
+            key.append(next(characters, ''))
+        elif character in '=:':
+            break
+        else:
+            key.append(character)
+
+    return ''.join(key).strip(), ''.join(characters)
+
+
+def fetch_checksums(server, base_path):
+    """Returns the md5 of every artifact of the job at `base_path`, or an
+    empty dict when Go hasn't stored any"""
+    try:
+        response = server.request('{0}/{1}'.format(base_path, CHECKSUMS_PATH))
+    except HTTPError as exc:
+        if exc.code == 404:
+            return {}
+        raise
+
+    try:
+        return parse_checksums(response.read())
+    finally:
+        response.close()
+
+
+def file_md5(path, chunk_size=CHUNK_SIZE):
+    """Returns the md5 of the file at `path`, or None when it doesn't exist"""
+    digest = hashlib.md5()
+    try:
+        with open(path, 'rb') as source:
+            for chunk in iter(lambda: source.read(chunk_size), ''):
+                digest.update(chunk)
+    except IOError as exc:
+        if exc.errno == errno.ENOENT:
+            return None
+        raise
+
+    return digest.hexdigest()
+
+
+def download(server, path, destination, md5=None, retries=3, chunk_size=CHUNK_SIZE):
+    """Downloads the file at `path` on the Go server to `destination`
+
+    Args:
+      server: A `gocd.Server` instance
+      path (str): The path of the file on the Go server
+      destination (str): Where to store the file, its directory is created
+        when missing
+      md5 (str): The expected md5 of the file. When given and the file at
+        `destination` already has it, it's not downloaded again
+      retries (int): How many times an interrupted download is continued.
+        Default: 3
+      chunk_size (int): The max number of bytes held in memory
+
+    Returns:
+      str: unchanged, downloaded or resumed when continuing an earlier
+        interrupted download
+
+    Raises:
+      ChecksumMismatch: when the downloaded file doesn't have `md5`, the
+        partial file is removed so the next try starts over
+      HTTPError: when the Go server fails to return the file
+    """
+    if md5 and file_md5(destination, chunk_size) == md5:
+        return 'unchanged'
+
+    directory = os.path.dirname(destination)
+    if directory:
+        try:
+            os.makedirs(directory)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+
+    partial = destination + '.part'
+    resumed = os.path.exists(partial)
+    intervals = backoff_intervals()
+    while True:
+        try:
+            _download_to(server, path, partial, chunk_size)
+            break
+        except (socket.error, httplib.HTTPException):
+            if retries <= 0:
+                raise
+
+            retries -= 1
+            resumed = True
+            time.sleep(next(intervals))
+
+    if md5:
+        actual = file_md5(partial, chunk_size)
+        if actual != md5:
+            os.remove(partial)
+            raise ChecksumMismatch('expected md5 {0} but got {1}'.format(md5, actual))
+
+    os.rename(partial, destination)
+    return 'resumed' if resumed else 'downloaded'
+
+
+def _download_to(server, path, partial, chunk_size):
+    """Downloads the rest of the file at `path` into the file `partial`"""
+    try:
+        offset = os.path.getsize(partial)
+    except OSError:
+        offset = 0
+
+    headers = {'Range': 'bytes={0}-'.format(offset)} if offset else None
+    try:
+        response = server.request(path, headers=headers)
+    except HTTPError as exc:
+        if exc.code == 416:  # The partial file is already complete
+            exc.close()
+            return
+        raise
+
+    try:
+        # Without a range response the whole file is sent again
+        with open(partial, 'ab' if response.code == 206 else 'wb') as out:
+            for chunk in iter(lambda: response.read(chunk_size), ''):
+                out.write(chunk)
+    finally:
+        response.close()
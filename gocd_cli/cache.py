@@ -0,0 +1,277 @@
+import errno
+import fcntl
+import hashlib
+import httplib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from StringIO import StringIO
+from urllib import addinfourl
+
+#: The endpoints that are cached, with their default TTL in seconds.
+#: The TTL can be changed with the setting ``cache_<name>_ttl``.
+#: Only the pipeline groups are cached for now, the other endpoints the
+#: commands use are the state of pipelines that has to be current.
+ENDPOINTS = (
+    ('pipeline_groups', re.compile(r'^go/api/config/pipeline_groups$'), 300),
+)
+
+LOCK_FILE = '.lock'
+LOCK_SLOTS = 4096
+
+_locks_guard = threading.Lock()
+_lock_files = {}
+_thread_locks = {}
+
+
+class ResponseCache(object):
+    """Caches successful GET responses from the Go server on disk
+
+    Every response is stored in its own file, so many processes can read
+    and write the cache at the same time. When an entry has expired the
+    first process to notice takes a lock on it and fetches a fresh
+    response, any other process asking for the same entry waits for it
+    instead of making the same request.
+
+    A cache directory that can't be created or written isn't an error, the
+    responses are then fetched every time without being stored.
+
+    Args:
+      directory (str): Where the cache files are stored, created if missing
+      namespace (str): Kept apart from entries in other namespaces, use
+        the server URL and user so different servers/users don't mix
+      ttls (dict): endpoint name -> TTL in seconds, overrides the defaults
+        in :data:`ENDPOINTS`. A TTL of 0 disables caching the endpoint.
+      refresh (bool): When true cached entries are never used, but fresh
+        responses are still stored. Default: False
+    """
+    def __init__(self, directory, namespace, ttls=None, refresh=False):
+        self.directory = directory
+        self.namespace = namespace
+        self.refresh = refresh
+        self.ttls = dict((name, ttl) for name, _, ttl in ENDPOINTS)
+        self.ttls.update(ttls or {})
+
+    def ttl(self, path):
+        """Returns how long the response for `path` is cached, 0 when it isn't"""
+        path = path.lstrip('/')
+        for name, pattern, _ in ENDPOINTS:
+            if pattern.match(path):
+                return self.ttls.get(name) or 0
+
+        return 0
+
+    def fetch(self, path, fetch, headers=None):
+        """Returns a cached response for `path`, or calls `fetch` and caches
+        the result when there's no fresh entry.
+
+        Args:
+          path (str): The path the request is for
+          fetch: A callable doing the request, returns a file like response
+          headers (dict): The request headers that change the response
+
+        Returns:
+          file like object: A response like those returned by `urllib2.urlopen`
+        """
+        ttl = self.ttl(path)
+        if not ttl:
+            return fetch()
+
+        filename = self._filename(path, headers)
+        if not self.refresh:
+            cached = self._read(filename, ttl)
+            if cached:
+                return cached
+
+        with _locked(self.directory, filename):
+            # Someone else might've fetched it while we were waiting for the lock
+            cached = None if self.refresh else self._read(filename, ttl)
+            if cached:
+                return cached
+
+            response = fetch()
+            body = response.read()
+            if response.code == 200:
+                self._write(filename, response, body)
+
+            return self._response(response.code, response.info(), body, response.geturl())
+
+    def _filename(self, path, headers):
+        key = hashlib.sha1(json.dumps([self.namespace, path, sorted((headers or {}).items())]))
+
+        return os.path.join(self.directory, key.hexdigest())
+
+    def _read(self, filename, ttl):
+        try:
+            with open(filename, 'rb') as fp:
+                metadata = json.loads(fp.readline())
+                if time.time() - metadata['stored_at'] >= ttl:
+                    return None
+
+                headers = httplib.HTTPMessage(StringIO(metadata['headers']))
+                return self._response(metadata['status'], headers, fp.read(), metadata['url'])
+        except IOError:  # Missing or unreadable
+            return None
+        except (ValueError, KeyError):  # A corrupt entry is treated as a miss
+            return None
+
+    def _write(self, filename, response, body):
+        headers = ''.join(
+            header for header in response.info().headers
+            if not header.lower().startswith('set-cookie')
+        )
+        metadata = dict(
+            stored_at=time.time(),
+            status=response.code,
+            url=response.geturl(),
+            headers=headers,
+        )
+
+        _write_atomically(filename, '{0}\n{1}'.format(json.dumps(metadata), body))
+
+    def _response(self, status, headers, body, url):
+        return addinfourl(StringIO(body), headers, url, status)
+
+
+class ResultCache(object):
+    """Caches the results of commands on disk for `ttl` seconds
+
+    A result is stored under its key, e.g. the command and its arguments,
+    and handed out as is while it's fresh. When many processes ask for the
+    same result at the same time the first one computes it while the
+    others wait for it, like in :class:`ResponseCache`.
+
+    Args:
+      directory (str): Where the results are stored, created if missing
+      namespace (str): Kept apart from results in other namespaces
+      ttl (float): How many seconds a result is fresh
+      refresh (bool): When true stored results are never used, but new
+        results are still stored. Default: False
+    """
+    def __init__(self, directory, namespace, ttl, refresh=False):
+        self.directory = directory
+        self.namespace = namespace
+        self.ttl = ttl
+        self.refresh = refresh
+
+    def fetch(self, key, compute):
+        """Returns the fresh result stored under `key`, or calls `compute`
+        and stores what it returns.
+
+        Args:
+          key: Anything JSON serializable identifying the result
+          compute: A callable that takes no arguments and returns the
+            result, which has to be JSON serializable. Nothing is stored
+            when it raises.
+        """
+        filename = os.path.join(
+            self.directory,
+            'result-{0}'.format(hashlib.sha1(json.dumps([self.namespace, key])).hexdigest()),
+        )
+        if not self.refresh:
+            cached = self._read(filename)
+            if cached:
+                return cached['result']
+
+        with _locked(self.directory, filename):
+            cached = None if self.refresh else self._read(filename)
+            if cached:
+                return cached['result']
+
+            result = compute()
+            _write_atomically(filename, json.dumps(dict(stored_at=time.time(), result=result)))
+
+        return result
+
+    def _read(self, filename):
+        try:
+            with open(filename, 'rb') as fp:
+                cached = json.load(fp)
+        except IOError:  # Missing or unreadable
+            return None
+        except ValueError:  # A corrupt entry is treated as a miss
+            return None
+
+        if time.time() - cached.get('stored_at', 0) >= self.ttl:
+            return None
+
+        return cached
+
+
+@contextmanager
+def _locked(directory, filename):
+    """Holds the lock of the entry `filename`, shared with other threads
+    and processes
+
+    All entries of a directory share its one lock file, each entry locks
+    the byte at its slot. Entries in the same slot wait for each other,
+    which is rare and harmless. When the lock file can't be created or
+    locked other processes aren't waited for.
+    """
+    slot = int(hashlib.sha1(filename).hexdigest()[:8], 16) % LOCK_SLOTS
+
+    with _locks_guard:
+        lock_file = _lock_file(directory)
+        thread_lock = _thread_locks.setdefault((directory, slot), threading.Lock())
+
+    # Record locks are per process, threads are kept apart by thread_lock
+    with thread_lock:
+        try:
+            if lock_file is not None:
+                fcntl.lockf(lock_file, fcntl.LOCK_EX, 1, slot)
+        except IOError:
+            lock_file = None
+
+        try:
+            yield
+        finally:
+            if lock_file is not None:
+                fcntl.lockf(lock_file, fcntl.LOCK_UN, 1, slot)
+
+
+def _lock_file(directory):
+    """Returns the open lock file of `directory`, None when it can't be
+    created. Call with `_locks_guard` held.
+    """
+    if directory not in _lock_files:
+        try:
+            _ensure_directory(directory)
+            # Kept open, closing any descriptor of the file would release
+            # every lock this process holds on it
+            _lock_files[directory] = open(os.path.join(directory, LOCK_FILE), 'a')
+        except (IOError, OSError):
+            return None
+
+    return _lock_files[directory]
+
+
+def _ensure_directory(directory):
+    try:
+        os.makedirs(directory, 0o700)
+    except OSError as exc:
+        if exc.errno != errno.EEXIST:
+            raise
+
+
+def _write_atomically(filename, data):
+    """Stores `data` in `filename`, failing to store it isn't an error"""
+    # Write to a temporary file and move it into place so that readers
+    # never see a partially written entry.
+    try:
+        fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(filename))
+    except (IOError, OSError):
+        return
+
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+        os.rename(tmp_filename, filename)
+    except (IOError, OSError):
+        try:
+            os.remove(tmp_filename)
+        except OSError:
+            pass
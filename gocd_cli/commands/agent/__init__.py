@@ -0,0 +1,100 @@
+from __future__ import print_function
+
+import errno
+import os
+import time
+
+from gocd_cli import agent
+from gocd_cli.command import BaseCommand
+
+__all__ = ['Serve', 'Status', 'Stop']
+
+
+class Serve(BaseCommand):
+    usage = """
+    Runs an agent in the foreground that keeps decrypted settings in
+    memory until it's stopped.
+
+    While the agent is running the ``*_encrypted`` settings are decrypted
+    by the first gocd invocation that needs them, and every later
+    invocation by the same user gets the plaintext from the agent instead
+    of decrypting it again.
+
+    Flags:
+        socket: Where to create the Unix socket. Default: the environment
+          variable GOCD_AGENT_SOCKET or ~/.gocd/agent.sock
+        ttl: How many seconds a decrypted value is kept. Default: 3600,
+          0 keeps them until the agent stops
+    """
+    usage_summary = 'Runs an agent that keeps decrypted settings in memory'
+
+    def __init__(self, server, socket=None, ttl=3600):
+        self.socket = agent.socket_path(socket)
+        self.ttl = float(ttl)
+
+    def run(self):
+        try:
+            os.makedirs(os.path.dirname(self.socket), 0o700)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+
+        agent_server = agent.AgentServer(self.socket, ttl=self.ttl)
+        print('Listening on "{0}"'.format(self.socket))
+        agent_server.serve_forever()
+
+        return self._return_value('Stopped', exit_code=0)
+
+
+class Status(BaseCommand):
+    usage = """
+    Flags:
+        socket: The agent's Unix socket. Default: see agent serve
+
+    Exits:
+        0: An agent is running
+        1: No agent is running
+    """
+    usage_summary = 'Shows whether an agent is running'
+
+    def __init__(self, server, socket=None):
+        self.socket = agent.socket_path(socket)
+
+    def run(self):
+        status = agent.request(dict(status=True), self.socket)
+        if status is None:
+            return self._return_value('Not running', exit_code=1)
+
+        return self._return_value(
+            'Running with pid {pid}, up {uptime} seconds and holding {secrets} '
+            'secrets'.format(**status),
+            exit_code=0,
+        )
+
+
+class Stop(BaseCommand):
+    usage = """
+    Stops a running agent, all the decrypted values it holds are forgotten.
+
+    Flags:
+        socket: The agent's Unix socket. Default: see agent serve
+    """
+    usage_summary = 'Stops a running agent'
+
+    _timeout = 10  # seconds
+
+    def __init__(self, server, socket=None):
+        self.socket = agent.socket_path(socket)
+
+    def run(self):
+        if agent.request(dict(stop=True), self.socket) is None:
+            return self._return_value('Not running', exit_code=1)
+
+        # The socket is removed once the agent no longer answers
+        stop_by = time.time() + self._timeout
+        while os.path.exists(self.socket):
+            if time.time() > stop_by:
+                return self._return_value('Still running', exit_code=1)
+            time.sleep(0.05)
+
+        return self._return_value('Stopped', exit_code=0)
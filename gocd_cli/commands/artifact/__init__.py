@@ -0,0 +1,142 @@
+from __future__ import print_function
+
+from gocd_cli.artifacts import (
+    artifacts_path,
+    destination_path,
+    download,
+    fetch_checksums,
+    file_path,
+    list_files,
+    select_files,
+)
+from gocd_cli.command import BaseCommand
+from gocd_cli.utils import local_path, run_concurrently
+
+__all__ = ['Download', 'List']
+
+
+class ArtifactCommand(BaseCommand):
+    def __init__(self, server, pipeline, stage, job, counter=None, stage_counter=1):
+        self.server = server
+        self.pipeline = server.pipeline(pipeline)
+        self.stage = stage
+        self.job = job
+        self.counter = int(counter) if counter else None
+        self.stage_counter = int(stage_counter)
+
+    def _latest_counter(self):
+        if self.counter is None:
+            history = self.pipeline.history()
+            if not history or not history['pipelines']:
+                return None
+            self.counter = history['pipelines'][0]['counter']
+
+        return self.counter
+
+    def _files(self):
+        """Returns the paths of all the artifacts of the job, or a failure
+        message"""
+        if self._latest_counter() is None:
+            return None, 'Failed to find a run of "{0}"'.format(self.pipeline.name)
+
+        response = self.pipeline.artifact(
+            self.counter, self.stage, self.job, self.stage_counter
+        ).list()
+        if not response:
+            return None, 'Failed to list the artifacts: HTTP {0}'.format(response.status_code)
+
+        return list_files(response.payload), None
+
+
+class List(ArtifactCommand):
+    usage = """
+    Lists the paths of all the artifact files of a job, one per line.
+
+    Flags:
+        counter: The pipeline counter. Default: the latest run
+        stage_counter: The stage counter. Default: 1
+
+    Exits:
+        0: The artifacts were listed
+        3: Listing the artifacts failed
+    """
+    usage_summary = 'Lists the artifacts of a job'
+
+    def run(self):
+        paths, error = self._files()
+        if error:
+            return self._return_value(error, 3)
+
+        return self._return_value('\n'.join(paths), 0)
+
+
+class Download(ArtifactCommand):
+    usage = """
+    Downloads the artifacts of a job, many files at the same time.
+
+    Every file is streamed to disk and verified against the md5 Go has
+    stored for it. Files already in the destination with the right md5
+    aren't downloaded again, and a download that was interrupted continues
+    from where it stopped when run again.
+
+    Flags:
+        counter: The pipeline counter. Default: the latest run
+        stage_counter: The stage counter. Default: 1
+        paths: A comma separated list of the files or directories to
+          download. Default: all artifacts
+        destination: The directory to download into, the artifacts keep
+          their paths inside it. Default: the current directory
+        concurrency: How many files to download at the same time.
+          Default: 4
+
+    Exits:
+        0: All artifacts were downloaded or already up to date
+        3: Downloading one or more artifacts failed
+    """
+    usage_summary = 'Downloads the artifacts of a job'
+
+    def __init__(self, server, pipeline, stage, job, counter=None, stage_counter=1,
+                 paths=None, destination='.', concurrency=4):
+        super(Download, self).__init__(server, pipeline, stage, job, counter, stage_counter)
+        self.paths = [path.strip() for path in paths.split(',') if path.strip()] if paths else None
+        self.destination = local_path(destination)
+        self.concurrency = int(concurrency)
+
+    def run(self):
+        paths, error = self._files()
+        if error:
+            return self._return_value(error, 3)
+
+        if self.paths:
+            paths = select_files(paths, self.paths)
+
+        base_path = artifacts_path(
+            self.pipeline.name, self.counter, self.stage, self.stage_counter, self.job,
+        )
+        checksums = fetch_checksums(self.server, base_path)
+
+        outcomes = dict(downloaded=0, resumed=0, unchanged=0)
+        errors = []
+        for path, outcome, error in run_concurrently(
+                lambda path: self._download(base_path, path, checksums.get(path)),
+                paths,
+                self.concurrency,
+                ordered=False):
+            if error:
+                errors.append('Error downloading "{0}": {1}'.format(path, error))
+            else:
+                outcomes[outcome] += 1
+
+        output = ['Downloaded {downloaded}, resumed {resumed}, unchanged {unchanged} files'.format(
+            **outcomes
+        )]
+        output.extend(sorted(errors))
+
+        return self._return_value('\n'.join(output), 3 if errors else 0)
+
+    def _download(self, base_path, path, md5):
+        try:
+            destination = destination_path(self.destination, path)
+            return path, download(self.server, file_path(base_path, path), destination, md5), None
+        except Exception as exc:
+            return path, None, exc
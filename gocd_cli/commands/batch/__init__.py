@@ -0,0 +1,84 @@
+from __future__ import print_function
+
+import shlex
+import sys
+
+from gocd_cli.command import BaseCommand
+from gocd_cli.utils import capture_output, run_command, run_concurrently, system_exit_code
+
+__all__ = ['Run']
+
+
+class Run(BaseCommand):
+    usage = """
+    Runs many commands in one process, sharing the connection to the
+    Go server between them. Each line is a command as it would be given
+    to gocd, blank lines and lines starting with # are skipped.
+
+    Example file:
+        pipeline pause Deploy-Database
+        pipeline unlock Deploy-Web
+        pipeline trigger Deploy-Web --wait-until-finished=true
+
+    The output of each command is printed in the order of the lines,
+    followed by its exit code.
+
+    Flags:
+        filename: The file to read the commands from. Default: stdin
+        concurrency: How many lines to run at the same time, only use
+          this when the lines don't depend on each other. Default: 1
+        stop_on_error: Don't run any more lines after a line exits
+          with anything but 0. Only for a concurrency of 1.
+          Default: false
+
+    Exits:
+        The highest exit code of any of the lines
+    """
+    usage_summary = 'Runs the commands listed in a file or on stdin'
+
+    def __init__(self, server, filename=None, concurrency=1, stop_on_error=False):
+        self.server = server
+        self.filename = filename
+        self.concurrency = int(concurrency)
+        self.stop_on_error = str(stop_on_error).lower().strip() == 'true'
+
+        assert not (self.stop_on_error and self.concurrency > 1), (
+            '"stop_on_error" can only be used with a concurrency of 1'
+        )
+
+    def run(self):
+        exit_code = 0
+        for line, (line_exit_code, output) in run_concurrently(
+                self._run_line, self._lines(), self.concurrency):
+            print('=== {0} (exit {1}) ==='.format(line, line_exit_code))
+            if output:
+                print(output.rstrip('\n'))
+            sys.stdout.flush()
+
+            exit_code = max(exit_code, line_exit_code)
+            if self.stop_on_error and line_exit_code != 0:
+                break
+
+        return self._return_value(False, exit_code)
+
+    def _lines(self):
+        fp = open(self.filename) if self.filename else sys.stdin
+        try:
+            for line in fp:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    yield line
+        finally:
+            if self.filename:
+                fp.close()
+
+    def _run_line(self, line):
+        with capture_output() as printed:
+            try:
+                exit_code, output = run_command(self.server, *shlex.split(line))
+            except SystemExit as exc:
+                exit_code, output = system_exit_code(exc), None
+            except Exception as exc:
+                exit_code, output = 1, '{0}: {1}'.format(exc.__class__.__name__, exc)
+
+        return line, (exit_code, printed.getvalue() + ('{0}\n'.format(output) if output else ''))
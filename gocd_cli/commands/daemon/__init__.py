@@ -0,0 +1,114 @@
+from __future__ import print_function
+
+import errno
+import os
+import time
+
+from gocd_cli import daemon
+from gocd_cli.command import BaseCommand
+
+__all__ = ['Serve', 'Status', 'Stop']
+
+
+class Serve(BaseCommand):
+    usage = """
+    Runs a gocd daemon in the foreground until it's stopped.
+
+    While the daemon is running every gocd invocation by the same user
+    is handed to it, instead of reading the settings, decrypting them
+    and connecting to the Go server all over again. The settings are
+    read once when the daemon starts, restart it to pick up changes.
+    An invocation whose GOCD_ and CHECK_ALL_ environment variables differ
+    from the daemon's runs in the calling process instead.
+
+    The commands agent, batch, daemon, help and pipeline watch always run
+    in the calling process, as does any invocation with global options.
+
+    Flags:
+        socket: Where to create the Unix socket. Default: the environment
+          variable GOCD_DAEMON_SOCKET or ~/.gocd/daemon.sock
+        idle_timeout: Stop after this many seconds without any requests.
+          Default: 0, never stop
+    """
+    usage_summary = 'Runs a daemon that serves gocd invocations'
+
+    def __init__(self, server, socket=None, idle_timeout=0):
+        self.server = server
+        self.socket = daemon.socket_path(socket)
+        self.idle_timeout = float(idle_timeout)
+
+    def run(self):
+        try:
+            os.makedirs(os.path.dirname(self.socket), 0o700)
+        except OSError as exc:
+            if exc.errno != errno.EEXIST:
+                raise
+
+        daemon_server = daemon.DaemonServer(self.socket, self.server, self.idle_timeout)
+        print('Listening on "{0}"'.format(self.socket))
+        daemon_server.serve_forever()
+
+        return self._return_value('Stopped', exit_code=0)
+
+
+class Status(BaseCommand):
+    usage = """
+    Flags:
+        socket: The daemon's Unix socket. Default: see daemon serve
+
+    Exits:
+        0: A daemon is running
+        1: No daemon is running
+    """
+    usage_summary = 'Shows whether a daemon is running'
+
+    def __init__(self, server, socket=None):
+        self.socket = daemon.socket_path(socket)
+
+    def run(self):
+        sock = daemon.connect(self.socket)
+        if sock is None:
+            return self._return_value('Not running', exit_code=1)
+
+        try:
+            status = next(daemon.send(sock, dict(status=True)))
+        finally:
+            sock.close()
+
+        return self._return_value(
+            'Running with pid {pid}, up {uptime} seconds and served {requests} '
+            'requests'.format(**status),
+            exit_code=0,
+        )
+
+
+class Stop(BaseCommand):
+    usage = """
+    Flags:
+        socket: The daemon's Unix socket. Default: see daemon serve
+    """
+    usage_summary = 'Stops a running daemon'
+
+    _timeout = 10  # seconds
+
+    def __init__(self, server, socket=None):
+        self.socket = daemon.socket_path(socket)
+
+    def run(self):
+        sock = daemon.connect(self.socket)
+        if sock is None:
+            return self._return_value('Not running', exit_code=1)
+
+        try:
+            list(daemon.send(sock, dict(stop=True)))
+        finally:
+            sock.close()
+
+        # The socket is removed once the daemon no longer accepts commands
+        stop_by = time.time() + self._timeout
+        while os.path.exists(self.socket):
+            if time.time() > stop_by:
+                return self._return_value('Still running', exit_code=1)
+            time.sleep(0.05)
+
+        return self._return_value('Stopped', exit_code=0)
@@ -0,0 +1,76 @@
+import time
+
+from gocd_cli.command import BaseCommand
+from gocd_cli.history import HistoryStore, fetch_new_runs, high_water_mark
+from gocd_cli.utils import local_path, run_concurrently
+
+__all__ = ['Sync']
+
+
+class Sync(BaseCommand):
+    usage = """
+    Mirrors the pipeline, stage and job history into a local SQLite
+    database, which can then be queried with e.g. sqlite3.
+
+    Only the runs newer than the last finished run stored for a pipeline
+    are fetched. Runs that are rerun or approved after they were synced
+    are only updated with full.
+
+    Flags:
+        database: The SQLite database file. Default: ~/.gocd/history.sqlite
+        pipelines: A comma separated list of pipelines to sync.
+          Default: all pipelines
+        concurrency: How many pipelines to fetch at the same time.
+          Default: 1
+        full: Fetch the complete history again. Default: false
+
+    Exits:
+        0: All pipelines were synced
+        3: Syncing one or more pipelines failed
+    """
+    usage_summary = 'Mirrors the pipeline history into a local SQLite database'
+
+    def __init__(self, server, database='~/.gocd/history.sqlite', pipelines=None,
+                 concurrency=1, full=False):
+        self.server = server
+        self.database = local_path(database)
+        self.pipelines = [name.strip() for name in pipelines.split(',')] if pipelines else None
+        self.concurrency = int(concurrency)
+        self.full = str(full).lower().strip() == 'true'
+
+    def run(self):
+        names = self.pipelines or sorted(self.server.pipeline_groups().pipelines)
+
+        store = HistoryStore(self.database)
+        try:
+            marks = {} if self.full else store.high_water_marks()
+            new_runs = 0
+            errors = []
+
+            # The workers only fetch, all writes happen here in one thread
+            for name, runs, mark, error in run_concurrently(
+                    lambda name: self._fetch(name, marks.get(name, 0)),
+                    names,
+                    self.concurrency,
+                    ordered=False):
+                if error:
+                    errors.append('Error syncing "{0}": {1}'.format(name, error))
+                    continue
+
+                store.store(name, runs, mark, int(time.time() * 1000))
+                new_runs += len(runs)
+        finally:
+            store.close()
+
+        output = ['Synced {0} new runs of {1} pipelines'.format(new_runs, len(names) - len(errors))]
+        output.extend(sorted(errors))
+
+        return self._return_value('\n'.join(output), 3 if errors else 0)
+
+    def _fetch(self, name, since):
+        try:
+            runs = fetch_new_runs(self.server.pipeline(name), since)
+        except Exception as exc:
+            return name, None, since, exc
+
+        return name, runs, high_water_mark(runs, since), None
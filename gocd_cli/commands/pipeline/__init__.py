@@ -1,22 +1,44 @@
 from __future__ import print_function
 
+import itertools
+import json
+import sys
 import time
 
+from gocd_cli import multiplex
 from gocd_cli.command import BaseCommand
-from gocd_cli.utils import get_settings
-
-from .check import Check
-from .retrigger_failed import RetriggerFailed
+from gocd_cli.console import ConsoleTail, console_outputs, write_stripped
+from gocd_cli.dashboard import (
+    dashboard_pipelines,
+    get_dashboard,
+    instance_counter,
+    instance_stages,
+    is_paused,
+    latest_instance,
+)
+from gocd_cli.multiplex import MultiplexClient
+from gocd_cli.retry import CircuitOpenError, backoff_intervals
+from gocd_cli.utils import get_result_cache, get_settings, run_concurrently
+
+from .check import Check, unavailable_message
+from .grep import Grep
+from .retrigger_failed import RetriggerFailed, RetriggerFailedAll
+from .trigger_many import TriggerMany
+from .watch import Watch
 
 __all__ = [
     'Check',
     'CheckAll',
+    'Grep',
     'List',
     'Pause',
     'RetriggerFailed',
+    'RetriggerFailedAll',
     'Trigger',
+    'TriggerMany',
     'Unlock',
     'Unpause',
+    'Watch',
 ]
 
 
@@ -42,19 +64,48 @@ class Trigger(BaseCommand):
           then exit 0 on success, and 2 on failure. The console.log will
           be output for each stage in order.
         verbose: Will print a . every tick when wait_until_finished is true
+        follow: Will print the console.log of each job while the pipeline
+          is running, only the new output is fetched on each poll.
+          Implies wait_until_finished.
+        max_poll_interval: The longest time in seconds to wait between
+          checking whether the pipeline has finished. The checks start out
+          quick and then back off up to this value. Default: 30
+        expected_run_time: How many minutes the pipeline usually takes
+          to run, fractions are allowed. When given the first check is
+          made just before this time has passed.
+        backend: possible values (threads, multiplex) default threads.
+          When multiplex the console logs are fetched from one thread
+          instead of a thread per log.
+        concurrency: How many console logs to fetch at the same time once
+          the pipeline has finished, they're still printed in stage and
+          job order. Default: 8
     """
     usage_summary = 'Triggers the named pipeline'
 
-    _tick = 30  # seconds
+    _initial_poll_interval = 1  # seconds
 
     def __init__(self, server, name, unlock=False, variables=None, secure_variables=None,
-                 wait_until_finished=False, verbose=False):
+                 wait_until_finished=False, verbose=False, max_poll_interval=30,
+                 expected_run_time=None, follow=False, backend=None, concurrency=8):
+        assert backend in ('threads', 'multiplex', None), (
+            '"backend" needs to be one of "threads" or "multiplex"'
+        )
+
+        self.server = server
+        self.name = name
         self.pipeline = server.pipeline(name)
         self.unlock = str(unlock).lower().strip() == 'true'
         self.variables = self._convert_to_dict(variables)
         self.secure_variables = self._convert_to_dict(secure_variables)
-        self.wait_until_finished = str(wait_until_finished).lower().strip() == 'true'
+        self.follow = str(follow).lower().strip() == 'true'
+        self.wait_until_finished = (
+            self.follow or str(wait_until_finished).lower().strip() == 'true'
+        )
         self.verbose = str(verbose).lower().strip() == 'true'
+        self.max_poll_interval = float(max_poll_interval)
+        self.expected_run_time = float(expected_run_time) if expected_run_time else None
+        self.backend = backend or 'threads'
+        self.concurrency = int(concurrency)
 
     def run(self):
         if self.unlock:
@@ -72,19 +123,39 @@ class Trigger(BaseCommand):
             return self._return_value(response.body.strip(), response.is_ok)
 
         instance_id = response['counter']
+        console = ConsoleTail(self.pipeline) if self.follow else None
+        poll_intervals = self._poll_intervals()
         while not self._stages_finished(response):
-            if self.verbose:
+            if console:
+                console.update(response)
+            elif self.verbose:
                 print('.', end='')
-            time.sleep(self._tick)
+            time.sleep(next(poll_intervals))
             response = self.pipeline.instance(instance_id)
 
-        self._print_job_output(response)
+        if console:
+            console.update(response)
+        else:
+            self._print_job_output(response)
 
         return self._return_value(
             False,
             self._run_successful(response),
         )
 
+    def _poll_intervals(self):
+        intervals = backoff_intervals(
+            initial=self._initial_poll_interval,
+            maximum=self.max_poll_interval,
+        )
+
+        if self.expected_run_time:
+            # Most of the expected time is spent in one wait, after that
+            # poll quickly again since the pipeline is likely about to finish.
+            return itertools.chain([self.expected_run_time * 60 * 0.9], intervals)
+
+        return intervals
+
     def _convert_to_dict(self, args):
         # XXX: I would like to find a better way of dealing with this,
         # but I think I should instead focus on getting a better way of
@@ -115,10 +186,26 @@ class Trigger(BaseCommand):
         return True
 
     def _print_job_output(self, instance):
-        for metadata, output in self.pipeline.console_output(instance):
+        if self.backend == 'threads':
+            return self._print_console_output(
+                console_outputs(self.server, self.name, instance, self.concurrency)
+            )
+
+        client = MultiplexClient(self.server, max_in_flight=self.concurrency)
+        try:
+            self._print_console_output(multiplex.console_output(client, self.name, instance))
+        finally:
+            client.close()
+
+    def _print_console_output(self, console_output):
+        for metadata, output in console_output:
             job_masthead = ', '.join(('{0}="{1}"'.format(k, v) for k, v in metadata.items()))
             print('\n\n=== {0} ===\n\n'.format(job_masthead))
-            print(output.strip())
+            try:
+                write_stripped(output, sys.stdout)
+            finally:
+                output.close()
+            print()
 
 
 class Unlock(BaseCommand):
@@ -173,34 +260,92 @@ class CheckAll(BaseCommand):
     gocd-cli.cfg.
 
     For usage of the flags and return statuses see the check command.
+
+    Flags:
+        concurrency: How many pipelines to check at the same time.
+            The output is the same no matter the concurrency. Default: 1
+        bulk: Whether to get the state of all pipelines from the dashboard
+            in one request. Only pipelines that are building or have failed
+            are then checked one by one. Set to false for Go servers
+            without a dashboard API. Default: true
+        cache_ttl: For how many seconds the result is reused by check-all
+            runs with the same arguments, without asking the Go server
+            again. Default: the setting check_cache_ttl or 0, no caching
+        format: possible values (text, ndjson) default text.
+            When ndjson a JSON object like the one from check is printed
+            for every pipeline as soon as it has been checked.
+        backend: possible values (threads, multiplex) default threads.
+            When multiplex all requests are made from one thread, which
+            allows a concurrency of thousands. Doesn't support proxies.
     """
     usage_summary = 'Checks all pipelines to be green/non-stalled'
 
-    exit_code = 0
-    error_messages = []
-
     OK_STATUS = 0
     PAUSED_STATUS = 3
 
-    def __init__(self, server, warn_run_time=30, crit_run_time=60, skip_paused=True):
+    # Dashboard stage statuses that a pipeline can be judged on without
+    # fetching the full instance, anything else is checked individually.
+    settled_stage_statuses = ('Passed', 'Cancelled', 'Unknown')
+
+    def __init__(self, server, warn_run_time=30, crit_run_time=60, skip_paused=True,
+                 concurrency=1, bulk=True, cache_ttl=None, format=None, backend=None):
+        assert format in ('text', 'ndjson', None), (
+            '"format" needs to be one of "text" or "ndjson"'
+        )
+        assert backend in ('threads', 'multiplex', None), (
+            '"backend" needs to be one of "threads" or "multiplex"'
+        )
+
         self.config = get_settings('check_all')
         self.server = server
         self.crit_run_time = crit_run_time
         self.warn_run_time = warn_run_time
         self.skip_paused = skip_paused
+        self.concurrency = int(concurrency)
+        self.bulk = str(bulk).lower().strip() == 'true'
+        self.cache_ttl = cache_ttl
+        self.format = format or 'text'
+        self.backend = backend or 'threads'
+
+        self.exit_code = self.OK_STATUS
+        self.error_messages = []
+        self.dashboard = None
+        self.streamed = False
 
     def run(self):
-        ignored_pipelines = (self.config.get('ignored_pipelines') or '').split(',')
-        for pipeline in self.server.pipeline_groups().pipelines:
-            if pipeline in ignored_pipelines:
-                continue
-
-            response = Check(
-                self.server,
-                pipeline,
-                warn_run_time=self.warn_run_time,
-                crit_run_time=self.crit_run_time,
-            ).run()
+        cache = get_result_cache(self.server, self.cache_ttl)
+        if cache is None:
+            result = self._run()
+        else:
+            result = cache.fetch(
+                ['check-all', self.warn_run_time, self.crit_run_time, self.skip_paused,
+                 self.config.get('ignored_pipelines'), self.format],
+                self._run,
+            )
+
+        if self.streamed:  # Every line was printed as soon as it was checked
+            return self._return_value('', result['exit_code'])
+
+        return result
+
+    def _run(self):
+        try:
+            if self.bulk:
+                dashboard = get_dashboard(self.server)
+                if dashboard is not None:
+                    self.dashboard = dashboard_pipelines(dashboard)
+
+            pipelines = self._pipelines()
+        except CircuitOpenError as exc:
+            return self._return_value('CRITICAL: {0}'.format(unavailable_message(exc)), 2)
+
+        lines = []
+        for check, response in self._checks(pipelines):
+            if self.format == 'ndjson':
+                lines.append(json.dumps(check.record(response), sort_keys=True))
+                print(lines[-1])
+                sys.stdout.flush()
+
             if response['exit_code'] != self.OK_STATUS:
                 if self.skip_paused and response['exit_code'] == self.PAUSED_STATUS:
                     continue
@@ -211,27 +356,208 @@ class CheckAll(BaseCommand):
 
                 self.error_messages.append(response['output'])
 
-        if self.exit_code != self.OK_STATUS:
+        if self.format == 'ndjson':
+            self.streamed = True
+            return self._return_value('\n'.join(lines), self.exit_code)
+        elif self.exit_code != self.OK_STATUS:
             return self._return_value('\n'.join(self.error_messages), self.exit_code)
         else:
             return self._return_value('OK: All green', self.OK_STATUS)
 
+    def _pipelines(self):
+        ignored_pipelines = (self.config.get('ignored_pipelines') or '').split(',')
+        if self.dashboard is not None:
+            pipelines = self.dashboard.keys()
+        else:
+            pipelines = self.server.pipeline_groups().pipelines
+
+        return sorted(pipeline for pipeline in pipelines if pipeline not in ignored_pipelines)
+
+    def _checks(self, pipelines):
+        if self.backend == 'multiplex':
+            return self._multiplexed_checks(pipelines)
+
+        return run_concurrently(self._check, pipelines, self.concurrency)
+
+    def _check(self, pipeline):
+        check = self._new_check(pipeline)
+        result = self._dashboard_result(check, pipeline)
+
+        return check, check.run() if result is None else result
+
+    def _multiplexed_checks(self, pipelines):
+        checks = [(pipeline, self._new_check(pipeline)) for pipeline in pipelines]
+        results = [self._dashboard_result(check, pipeline) for pipeline, check in checks]
+
+        # The status and latest run of every pipeline that has to be checked
+        # on its own are fetched at the same time, in the order of the pipelines
+        client = MultiplexClient(self.server, max_in_flight=self.concurrency)
+        responses = client.map(itertools.chain.from_iterable(
+            (multiplex.status(pipeline), multiplex.history(pipeline))
+            for (pipeline, _), result in zip(checks, results)
+            if result is None
+        ))
+
+        try:
+            for (pipeline, check), result in zip(checks, results):
+                if result is None:
+                    (_, status, status_error), (_, history, history_error) = (
+                        next(responses), next(responses))
+                    error = status_error or history_error
+                    if isinstance(error, CircuitOpenError):
+                        result = check._return_unavailable(error)
+                    elif error:
+                        raise error
+                    else:
+                        result = check.evaluate_responses(
+                            status, multiplex.latest_instance(history)
+                        )
+
+                yield check, result
+        finally:
+            client.close()
+
+    def _new_check(self, pipeline):
+        return Check(
+            self.server,
+            pipeline,
+            warn_run_time=self.warn_run_time,
+            crit_run_time=self.crit_run_time,
+            cache_ttl=0,  # Only the result of check-all as a whole is cached
+        )
+
+    def _dashboard_result(self, check, pipeline):
+        """Returns the result of `check` judged from the dashboard, or None
+        when the pipeline has to be checked on its own
+        """
+        if self.dashboard is None:
+            return None
+
+        dashboard_pipeline = self.dashboard[pipeline]
+        if is_paused(dashboard_pipeline):
+            return check._return_paused()
+
+        instance = latest_instance(dashboard_pipeline)
+        if instance is None:
+            return check.evaluate(None)
+
+        stages = instance_stages(instance)
+        if any(stage.get('status') not in self.settled_stage_statuses for stage in stages):
+            return None
+
+        return check.evaluate(self._dashboard_instance(instance, stages))
+
+    def _dashboard_instance(self, instance, stages):
+        # Dress the dashboard instance up as a pipeline instance, only
+        # with what Check needs for stages that aren't running or failed.
+        return dict(counter=instance_counter(instance), stages=[
+            dict(
+                name=stage['name'],
+                result=stage['status'],
+                scheduled=stage['status'] != 'Unknown',
+                jobs=[
+                    dict(scheduled_date=instance.get('schedule_at', 0), state='Completed')
+                ] if stage['status'] != 'Unknown' else [],
+            )
+            for stage in stages
+        ])
+
 
 class List(BaseCommand):
-    usage = ' '
+    usage = """
+    Flags:
+        concurrency: How many pipeline statuses to fetch at the same time.
+            Default: 1
+        order: possible values (name, completed) default name.
+            When name the pipelines are printed in alphabetical order.
+            When completed each pipeline is printed as soon as its status
+            has been fetched.
+        format: possible values (text, ndjson) default text.
+            When ndjson every pipeline is printed as a JSON object with
+            pipeline and the fields of its status, or pipeline and error.
+            Errors are then printed in place instead of at the end.
+        backend: possible values (threads, multiplex) default threads.
+            When multiplex all statuses are fetched from one thread, which
+            allows a concurrency of thousands. Doesn't support proxies.
+
+    Exits:
+        0: The status of every pipeline was fetched
+        3: Failed to get the status of one or more pipelines, these are
+           listed after all the other pipelines
+    """
     usage_summary = 'Lists all pipelines with their current status'
 
-    def __init__(self, server):
+    def __init__(self, server, concurrency=1, order=None, format=None, backend=None):
+        assert order in ('name', 'completed', None), (
+            '"order" needs to be one of "name" or "completed"'
+        )
+        assert format in ('text', 'ndjson', None), (
+            '"format" needs to be one of "text" or "ndjson"'
+        )
+        assert backend in ('threads', 'multiplex', None), (
+            '"backend" needs to be one of "threads" or "multiplex"'
+        )
+
         self.server = server
+        self.concurrency = int(concurrency)
+        self.order = order or 'name'
+        self.format = format or 'text'
+        self.backend = backend or 'threads'
 
     def run(self):
-        for pipeline in self.server.pipeline_groups().pipelines:
-            status = self.server.pipeline(pipeline).status()
-            if not status:
-                print('Error getting status for "{0}"'.format(pipeline))
-                exit(3)
-
-            print('{0}: {1}'.format(pipeline, self._format_status(status.payload)))
+        failed = False
+        errors = []
+        results = self._statuses(sorted(self.server.pipeline_groups().pipelines))
+
+        for pipeline, status, error in results:
+            failed = failed or not status
+            if self.format == 'ndjson':  # Errors are printed in place
+                print(self._format_record(pipeline, status, error))
+                sys.stdout.flush()
+            elif status:
+                print('{0}: {1}'.format(pipeline, self._format_status(status.payload)))
+            else:
+                errors.append('Error getting status for "{0}"{1}'.format(
+                    pipeline,
+                    ': {0}'.format(error) if error else '',
+                ))
+
+        if failed:
+            return self._return_value('\n'.join(errors), 3)
+
+    def _statuses(self, pipelines):
+        if self.backend == 'threads':
+            return run_concurrently(self._status, pipelines, self.concurrency,
+                                    ordered=self.order == 'name')
+
+        return self._multiplexed_statuses(pipelines)
+
+    def _multiplexed_statuses(self, pipelines):
+        client = MultiplexClient(self.server, max_in_flight=self.concurrency)
+        try:
+            for call, status, error in client.map(
+                    (multiplex.status(pipeline, key=pipeline) for pipeline in pipelines),
+                    ordered=self.order == 'name'):
+                yield call.key, status, error
+        finally:
+            client.close()
+
+    def _status(self, pipeline):
+        try:
+            return pipeline, self.server.pipeline(pipeline).status(), None
+        except Exception as exc:
+            return pipeline, None, exc
 
     def _format_status(self, status):
         return ', '.join(('{0}={1}'.format(k, v) for k, v in status.items()))
+
+    def _format_record(self, pipeline, status, error):
+        if status:
+            record = dict(status.payload, pipeline=pipeline)
+        else:
+            record = dict(
+                pipeline=pipeline,
+                error=str(error) if error else 'HTTP {0}'.format(status.status_code),
+            )
+
+        return json.dumps(record, sort_keys=True)
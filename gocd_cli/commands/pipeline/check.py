@@ -1,10 +1,22 @@
 import datetime as dt
+import json
 import time
 from gocd_cli.command import BaseCommand
+from gocd_cli.retry import CircuitOpenError
+from gocd_cli.utils import get_result_cache
 
 __all__ = ['Check']
 
 
+def unavailable_message(exc):
+    """The message for a check that stopped at the circuit breaker
+
+    Args:
+      exc: the :class:`gocd_cli.retry.CircuitOpenError` raised
+    """
+    return 'The Go server is unavailable, {0}'.format(exc.reason)
+
+
 class Check(BaseCommand):
     usage = """
     Checks whether a pipeline has run after a given time, finished successfully,
@@ -26,11 +38,18 @@ class Check(BaseCommand):
             minutes raise a critical warning
         ignore_paused: When true a paused pipeline will be checked as
             normal, when false it'll be set to unknown. Default: False
+        cache_ttl: For how many seconds the result is reused by checks
+            with the same arguments, without asking the Go server again.
+            Default: the setting check_cache_ttl or 0, no caching
+        format: possible values (text, ndjson) default text.
+            When ndjson the result is printed as a JSON object with
+            pipeline, status, exit_code, output, counter and run_time,
+            the seconds the current run has been running.
 
     Exits:
         0: Everything is green
         1: When there's a warning
-        2: When there's a critical warning
+        2: When there's a critical warning, or the Go server keeps failing
         3: When the pipeline is paused
     """
     usage_summary = 'Check whether a pipeline has run successfully'
@@ -38,37 +57,128 @@ class Check(BaseCommand):
     _ran_after = None
 
     final_job_states = ['Passed', 'Failed']  # States when a job/stage isn't doing anything more
+    statuses = ('ok', 'warning', 'critical', 'unknown')  # By exit code
 
     def __init__(self, server, name, ran_after=None, warn_run_time=30, crit_run_time=60,
-                 ignore_paused=False):
+                 ignore_paused=False, cache_ttl=None, format=None):
+        assert format in ('text', 'ndjson', None), (
+            '"format" needs to be one of "text" or "ndjson"'
+        )
+
         self.name = name
+        self.server = server
         self.pipeline = server.pipeline(name)
         self.ran_after = ran_after
         self.warn_run_time = warn_run_time
         self.crit_run_time = crit_run_time
         self.ignore_paused = ignore_paused
+        self.cache_ttl = cache_ttl
+        self.format = format or 'text'
 
+        self.counter = None
         self.currently_running = False
         self.running_since = []
         self._started_at = None
 
     def run(self):
-        if not self.ignore_paused:
-            status = self.pipeline.status()
-            if not status:
-                raise Exception('Invalid response! "{0}"'.format(status.body))
-            elif status['paused']:
-                return self._return_value('Pipeline "{0}" is paused'.format(self.name), 'unknown')
-
-        instance = self.pipeline.instance()
+        cache = get_result_cache(self.server, self.cache_ttl)
+        if cache is None:
+            return self._run()
+
+        return cache.fetch(
+            ['check', self.name, self.ran_after, self.warn_run_time, self.crit_run_time,
+             self.ignore_paused, self.format],
+            self._run,
+        )
+
+    def _run(self):
+        try:
+            result = self._check()
+        except CircuitOpenError as exc:
+            result = self._return_unavailable(exc)
+
+        if self.format == 'ndjson':
+            result['output'] = json.dumps(self.record(result), sort_keys=True)
+
+        return result
+
+    def record(self, result):
+        """Returns the `result` of the check as a dict for machine readable output
+
+        Returns:
+          dict: with pipeline, status, exit_code, output, counter and run_time
+        """
+        return dict(
+            pipeline=self.name,
+            status=self.statuses[result['exit_code']],
+            exit_code=result['exit_code'],
+            output=result['output'],
+            counter=self.counter,
+            run_time=self.run_time,
+        )
+
+    @property
+    def run_time(self):
+        """How many seconds the current run has been running, None when
+        the pipeline isn't running
+        """
+        if not self.currently_running:
+            return None
+
+        return int((self._now - min(self.running_since)) / 1000)
+
+    def _check(self):
+        if not self.ignore_paused and self._is_paused(self.pipeline.status()):
+            return self._return_paused()
+
+        return self._evaluate_response(self.pipeline.instance())
+
+    def evaluate_responses(self, status, instance):
+        """Like :meth:`run` with the status and the latest instance of the
+        pipeline already fetched by the caller
+
+        Args:
+          status: the `gocd.api.response.Response` of the pipeline status
+          instance: the `gocd.api.response.Response` of its latest instance
+
+        Returns:
+          dict: with exit_code and output
+        """
+        if not self.ignore_paused and self._is_paused(status):
+            return self._return_paused()
+
+        return self._evaluate_response(instance)
+
+    def _is_paused(self, status):
+        if not status:
+            raise Exception('Invalid response! "{0}"'.format(status.body))
+
+        return status['paused']
+
+    def _evaluate_response(self, instance):
         if not instance:
             raise Exception('Invalid response! "{0}"'.format(instance.body))
-        elif not instance.body:  # No instance available, i.e. pipeline has never been scheduled
+
+        return self.evaluate(instance.body)
+
+    def evaluate(self, instance):
+        """Works out the state of the pipeline from its latest instance
+
+        Args:
+          instance (dict): a pipeline instance as returned by
+            `gocd.api.Pipeline.instance`, falsey when the pipeline has
+            never been scheduled.
+
+        Returns:
+          dict: with exit_code and output
+        """
+        if not instance:  # No instance available, i.e. pipeline has never been scheduled
             if self.ran_after:
                 return self._return_ran_after_fail()
             else:
                 return self._return_value('No scheduled runs', 'ok')
 
+        self.counter = instance.get('counter')
         for stage in instance['stages']:
             stage_result = stage.get('result', None)
 
@@ -191,6 +301,12 @@ class Check(BaseCommand):
 
         return self.started_at
 
+    def _return_paused(self):
+        return self._return_value('Pipeline "{0}" is paused'.format(self.name), 'unknown')
+
+    def _return_unavailable(self, exc):
+        return self._return_value(unavailable_message(exc), 'critical')
+
     def _return_ran_after_fail(self):
         return self._return_value('Pipeline "{0}" has not run after "{1}".'.format(
             self.name,
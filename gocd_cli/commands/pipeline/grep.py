@@ -0,0 +1,240 @@
+from __future__ import print_function
+
+import itertools
+import re
+import sys
+import tempfile
+import threading
+
+from gocd_cli import multiplex
+from gocd_cli.command import BaseCommand
+from gocd_cli.console import (
+    SPOOL_SIZE,
+    console_log_path,
+    file_chunks,
+    finished_jobs,
+    matching_lines,
+    read_console,
+)
+from gocd_cli.multiplex import MultiplexClient
+from gocd_cli.utils import run_concurrently
+
+__all__ = ['Grep']
+
+
+def parse_counters(value):
+    """Parses a pipeline counter, or a range of them like 40-45
+
+    Returns:
+      list: the counters, None when `value` is empty meaning the latest
+    """
+    if not value:
+        return None
+
+    first, _, last = str(value).partition('-')
+    first = int(first)
+    last = int(last) if last else first
+    assert first <= last, '"counter" needs to be a counter or a range like 40-45'
+
+    return range(first, last + 1)
+
+
+def read_matches(spool):
+    """Yields the (line number, line) matches written to `spool` by
+    :meth:`Grep._matches` and closes it"""
+    try:
+        for record in spool:
+            line_number, _, line = record[:-1].partition(':')
+            yield int(line_number), line
+    finally:
+        spool.close()
+
+
+class Grep(BaseCommand):
+    usage = """
+    Searches the console logs of the finished jobs of a pipeline run for
+    lines matching a regular expression. The logs are fetched at the same
+    time and searched chunk by chunk as they're downloaded.
+
+    Every matching line is printed after the job it's from:
+    <pipeline>/<counter>/<stage>/<stage counter>/<job>:<line number>:<line>
+
+    Flags:
+        counter: The pipeline counter, or a range of counters like 40-45.
+          Default: the latest run
+        stage: Only search the jobs of this stage
+        job: Only search the jobs with this name
+        ignore_case: Match regardless of case. Default: false
+        first: Stop at the first matching line found in any job, the other
+          logs aren't read any further. Default: false
+        max_count: The max number of matching lines printed for each job
+        concurrency: How many console logs to search at the same time.
+          Default: 8
+        backend: possible values (threads, multiplex) default threads.
+          When multiplex the logs are downloaded from one thread to
+          temporary files and then searched.
+
+    Exits:
+        0: One or more lines matched
+        1: No line matched
+        3: Getting a pipeline run or a console log failed
+    """
+    usage_summary = 'Searches the console logs of a pipeline run'
+
+    def __init__(self, server, name, pattern, counter=None, stage=None, job=None,
+                 ignore_case=False, first=False, max_count=None, concurrency=8, backend=None):
+        assert backend in ('threads', 'multiplex', None), (
+            '"backend" needs to be one of "threads" or "multiplex"'
+        )
+        assert max_count is None or int(max_count) > 0, '"max_count" needs to be above 0'
+
+        self.server = server
+        self.name = name
+        self.pipeline = server.pipeline(name)
+        self.ignore_case = str(ignore_case).lower().strip() == 'true'
+        self.regex = re.compile(pattern, re.IGNORECASE if self.ignore_case else 0)
+        self.counters = parse_counters(counter)
+        self.stage = stage
+        self.job = job
+        self.first = str(first).lower().strip() == 'true'
+        self.max_count = 1 if self.first else (int(max_count) if max_count else None)
+        self.concurrency = int(concurrency)
+        self.backend = backend or 'threads'
+
+        self._stop = threading.Event()
+
+    def run(self):
+        errors = []
+        instances = []
+        for counter, instance in self._instances():
+            if not instance:
+                errors.append('Failed to get run {0}: HTTP {1}'.format(
+                    counter, instance.status_code))
+            else:
+                instances.append(instance)
+
+        jobs = [
+            metadata
+            for instance in instances
+            for metadata in finished_jobs(self.name, instance)
+            if self.stage in (None, metadata['stage']) and self.job in (None, metadata['job'])
+        ]
+
+        matched = False
+        for metadata, matches, error in self._searches(jobs):
+            if error is not None:
+                errors.append('Error searching {0}: {1}'.format(self._job_path(metadata), error))
+                continue
+
+            for line_number, line in matches:
+                print('{0}:{1}:{2}'.format(self._job_path(metadata), line_number, line))
+                matched = True
+            sys.stdout.flush()
+
+            if matched and self.first:
+                break
+
+        if errors:
+            exit_code = 3
+        else:
+            exit_code = 0 if matched else 1
+
+        return self._return_value('\n'.join(errors), exit_code)
+
+    def _instances(self):
+        """Yields (counter, response) for every pipeline run to search"""
+        if self.counters is None:
+            history = self.pipeline.history()
+            if history and history['pipelines']:
+                yield 'latest', multiplex.latest_instance(history)
+            elif not history:
+                yield 'latest', history
+            return
+
+        for counter, instance in run_concurrently(
+                lambda counter: (counter, self.pipeline.instance(counter)),
+                self.counters,
+                self.concurrency):
+            yield counter, instance
+
+    def _searches(self, jobs):
+        """Yields (metadata, matches, error) for every job, in job order
+        unless stopping at the first match"""
+        if self.backend == 'multiplex':
+            return self._multiplexed_searches(jobs)
+
+        return run_concurrently(self._search, jobs, self.concurrency, ordered=not self.first)
+
+    def _search(self, metadata):
+        path = console_log_path(**dict(
+            (key, value) for key, value in metadata.items() if key != 'job_result'
+        ))
+        chunks = read_console(self.server, path)
+        try:
+            return metadata, self._matches(self._unless_stopped(chunks)), None
+        except Exception as exc:
+            return metadata, [], exc
+        finally:
+            chunks.close()
+
+    def _multiplexed_searches(self, jobs):
+        client = MultiplexClient(self.server, max_in_flight=self.concurrency)
+        try:
+            calls = [
+                multiplex.console(self.name, metadata['pipeline_counter'], metadata['stage'],
+                                  metadata['stage_counter'], metadata['job'], key=metadata)
+                for metadata in jobs
+            ]
+            for call, response, error in client.map(calls):
+                if error is not None:
+                    yield call.key, [], error
+                    continue
+
+                try:
+                    if response.status_code == 404:  # Like read_console, no log yet
+                        yield call.key, [], None
+                    elif not response:
+                        yield call.key, [], 'HTTP {0}'.format(response.status_code)
+                    else:
+                        yield call.key, self._matches(file_chunks(response.fp)), None
+                finally:
+                    response.fp.close()
+        finally:
+            client.close()
+
+    def _matches(self, chunks):
+        """Searches a log and spools its matching lines to a temporary file,
+        so a log with many matches isn't kept in memory until it's printed
+
+        Returns:
+          iterator: (line number, line) for every match, closes the file
+            once exhausted
+        """
+        matches = matching_lines(chunks, self.regex)
+        if self.max_count:
+            matches = itertools.islice(matches, self.max_count)
+
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE)
+        matched = False
+        try:
+            for line_number, line in matches:
+                spool.write('{0}:{1}\n'.format(line_number, line))
+                matched = True
+        except Exception:
+            spool.close()
+            raise
+
+        if matched and self.first:
+            self._stop.set()
+
+        spool.seek(0)
+        return read_matches(spool)
+
+    def _unless_stopped(self, chunks):
+        for chunk in chunks:
+            if self._stop.is_set():
+                return
+            yield chunk
+
+    def _job_path(self, metadata):
+        return '{pipeline}/{pipeline_counter}/{stage}/{stage_counter}/{job}'.format(**metadata)
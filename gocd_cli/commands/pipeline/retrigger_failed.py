@@ -1,7 +1,11 @@
+import fnmatch
+
 from gocd.api.response import Response
 from gocd_cli.command import BaseCommand
+from gocd_cli.ratelimit import TokenBucket
+from gocd_cli.utils import run_concurrently
 
-__all__ = ['RetriggerFailed']
+__all__ = ['RetriggerFailed', 'RetriggerFailedAll']
 
 
 class RetriggerFailed(BaseCommand):
@@ -30,19 +34,29 @@ class RetriggerFailed(BaseCommand):
         self.retrigger_type = retrigger or 'pipeline'
 
     def run(self):
+        response, failed_stage = self._find_failed_stage()
+
+        if failed_stage:
+            return self._retrigger(response)
+
+        return None
+
+    def _find_failed_stage(self):
         response = self.pipeline.history()
         if not response:
             raise Exception('Cannot continue like this. Response was invalid!')
 
-        pipeline_run = self._get_run(response)
-
-        if self._did_the_run_fail(pipeline_run):
-            return self._retrigger(response)
+        last_run = self._get_run(response)
+        if not last_run:  # The pipeline has never been scheduled
+            return response, False
 
-        return None
+        return response, self._did_the_run_fail(last_run)
 
     def _get_run(self, response):
         if self.counter is None:
+            if not response['pipelines']:
+                return None
+
             last_run = response['pipelines'][0]
             self.counter = last_run['counter']
 
@@ -80,3 +94,135 @@ class RetriggerFailed(BaseCommand):
             return True
         else:
             raise Exception('Failed to unlock the pipeline')
+
+
+class RetriggerFailedAll(BaseCommand):
+    usage = """
+    Retriggers the latest run of every selected pipeline that has failed.
+
+    Without group, pattern or pipelines all pipelines are selected, when
+    more than one of them is given a pipeline has to match all of them.
+
+    Flags:
+        group: only pipelines in this pipeline group
+        pattern: only pipelines with a name matching this shell style
+                 pattern, e.g. deploy-*
+        pipelines: a comma separated list of pipelines
+        stage: only retrigger pipelines where this stage failed
+        retrigger: possible values (pipeline, stage) default pipeline.
+                   When stage, stage has to be given as well.
+        concurrency: how many pipelines to check and retrigger at the
+                     same time. Default: 1
+        rate: the max number of retriggers per second, 0 for no limit.
+              Default: 1
+        dry_run: when true only list what would be retriggered.
+                 Default: false
+
+    Exits:
+        0: every failed pipeline was retriggered
+        1: no pipelines were selected
+        3: checking or retriggering one or more pipelines failed
+    """
+    usage_summary = 'Retrigger all selected pipelines/stages that have failed'
+
+    def __init__(self, server, group=None, pattern=None, pipelines=None, stage=None,
+                 retrigger=None, concurrency=1, rate=1, dry_run=False):
+        assert retrigger in ('pipeline', 'stage', None), (
+            '"retrigger" needs to be one of "pipeline" or "stage"'
+        )
+        assert retrigger != 'stage' or stage, '"stage" is needed to retrigger stages'
+
+        self.server = server
+        self.group = group
+        self.pattern = pattern
+        self.pipelines = [name.strip() for name in pipelines.split(',')] if pipelines else None
+        self.stage = stage
+        self.retrigger = retrigger
+        self.concurrency = int(concurrency)
+        self.rate_limit = TokenBucket(float(rate))
+        self.dry_run = str(dry_run).lower().strip() == 'true'
+
+    def run(self):
+        names = self._pipelines()
+        if not names:
+            return self._return_value('No pipelines selected', 1)
+
+        results = list(run_concurrently(self._scan, names, self.concurrency))
+        failed = [result for result in results if result['response'] is not None]
+        if not self.dry_run:
+            list(run_concurrently(self._retrigger, failed, self.concurrency))
+
+        errors = any(result['result'].startswith('error') for result in results)
+        return self._return_value(self._format_table(results), 3 if errors else 0)
+
+    def _pipelines(self):
+        # The pipeline groups are only needed to list or filter by group
+        pipeline_groups = None
+        if self.group or not self.pipelines:
+            pipeline_groups = self.server.pipeline_groups()
+
+        if self.pipelines:
+            names = set(self.pipelines)
+        else:
+            names = set(pipeline_groups.pipelines)
+
+        if self.group:
+            groups = pipeline_groups.response
+            names &= set(
+                pipeline['name']
+                for group in (groups.payload if groups else [])
+                if group['name'] == self.group
+                for pipeline in group['pipelines']
+            )
+
+        if self.pattern:
+            names = set(name for name in names if fnmatch.fnmatchcase(name, self.pattern))
+
+        return sorted(names)
+
+    def _scan(self, name):
+        command = RetriggerFailed(self.server, name, stage=self.stage, retrigger=self.retrigger)
+        result = dict(name=name, command=command, response=None, stage='', result='not failed')
+
+        try:
+            response, failed_stage = command._find_failed_stage()
+        except Exception as exc:
+            result['result'] = 'error: {0}'.format(exc)
+            return result
+
+        if command.counter is None:
+            result['result'] = 'no runs'
+        elif failed_stage:
+            result.update(
+                response=response,
+                stage=failed_stage['name'],
+                result='would retrigger' if self.dry_run else 'failed',
+            )
+
+        return result
+
+    def _retrigger(self, result):
+        self.rate_limit.acquire()
+        try:
+            response = result['command']._retrigger(result['response'])
+        except Exception as exc:
+            result['result'] = 'error: {0}'.format(exc)
+            return result
+
+        if response:
+            result['result'] = 'retriggered'
+        else:
+            result['result'] = 'error: retriggering failed with HTTP {0}'.format(
+                response.status_code)
+
+        return result
+
+    def _format_table(self, results):
+        rows = [('Pipeline', 'Failed stage', 'Result')]
+        rows.extend((result['name'], result['stage'], result['result']) for result in results)
+        widths = [max(len(row[column]) for row in rows) for column in range(2)]
+
+        return '\n'.join(
+            '{0:<{widths[0]}}  {1:<{widths[1]}}  {2}'.format(*row, widths=widths)
+            for row in rows
+        )
@@ -0,0 +1,263 @@
+from __future__ import print_function
+
+import sys
+import time
+
+from gocd_cli import multiplex
+from gocd_cli.command import BaseCommand
+from gocd_cli.multiplex import MultiplexClient
+from gocd_cli.retry import backoff_intervals
+
+__all__ = ['TriggerMany']
+
+FAILED_RESULTS = ('Failed', 'Cancelled')
+
+
+def run_outcome(run):
+    """The outcome of a pipeline `run` as far as it's known
+
+    Returns:
+      str: failed as soon as a stage has failed or been cancelled, passed
+        when every stage has passed, otherwise None
+    """
+    results = [stage.get('result') for stage in run.get('stages') or []]
+    if any(result in FAILED_RESULTS for result in results):
+        return 'failed'
+    elif results and all(result == 'Passed' for result in results):
+        return 'passed'
+
+    return None
+
+
+def parse_variables(value, pipelines):
+    """Parses a comma separated list of key=value pairs, the pairs
+    prefixed with pipeline: only apply to that pipeline
+
+    Args:
+      value (str): e.g. ``VERSION=1.4,deploy-web:CDN=purge``
+      pipelines (list): the names of the pipelines triggered
+
+    Returns:
+      dict: pipeline name to its variables, or None when it has none
+    """
+    shared = {}
+    specific = dict((name, {}) for name in pipelines)
+
+    for pair in (value or '').split(','):
+        if not pair:
+            continue
+
+        key, _, variable_value = pair.partition('=')
+        name, has_pipeline, key = key.rpartition(':')
+        if has_pipeline:
+            assert name in specific, '"{0}" isn\'t one of the pipelines'.format(name)
+            specific[name][key] = variable_value
+        else:
+            shared[key] = variable_value
+
+    return dict(
+        (name, dict(shared, **variables) or None)
+        for name, variables in specific.items()
+    )
+
+
+class TriggerMany(BaseCommand):
+    usage = """
+    Triggers many pipelines at the same time and waits until all of them
+    have finished. Every pipeline is printed with its counter and outcome
+    as soon as it's known, all of them are polled together from one thread.
+
+    A pipeline has failed as soon as one of its stages has failed or been
+    cancelled, and passed once all of its stages have passed.
+
+    Flags:
+        pipelines: A comma separated list of the pipelines to trigger
+        unlock: Whether the pipelines that are locked should be unlocked.
+          Default: false
+        variables: A comma separated list of key=value pairs that will
+          be passed to every pipeline, or pipeline:key=value pairs passed
+          to only that pipeline.
+          Example: VERSION=1.4,deploy-web:PURGE_CDN=true
+        secure_variables: Like variables.
+        wait_until_finished: Whether to wait until all pipelines have
+          finished. Default: true
+        fail_fast: Stop waiting as soon as one of the pipelines has failed.
+          Default: false
+        max_poll_interval: The longest time in seconds to wait between
+          checking whether the pipelines have finished. Default: 30
+        concurrency: How many requests to make at the same time.
+          Default: 100
+
+    Exits:
+        0: All pipelines were triggered, and passed when waiting
+        2: One or more pipelines failed
+        3: Triggering or checking one or more pipelines failed
+    """
+    usage_summary = 'Triggers many pipelines and waits until all have finished'
+
+    _initial_poll_interval = 1  # seconds
+
+    def __init__(self, server, pipelines, unlock=False, variables=None, secure_variables=None,
+                 wait_until_finished=True, fail_fast=False, max_poll_interval=30,
+                 concurrency=100):
+        self.server = server
+        self.pipelines = [name.strip() for name in pipelines.split(',') if name.strip()]
+        self.unlock = str(unlock).lower().strip() == 'true'
+        self.variables = parse_variables(variables, self.pipelines)
+        self.secure_variables = parse_variables(secure_variables, self.pipelines)
+        self.wait_until_finished = str(wait_until_finished).lower().strip() == 'true'
+        self.fail_fast = str(fail_fast).lower().strip() == 'true'
+        self.max_poll_interval = float(max_poll_interval)
+        self.concurrency = int(concurrency)
+
+        self.counters = {}
+        self.outcomes = {}
+        self.errors = {}
+
+    def run(self):
+        self.client = MultiplexClient(self.server, max_in_flight=self.concurrency)
+        try:
+            return self._run()
+        finally:
+            self.client.close()
+
+    def _run(self):
+        previous_counters = self._previous_counters() if self.wait_until_finished else {}
+        if self.unlock:
+            self._unlock()
+
+        triggered = self._schedule()
+        if self.wait_until_finished:
+            self._wait(triggered, previous_counters)
+
+        return self._summary(triggered)
+
+    def _map(self, builder, names):
+        """Yields (name, response, error) for every name, as they finish"""
+        calls = [builder(name, key=name) for name in names]
+        for call, response, error in self.client.map(calls, ordered=False):
+            yield call.key, response, error
+
+    def _previous_counters(self):
+        counters = {}
+        for name, response, error in self._map(multiplex.history, self._remaining()):
+            if error or not response:
+                self._fail(name, 'Failed to get the history', response, error)
+            else:
+                counters[name] = max([run['counter'] for run in response['pipelines']] or [0])
+
+        return counters
+
+    def _unlock(self):
+        locked = []
+        for name, response, error in self._map(multiplex.status, self._remaining()):
+            if error or not response:
+                self._fail(name, 'Failed to get the status', response, error)
+            elif response['locked']:
+                locked.append(name)
+
+        for name, response, error in self._map(multiplex.unlock, locked):
+            if error or not response:
+                self._fail(name, 'Failed to unlock', response, error)
+
+    def _schedule(self):
+        calls = [
+            multiplex.schedule(
+                name,
+                variables=self.variables[name],
+                secure_variables=self.secure_variables[name],
+                key=name,
+            )
+            for name in self._remaining()
+        ]
+
+        triggered = []
+        for call, response, error in self.client.map(calls, ordered=False):
+            if error or not response:
+                self._fail(call.key, 'Failed to trigger', response, error)
+            else:
+                triggered.append(call.key)
+
+        return triggered
+
+    def _wait(self, triggered, previous_counters):
+        waiting = set(triggered)
+        intervals = backoff_intervals(
+            initial=self._initial_poll_interval,
+            maximum=self.max_poll_interval,
+        )
+
+        while waiting:
+            time.sleep(next(intervals))
+
+            # Until the new run shows up in the history its counter isn't known
+            calls = [
+                multiplex.instance(name, self.counters[name], key=name)
+                if name in self.counters else multiplex.history(name, key=name)
+                for name in sorted(waiting)
+            ]
+            for call, response, error in self.client.map(calls, ordered=False):
+                name = call.key
+                if error or not response:
+                    self._fail(name, 'Failed to check', response, error)
+                    waiting.discard(name)
+                    continue
+
+                run = self._new_run(name, response, previous_counters.get(name, 0))
+                outcome = run_outcome(run) if run else None
+                if outcome:
+                    self.outcomes[name] = outcome
+                    waiting.discard(name)
+                    print('{0} {1} {2}'.format(name, self.counters[name], outcome))
+                    sys.stdout.flush()
+
+            if self.fail_fast and 'failed' in self.outcomes.values():
+                return
+
+    def _new_run(self, name, response, previous_counter):
+        if name in self.counters:
+            return response.payload
+
+        new_runs = [run for run in response['pipelines'] if run['counter'] > previous_counter]
+        if not new_runs:
+            return None
+
+        run = min(new_runs, key=lambda run: run['counter'])
+        self.counters[name] = run['counter']
+        return run
+
+    def _remaining(self):
+        return [name for name in self.pipelines if name not in self.errors]
+
+    def _fail(self, name, message, response, error):
+        if error is None:
+            error = 'HTTP {0} {1}'.format(response.status_code, response.body.strip()).strip()
+
+        self.errors[name] = '{0} "{1}": {2}'.format(message, name, error)
+
+    def _summary(self, triggered):
+        if not self.wait_until_finished:
+            output = ['Triggered {0} pipelines'.format(len(triggered))]
+        else:
+            outcomes = list(self.outcomes.values())
+            output = ['{0} passed, {1} failed'.format(
+                outcomes.count('passed'), outcomes.count('failed'),
+            )]
+
+            not_finished = sorted(
+                name for name in triggered
+                if name not in self.outcomes and name not in self.errors
+            )
+            if not_finished:
+                output.append('Not finished: {0}'.format(', '.join(not_finished)))
+
+        output.extend(self.errors[name] for name in sorted(self.errors))
+
+        if 'failed' in self.outcomes.values():
+            exit_code = 2
+        elif self.errors:
+            exit_code = 3
+        else:
+            exit_code = 0
+
+        return self._return_value('\n'.join(output), exit_code)
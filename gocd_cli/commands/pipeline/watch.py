@@ -0,0 +1,205 @@
+from __future__ import print_function
+
+import json
+import sys
+import time
+
+from gocd_cli.command import BaseCommand
+from gocd_cli.dashboard import (
+    dashboard_pipelines,
+    get_changed_dashboard,
+    instance_counter,
+    instance_stages,
+    is_paused,
+    latest_instance,
+)
+from gocd_cli.retry import backoff_intervals
+
+__all__ = ['Watch']
+
+BUILDING_STATUSES = ('Building', 'Scheduled', 'Assigned', 'Preparing')
+FAILED_STATUSES = ('Failed', 'Failing')
+
+
+def pipeline_state(pipeline):
+    """The state of a dashboard `pipeline` that transitions are found in
+
+    Returns:
+      dict: with run (the counter or label of the latest run), label,
+        result (building, failed, cancelled, passed or None when it has
+        never run), paused and locked
+    """
+    state = dict(
+        run=None,
+        label=None,
+        result=None,
+        paused=is_paused(pipeline),
+        locked=bool(pipeline.get('locked')),
+    )
+
+    instance = latest_instance(pipeline)
+    if instance is not None:
+        statuses = [stage.get('status') for stage in instance_stages(instance)]
+        state.update(
+            run=instance_counter(instance) or instance.get('label'),
+            label=instance.get('label'),
+            result=_result(statuses),
+        )
+
+    return state
+
+
+def _result(statuses):
+    if any(status in FAILED_STATUSES for status in statuses):
+        return 'failed'
+    elif any(status in BUILDING_STATUSES for status in statuses):
+        return 'building'
+    elif 'Cancelled' in statuses:
+        return 'cancelled'
+    elif 'Passed' in statuses:
+        return 'passed'
+
+    return None
+
+
+def transitions(old, new):
+    """Returns the events between the `old` and `new` state of a pipeline
+
+    A run that both started and finished between two polls gives both a
+    started event and its result.
+    """
+    events = []
+    if new['run'] is not None and new['run'] != old['run']:
+        events.append('started')
+        if new['result'] not in ('building', None):
+            events.append(new['result'])
+    elif new['result'] != old['result'] and new['result'] is not None:
+        # A stage was rerun or approved when building again
+        events.append('started' if new['result'] == 'building' else new['result'])
+
+    if new['paused'] != old['paused']:
+        events.append('paused' if new['paused'] else 'unpaused')
+
+    if new['locked'] != old['locked']:
+        events.append('locked' if new['locked'] else 'unlocked')
+
+    return events
+
+
+class Watch(BaseCommand):
+    usage = """
+    Watches the pipelines and prints a line whenever one of them is
+    started, passed, failed, cancelled, paused, unpaused, locked or
+    unlocked. Runs until interrupted.
+
+    The state of all pipelines comes from the dashboard in one conditional
+    request, which the Go server answers with 304 Not Modified when nothing
+    has changed. After a change the dashboard is polled every min_interval
+    seconds, backing off to max_interval while nothing changes.
+
+    Flags:
+        format: possible values (text, ndjson) default text.
+          When ndjson every event is printed as a JSON object on its
+          own line.
+        pipelines: A comma separated list of pipelines to watch.
+          Default: all pipelines
+        min_interval: The shortest time in seconds between polls.
+          Default: 2
+        max_interval: The longest time in seconds between polls.
+          Default: 30
+
+    Exits:
+        0: Interrupted
+        3: The Go server doesn't have a dashboard API
+    """
+    usage_summary = 'Prints every pipeline state change as it happens'
+
+    def __init__(self, server, format=None, pipelines=None, min_interval=2, max_interval=30):
+        assert format in ('text', 'ndjson', None), (
+            '"format" needs to be one of "text" or "ndjson"'
+        )
+
+        self.server = server
+        self.format = format or 'text'
+        self.pipelines = set(name.strip() for name in pipelines.split(',')) if pipelines else None
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max_interval)
+
+        self.etag = None
+        self.states = None
+
+    def run(self):
+        try:
+            self.poll()
+        except Exception as exc:
+            return self._return_value('Failed to get the dashboard: {0}'.format(exc), 3)
+
+        intervals = self._intervals()
+        try:
+            while True:
+                time.sleep(next(intervals))
+                try:
+                    events = self.poll()
+                except Exception as exc:  # e.g. the Go server restarting
+                    print('Error polling the dashboard: {0}'.format(exc), file=sys.stderr)
+                    continue
+
+                if events:
+                    for event in events:
+                        print(self._format_event(event))
+                    sys.stdout.flush()
+                    intervals = self._intervals()
+        except KeyboardInterrupt:
+            return self._return_value('', 0)
+
+    def poll(self):
+        """Polls the dashboard once
+
+        Returns:
+          list: the events since the last poll, each a dict with time,
+            pipeline, event, counter and label. Empty on the first poll,
+            which only records the current state.
+        """
+        dashboard, self.etag = get_changed_dashboard(self.server, self.etag)
+        if dashboard is None:
+            return []
+
+        states = dict(
+            (name, pipeline_state(pipeline))
+            for name, pipeline in dashboard_pipelines(dashboard).items()
+            if self.pipelines is None or name in self.pipelines
+        )
+
+        events = []
+        if self.states is not None:
+            now = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+            for name in sorted(states):
+                if name not in self.states:
+                    continue
+
+                events.extend(
+                    dict(
+                        time=now,
+                        pipeline=name,
+                        event=event,
+                        counter=states[name]['run'],
+                        label=states[name]['label'],
+                    )
+                    for event in transitions(self.states[name], states[name])
+                )
+
+        self.states = states
+        return events
+
+    def _intervals(self):
+        return backoff_intervals(initial=self.min_interval, factor=1.5,
+                                 maximum=self.max_interval)
+
+    def _format_event(self, event):
+        if self.format == 'ndjson':
+            return json.dumps(event, sort_keys=True)
+
+        return '{time} {pipeline}{run} {event}'.format(
+            run=' {0}'.format(event['label']) if event['label'] else '',
+            **event
+        )
@@ -0,0 +1,257 @@
+from __future__ import print_function
+
+import sys
+import tempfile
+from urllib2 import HTTPError
+
+from gocd.api import Pipeline
+
+from gocd_cli.utils import run_concurrently
+
+CONSOLE_LOG_PATH = (
+    'go/files/{pipeline}/{pipeline_counter}/{stage}/{stage_counter}/{job}/'
+    'cruise-output/console.log'
+)
+CHUNK_SIZE = 64 * 1024  # bytes
+SPOOL_SIZE = 256 * 1024  # bytes of a log kept in memory before it's moved to disk
+
+
+def console_log_path(pipeline, pipeline_counter, stage, stage_counter, job):
+    return CONSOLE_LOG_PATH.format(
+        pipeline=pipeline,
+        pipeline_counter=pipeline_counter,
+        stage=stage,
+        stage_counter=stage_counter,
+        job=job,
+    )
+
+
+def read_console(server, path, offset=0, chunk_size=CHUNK_SIZE, missing_ok=True):
+    """Yields a console log in chunks starting at byte `offset`
+
+    Only the bytes after `offset` are requested from the Go server, if
+    the server doesn't honor the range request the bytes before
+    `offset` are read and thrown away. At no point is more than
+    `chunk_size` bytes of the log held in memory.
+
+    Args:
+      server: A `gocd.Server` instance
+      path (str): The path to the console log on the Go server
+      offset (int): How many bytes of the log to skip. Default: 0
+      chunk_size (int): The max size of each yielded chunk
+      missing_ok (bool): When false a log that doesn't exist yet raises
+        its HTTPError 404 instead. Default: True
+
+    Yields:
+      str: the next chunk of the console log. Nothing is yielded when
+        the log doesn't exist yet or has no new bytes.
+    """
+    headers = {'Range': 'bytes={0}-'.format(offset)} if offset else None
+    try:
+        response = server.request(path, headers=headers)
+    except HTTPError as exc:
+        if exc.code == 416 or (exc.code == 404 and missing_ok):  # Nothing new or not started
+            return
+        raise
+
+    try:
+        skip = offset if response.code != 206 else 0
+        while skip > 0:
+            skipped = response.read(min(skip, chunk_size))
+            if not skipped:
+                return
+            skip -= len(skipped)
+
+        while True:
+            chunk = response.read(chunk_size)
+            if not chunk:
+                break
+
+            yield chunk
+    finally:
+        response.close()
+
+
+def finished_jobs(name, instance):
+    """Yields the metadata of every finished job in the pipeline `instance`
+    in stage and job order, like `gocd.api.Pipeline.console_output` does
+    """
+    for stage in instance['stages']:
+        for job in stage['jobs']:
+            if job['result'] not in Pipeline.final_results:
+                continue
+
+            yield {
+                'pipeline': name,
+                'pipeline_counter': instance['counter'],
+                'stage': stage['name'],
+                'stage_counter': stage['counter'],
+                'job': job['name'],
+                'job_result': job['result'],
+            }
+
+
+def spool_console(server, path, spool_size=SPOOL_SIZE):
+    """Downloads a console log in chunks into a temporary file
+
+    The file is only kept in memory while it's smaller than `spool_size`.
+
+    Returns:
+      file: positioned at the start of the log, close it when done
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=spool_size)
+    try:
+        for chunk in read_console(server, path):
+            spool.write(chunk)
+    except Exception:
+        spool.close()
+        raise
+
+    spool.seek(0)
+    return spool
+
+
+def console_outputs(server, name, instance, concurrency=1):
+    """Fetches the console logs of all finished jobs in `instance`,
+    `concurrency` of them at the same time
+
+    Every log is spooled to a temporary file as it's downloaded, so the
+    memory used doesn't depend on the size of the logs.
+
+    Yields:
+      tuple: (metadata, file) in stage and job order, with the same
+        metadata as `gocd.api.Pipeline.console_output`. Close each file
+        when done with it.
+    """
+    def fetch(metadata):
+        path = console_log_path(**dict(
+            (key, value) for key, value in metadata.items() if key != 'job_result'
+        ))
+        return metadata, spool_console(server, path)
+
+    return run_concurrently(fetch, finished_jobs(name, instance), concurrency)
+
+
+def matching_lines(chunks, regex):
+    """Searches a console log line by line as its chunks arrive
+
+    Args:
+      chunks: an iterable of the chunks of the log, e.g. :func:`read_console`
+      regex: a compiled regular expression
+
+    Yields:
+      tuple: (line number, line) for every line `regex` matches
+    """
+    line_number = 0
+    partial = ''
+    for chunk in chunks:
+        lines = (partial + chunk).split('\n')
+        partial = lines.pop()
+        for line in lines:
+            line_number += 1
+            if regex.search(line):
+                yield line_number, line.rstrip('\r')
+
+    if partial and regex.search(partial):
+        yield line_number + 1, partial.rstrip('\r')
+
+
+def file_chunks(source, chunk_size=CHUNK_SIZE):
+    """Yields the file `source` in chunks, e.g. for :func:`matching_lines`"""
+    return iter(lambda: source.read(chunk_size), '')
+
+
+def write_stripped(source, out, chunk_size=CHUNK_SIZE):
+    """Copies the file `source` to `out` in chunks without its leading and
+    trailing whitespace, like ``out.write(source.read().strip())``
+    """
+    started = False
+    held = ''  # Whitespace that's only written when more output follows it
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            return
+
+        if not started:
+            chunk = chunk.lstrip()
+            started = bool(chunk)
+
+        stripped = chunk.rstrip()
+        if stripped:
+            out.write(held)
+            out.write(stripped)
+            held = chunk[len(stripped):]
+        else:
+            held += chunk
+
+
+class ConsoleTail(object):
+    """Prints the new console output of all jobs in a pipeline instance
+
+    Every call to :meth:`update` prints what has been added to each job's
+    console log since the previous call, with a masthead whenever the
+    output switches to another job.
+
+    Args:
+      pipeline: A `gocd.api.Pipeline` instance
+      out: A file like object to write the output to. Default: sys.stdout
+    """
+    def __init__(self, pipeline, out=None):
+        self.pipeline = pipeline
+        self.out = out or sys.stdout
+        self.offsets = {}
+        self._finished = set()
+        self._current_job = None
+
+    def update(self, instance):
+        for stage in instance['stages']:
+            for job in stage.get('jobs', []):
+                metadata = {
+                    'pipeline': self.pipeline.name,
+                    'pipeline_counter': instance['counter'],
+                    'stage': stage['name'],
+                    'stage_counter': stage['counter'],
+                    'job': job['name'],
+                }
+                key = tuple(sorted(metadata.items()))
+                if key in self._finished or job.get('state') == 'Scheduled':
+                    continue
+
+                found = self._print_new_output(key, metadata)
+
+                # The output of a completed job can't change, the read above
+                # has picked up everything so there's no need to ask again.
+                # Go uploads the log after the job has its result, until
+                # then it's asked for again.
+                if found and job.get('result') in self.pipeline.final_results:
+                    self._finished.add(key)
+
+    def _print_new_output(self, key, metadata):
+        """Prints the new output of a job
+
+        Returns:
+          bool: whether the job's console log exists
+        """
+        offset = self.offsets.get(key, 0)
+        chunks = read_console(
+            self.pipeline.server, console_log_path(**metadata), offset, missing_ok=False,
+        )
+        try:
+            for chunk in chunks:
+                if self._current_job != key:
+                    job_masthead = ', '.join(('{0}="{1}"'.format(k, v) for k, v in key))
+                    print('\n\n=== {0} ===\n\n'.format(job_masthead), file=self.out)
+                    self._current_job = key
+
+                self.out.write(chunk)
+                offset += len(chunk)
+        except HTTPError as exc:
+            if exc.code != 404:
+                raise
+            exc.close()
+            return False
+        finally:
+            self.offsets[key] = offset
+            self.out.flush()
+
+        return True
@@ -0,0 +1,320 @@
+"""
+A long running gocd process that other gocd invocations hand their
+command lines to.
+
+The daemon keeps one configured `gocd.Server`, with its decrypted
+settings and open connections, and runs every command it's given
+against it. The ``gocd`` script forwards its arguments over a Unix socket
+when a daemon is listening and falls back to running the command itself
+when there's none.
+
+The protocol is one JSON object per line. The client sends
+``{"argv": [...], "cwd": "...", "environment": {...}}`` and the daemon
+answers with any number of ``{"output": "..."}`` followed by
+``{"exit_code": n}``. Relative paths given to a command are resolved
+against the client's ``cwd``.
+
+The settings can come from environment variables, so the client sends
+those it has and the daemon answers ``{"refused": "..."}`` when they
+aren't the ones it was started with. The client then runs the command
+itself, against the server and user its environment asks for.
+"""
+from __future__ import print_function
+
+import errno
+import json
+import os
+import socket
+import SocketServer
+import sys
+import threading
+import time
+import traceback
+
+from gocd_cli.utils import (
+    capture_output,
+    expand_user,
+    run_command,
+    system_exit_code,
+    working_directory,
+)
+
+DEFAULT_SOCKET = '~/.gocd/daemon.sock'
+
+#: Commands that depend on the caller's terminal or stdin, or that manage
+#: the daemon, always run in the calling process.
+LOCAL_COMMANDS = ('agent', 'batch', 'daemon', 'help')
+
+#: Subcommands that run until they're interrupted, in the daemon they'd
+#: keep running after the caller is gone.
+LOCAL_SUBCOMMANDS = (('pipeline', 'watch'),)
+
+#: The prefixes of the environment variables settings are read from, see
+#: `gocd_cli.utils.get_settings`
+SETTINGS_ENVIRONMENT = ('GOCD_', 'CHECK_ALL_')
+
+#: Environment variables with a settings prefix that aren't settings
+NOT_SETTINGS_ENVIRONMENT = ('GOCD_AGENT_SOCKET', 'GOCD_DAEMON_SOCKET')
+
+
+def socket_path(path=None):
+    """Returns the path of the daemon socket
+
+    Uses `path` when given, then the environment variable
+    ``GOCD_DAEMON_SOCKET`` and lastly `DEFAULT_SOCKET`. An empty
+    ``GOCD_DAEMON_SOCKET`` turns the daemon off and then None is returned.
+    """
+    if path:
+        return expand_user(path)
+
+    path = os.environ.get('GOCD_DAEMON_SOCKET', DEFAULT_SOCKET)
+    return expand_user(path) if path else None
+
+
+def settings_environment(environ=None):
+    """Returns the environment variables that settings are read from
+
+    Args:
+      environ (dict): Default: `os.environ`
+    """
+    environ = os.environ if environ is None else environ
+    return dict(
+        (name, value) for name, value in environ.items()
+        if name.startswith(SETTINGS_ENVIRONMENT) and name not in NOT_SETTINGS_ENVIRONMENT
+    )
+
+
+def connect(path=None, timeout=None):
+    """Returns a socket connected to the daemon or None if none is running
+
+    Args:
+      path (str): the socket. Default: see :func:`socket_path`
+      timeout (float): seconds connecting and every later send or receive
+        may take before raising `socket.timeout`. Default: None, no limit
+    """
+    path = socket_path(path)
+    if not path:
+        return None
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except socket.error as exc:
+        sock.close()
+        if exc.errno in (errno.ENOENT, errno.ECONNREFUSED):
+            return None
+        raise
+
+    return sock
+
+
+def send(sock, message):
+    """Sends `message` and yields all the messages the daemon replies with"""
+    sock.sendall('{0}\n'.format(json.dumps(message)))
+    for line in sock.makefile('rb'):
+        yield json.loads(line)
+
+
+def forward(argv, path=None, out=None):
+    """Runs the command line `argv` in the daemon, if one is running
+
+    Args:
+      argv (list): the arguments the gocd script was called with
+      path (str): the daemon socket. Default: see :func:`socket_path`
+      out: where to write the output of the command. Default: sys.stdout
+
+    Returns:
+      int: the exit code of the command or None if it wasn't forwarded,
+        also when the daemon refused it
+    """
+    if (len(argv) < 2 or argv[0].startswith('--') or argv[0] in LOCAL_COMMANDS
+            or tuple(argv[:2]) in LOCAL_SUBCOMMANDS):
+        return None
+
+    sock = connect(path)
+    if sock is None:
+        return None
+
+    out = out or sys.stdout
+    request = dict(argv=argv, cwd=os.getcwd(), environment=settings_environment())
+    try:
+        for message in send(sock, request):
+            if 'output' in message:
+                out.write(message['output'].encode('utf-8'))
+                out.flush()
+            elif 'exit_code' in message:
+                return message['exit_code']
+            elif 'refused' in message:
+                return None
+    finally:
+        sock.close()
+
+    out.write('The gocd daemon closed the connection before the command finished\n')
+    return 1
+
+
+class MessageWriter(object):
+    """A file like object that sends everything written as output messages"""
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, data):
+        if data:
+            self.send(output=data.decode('utf-8', 'replace') if isinstance(data, str) else data)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def send(self, **message):
+        self.wfile.write('{0}\n'.format(json.dumps(message)))
+        self.wfile.flush()
+
+
+class DaemonRequestHandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:  # Someone checking whether the daemon is running
+            return
+
+        self.server.request_started()
+        try:
+            self._handle(json.loads(line))
+        finally:
+            self.server.request_finished()
+
+    def _handle(self, message):
+        writer = MessageWriter(self.wfile)
+
+        if message.get('stop'):
+            writer.send(exit_code=0)
+            threading.Thread(target=self.server.shutdown).start()
+        elif message.get('status'):
+            writer.send(**self.server.status())
+        elif message.get('environment') != self.server.environment:
+            writer.send(refused='The settings environment differs from the daemon\'s')
+        else:
+            writer.send(exit_code=self._run(writer, message['argv'], message.get('cwd')))
+
+    def _run(self, writer, argv, cwd=None):
+        with capture_output(writer):
+            with working_directory(cwd):
+                try:
+                    exit_code, output = run_command(self.server.go_server, *argv)
+                    if output:
+                        print(output)
+
+                    return exit_code
+                except SystemExit as exc:
+                    return system_exit_code(exc)
+                except Exception:
+                    print(traceback.format_exc(), end='')
+                    return 1
+
+
+class UnixSocketServer(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    """A threaded server on a Unix socket that only the current user can
+    connect to. The socket is removed when the server is closed.
+
+    Args:
+      path (str): where to create the socket, any stale socket is replaced
+      handler_class: the `SocketServer.BaseRequestHandler` for each connection
+
+    Raises:
+      RuntimeError: when something is already listening on `path`
+    """
+    daemon_threads = True
+
+    def __init__(self, path, handler_class):
+        self.path = path
+
+        self._remove_stale_socket()
+        old_umask = os.umask(0o177)  # Only the current user may connect
+        try:
+            SocketServer.UnixStreamServer.__init__(self, path, handler_class)
+        finally:
+            os.umask(old_umask)
+
+    def server_close(self):
+        SocketServer.UnixStreamServer.server_close(self)
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.path):
+            return
+
+        sock = connect(self.path)
+        if sock is not None:
+            sock.close()
+            raise RuntimeError('Already listening on "{0}"'.format(self.path))
+
+        os.unlink(self.path)
+
+
+class DaemonServer(UnixSocketServer):
+    """Serves gocd command lines on a Unix socket
+
+    Only command lines from callers with the same settings environment as
+    the daemon are run, see :func:`settings_environment`.
+
+    Args:
+      path (str): where to create the socket, any stale socket is replaced
+      go_server: the `gocd.Server` all commands run against
+      idle_timeout (float): stop after this many seconds without any
+        requests, 0 means never. Default: 0
+    """
+    def __init__(self, path, go_server, idle_timeout=0):
+        self.go_server = go_server
+        # Decoded like the environment sent by clients
+        self.environment = json.loads(json.dumps(settings_environment()))
+        self.idle_timeout = idle_timeout
+        self.started_at = self.last_request_at = time.time()
+        self.requests = 0
+        self._active = 0
+        self._lock = threading.Lock()
+
+        UnixSocketServer.__init__(self, path, DaemonRequestHandler)
+
+    def serve_forever(self, poll_interval=0.5):
+        if self.idle_timeout:
+            watchdog = threading.Thread(target=self._stop_when_idle)
+            watchdog.daemon = True
+            watchdog.start()
+
+        try:
+            UnixSocketServer.serve_forever(self, poll_interval)
+        finally:
+            self.server_close()
+            while self._active:  # Let the commands already running finish
+                time.sleep(poll_interval)
+
+    def status(self):
+        return dict(
+            pid=os.getpid(),
+            uptime=int(time.time() - self.started_at),
+            requests=self.requests,
+            exit_code=0,
+        )
+
+    def request_started(self):
+        with self._lock:
+            self._active += 1
+            self.requests += 1
+
+    def request_finished(self):
+        with self._lock:
+            self._active -= 1
+            self.last_request_at = time.time()
+
+    def _stop_when_idle(self):
+        while True:
+            time.sleep(min(self.idle_timeout, 1))
+            with self._lock:
+                idle = not self._active and time.time() - self.last_request_at >= self.idle_timeout
+
+            if idle:
+                self.shutdown()
+                return
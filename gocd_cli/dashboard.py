@@ -0,0 +1,127 @@
+"""
+The Go dashboard API, the state of every pipeline in a single request.
+
+The dashboard has the latest instances of each pipeline with the status
+of their stages, whether the pipeline is paused and locked. That's enough
+to know the health of most pipelines without asking for the status and
+history of each one.
+"""
+import re
+from urllib2 import HTTPError
+
+from gocd.api.response import Response
+
+DASHBOARD_PATH = 'go/api/dashboard'
+DASHBOARD_ACCEPT = 'application/vnd.go.cd.v1+json'
+INSTANCE_HREF = re.compile(r'/instance/(?P<counter>\d+)/?$')
+
+
+def get_dashboard(server):
+    """Fetches the dashboard from the Go server
+
+    Args:
+      server (gocd.Server): the server to ask
+
+    Returns:
+      dict: the dashboard payload or None when the server doesn't have a
+        dashboard API, or didn't answer with one.
+    """
+    try:
+        response = Response._from_request(
+            server.request(DASHBOARD_PATH, headers={'Accept': DASHBOARD_ACCEPT})
+        )
+    except HTTPError:
+        return None
+
+    if not response or not response.is_json:
+        return None
+
+    return response.payload
+
+
+def dashboard_pipelines(dashboard):
+    """Returns a dict of pipeline name to pipeline from the `dashboard`
+
+    Handles both the layout where the pipelines are embedded in their
+    pipeline groups and the one where they're embedded at the top level.
+    """
+    embedded = dashboard.get('_embedded', {})
+    pipelines = list(embedded.get('pipelines', []))
+    for group in embedded.get('pipeline_groups', []):
+        pipelines.extend(group.get('_embedded', {}).get('pipelines', []))
+
+    return dict((pipeline['name'], pipeline) for pipeline in pipelines)
+
+
+def is_paused(pipeline):
+    """Whether the dashboard `pipeline` is paused"""
+    return bool(pipeline.get('pause_info', {}).get('paused'))
+
+
+def latest_instance(pipeline):
+    """Returns the most recently scheduled instance of the dashboard
+    `pipeline` or None if it has never been scheduled.
+    """
+    instances = pipeline.get('_embedded', {}).get('instances', [])
+    if not instances:
+        return None
+
+    return max(instances, key=lambda instance: instance.get('schedule_at', 0))
+
+
+def instance_stages(instance):
+    """Returns the stages of a dashboard pipeline `instance`"""
+    return instance.get('_embedded', {}).get('stages', [])
+
+
+def instance_counter(instance):
+    """Returns the pipeline counter of a dashboard `instance`
+
+    The dashboard only has the counter in the link to the instance, the
+    label is used when it's a number and there's no link. Otherwise None.
+    """
+    href = instance.get('_links', {}).get('self', {}).get('href', '')
+    match = INSTANCE_HREF.search(href)
+    if match:
+        return int(match.group('counter'))
+
+    label = str(instance.get('label') or '')
+    return int(label) if label.isdigit() else None
+
+
+def get_changed_dashboard(server, etag=None):
+    """Fetches the dashboard unless it hasn't changed since `etag`
+
+    The request is conditional, so when nothing has changed the Go server
+    only answers with 304 Not Modified instead of the whole dashboard.
+
+    Args:
+      server (gocd.Server): the server to ask
+      etag (str): the ETag of the last dashboard fetched. Default: None
+
+    Returns:
+      tuple: the dashboard payload, or None when it hasn't changed, and
+        the ETag to pass on the next call
+
+    Raises:
+      HTTPError: when the Go server answers with an error
+      ValueError: when the answer isn't a dashboard
+    """
+    headers = {'Accept': DASHBOARD_ACCEPT}
+    if etag:
+        headers['If-None-Match'] = etag
+
+    try:
+        response = server.request(DASHBOARD_PATH, headers=headers)
+    except HTTPError as exc:
+        if exc.code != 304:
+            raise
+
+        exc.read()  # Hands the connection back to the pool
+        return None, etag
+
+    dashboard = Response._from_request(response)
+    if not dashboard.is_json:
+        raise ValueError('Expected the dashboard, got "{0}"'.format(dashboard.content_type))
+
+    return dashboard.payload, response.headers.get('ETag')
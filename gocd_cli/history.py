@@ -0,0 +1,219 @@
+"""
+A local SQLite mirror of the pipeline, stage and job history of a Go server.
+
+Every pipeline has a high-water mark, the highest counter below which all
+runs have finished and been stored, so a sync only has to fetch the runs
+after it. Runs still building are stored as well but fetched again on the
+next sync.
+
+The tables are ``pipelines``, ``pipeline_runs``, ``stages`` and ``jobs``,
+all timestamps are in milliseconds since the epoch like in the Go API.
+"""
+import errno
+import json
+import os
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pipelines (
+    name TEXT PRIMARY KEY,
+    high_water_mark INTEGER NOT NULL DEFAULT 0,
+    synced_at INTEGER
+);
+CREATE TABLE IF NOT EXISTS pipeline_runs (
+    pipeline TEXT NOT NULL,
+    counter INTEGER NOT NULL,
+    label TEXT,
+    result TEXT,
+    scheduled_at INTEGER,
+    trigger_message TEXT,
+    build_cause TEXT,
+    PRIMARY KEY (pipeline, counter)
+);
+CREATE TABLE IF NOT EXISTS stages (
+    pipeline TEXT NOT NULL,
+    pipeline_counter INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    counter INTEGER NOT NULL,
+    result TEXT,
+    approved_by TEXT,
+    scheduled_at INTEGER,
+    PRIMARY KEY (pipeline, pipeline_counter, name, counter)
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    pipeline TEXT NOT NULL,
+    pipeline_counter INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    stage_counter INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    state TEXT,
+    result TEXT,
+    scheduled_at INTEGER,
+    PRIMARY KEY (pipeline, pipeline_counter, stage, stage_counter, name)
+);
+CREATE INDEX IF NOT EXISTS pipeline_runs_result ON pipeline_runs (result);
+CREATE INDEX IF NOT EXISTS pipeline_runs_scheduled_at ON pipeline_runs (scheduled_at);
+CREATE INDEX IF NOT EXISTS stages_result ON stages (result);
+CREATE INDEX IF NOT EXISTS stages_scheduled_at ON stages (scheduled_at);
+CREATE INDEX IF NOT EXISTS jobs_result ON jobs (result);
+CREATE INDEX IF NOT EXISTS jobs_scheduled_at ON jobs (scheduled_at);
+"""
+
+
+def is_finished(run):
+    """Whether every job of the pipeline `run` has completed"""
+    return all(
+        job.get('state') == 'Completed'
+        for stage in run['stages']
+        for job in stage['jobs']
+    )
+
+
+def run_result(run):
+    """The result of a pipeline `run`, the first stage result that isn't Passed"""
+    return next(
+        (stage['result'] for stage in run['stages'] if stage.get('result') != 'Passed'),
+        'Passed'
+    )
+
+
+def fetch_new_runs(pipeline, since=0):
+    """Fetches all runs of `pipeline` with a counter higher than `since`
+
+    Args:
+      pipeline: a `gocd.api.Pipeline`
+      since (int): the highest counter already stored. Default: 0
+
+    Returns:
+      list: the pipeline runs, newest first
+
+    Raises:
+      Exception: when the Go server returns an error
+    """
+    runs = []
+    offset = 0
+
+    while True:
+        response = pipeline.history(offset)
+        if not response:
+            raise Exception('Failed to get the history: HTTP {0}'.format(response.status_code))
+
+        page = response['pipelines']
+        runs.extend(run for run in page if run['counter'] > since)
+
+        offset += len(page)
+        total = response.payload.get('pagination', {}).get('total')
+        if not page or page[-1]['counter'] <= since or (total is not None and offset >= total):
+            return runs
+
+
+def high_water_mark(runs, since=0):
+    """The highest counter in `runs` below which every run has finished
+
+    Args:
+      runs (list): the new runs, newest first
+      since (int): the high-water mark before these runs
+    """
+    mark = since
+    for run in reversed(runs):
+        if not is_finished(run):
+            break
+        mark = run['counter']
+
+    return mark
+
+
+def _earliest_scheduled(stage):
+    dates = [job['scheduled_date'] for job in stage['jobs'] if job.get('scheduled_date')]
+    return min(dates) if dates else None
+
+
+class HistoryStore(object):
+    """The SQLite database that the history is mirrored to
+
+    Only use a store from the thread that created it.
+
+    Args:
+      path (str): the database file, it's created when missing
+    """
+    def __init__(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            try:
+                os.makedirs(directory, 0o700)
+            except OSError as exc:
+                if exc.errno != errno.EEXIST:
+                    raise
+
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def high_water_marks(self):
+        """Returns a dict of pipeline name to its high-water mark"""
+        return dict(self.connection.execute('SELECT name, high_water_mark FROM pipelines'))
+
+    def store(self, pipeline, runs, mark, synced_at):
+        """Stores the `runs` of `pipeline` and its new high-water `mark`
+
+        Everything is stored in one transaction, the runs are replaced when
+        they have been stored before.
+        """
+        with self.connection:
+            for run in runs:
+                self._store_run(pipeline, run)
+
+            self.connection.execute(
+                'INSERT OR REPLACE INTO pipelines (name, high_water_mark, synced_at) '
+                'VALUES (?, ?, ?)',
+                (pipeline, mark, synced_at),
+            )
+
+    def close(self):
+        self.connection.close()
+
+    def _store_run(self, pipeline, run):
+        stages = run['stages']
+        build_cause = run.get('build_cause') or {}
+        self.connection.execute(
+            'INSERT OR REPLACE INTO pipeline_runs VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (
+                pipeline,
+                run['counter'],
+                run.get('label'),
+                run_result(run),
+                _earliest_scheduled(stages[0]) if stages else None,
+                build_cause.get('trigger_message'),
+                json.dumps(build_cause),
+            ),
+        )
+
+        for stage in stages:
+            stage_counter = int(stage.get('counter') or 1)
+            self.connection.execute(
+                'INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (
+                    pipeline,
+                    run['counter'],
+                    stage['name'],
+                    stage_counter,
+                    stage.get('result'),
+                    stage.get('approved_by'),
+                    _earliest_scheduled(stage),
+                ),
+            )
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [
+                    (
+                        pipeline,
+                        run['counter'],
+                        stage['name'],
+                        stage_counter,
+                        job['name'],
+                        job.get('state'),
+                        job.get('result'),
+                        job.get('scheduled_date'),
+                    )
+                    for job in stage['jobs']
+                ],
+            )
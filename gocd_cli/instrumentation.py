@@ -0,0 +1,170 @@
+"""
+Records every request made to the Go server, for finding out which
+endpoints a command calls, how often and how long they take.
+
+Paths are grouped by their template, e.g. ``go/api/pipelines/:pipeline/status``,
+so the calls for all pipelines add up in the same row of the summary.
+"""
+from __future__ import print_function
+
+import json
+import math
+import re
+import sys
+import threading
+
+PATH_TEMPLATES = (
+    (re.compile(r'^go/api/pipelines/[^/]+/'), 'go/api/pipelines/:pipeline/'),
+    (re.compile(r'^go/api/stages/[^/]+/[^/]+/'), 'go/api/stages/:pipeline/:stage/'),
+    (re.compile(r'^go/files/[^/]+/\d+/[^/]+/\d+/[^/]+/'),
+     'go/files/:pipeline/:counter/:stage/:stage_counter/:job/'),
+    (re.compile(r'^go/run/[^/]+/\d+/[^/]+$'), 'go/run/:pipeline/:counter/:stage'),
+    (re.compile(r'/\d+(?=/|$)'), '/:n'),
+)
+
+
+def path_template(path):
+    """Returns `path` with the pipeline names, counters etc. replaced by placeholders"""
+    path = path.split('?', 1)[0].lstrip('/')
+    for pattern, template in PATH_TEMPLATES:
+        path = pattern.sub(template, path)
+
+    return path
+
+
+def percentile(values, fraction):
+    """The nearest-rank percentile of the sorted `values`"""
+    if not values:
+        return 0
+
+    return values[max(int(math.ceil(fraction * len(values))) - 1, 0)]
+
+
+class RequestRecorder(object):
+    """Keeps a record of the method, path, status, latency and response
+    size of every request.
+
+    The latency is the time until the response headers have arrived, the
+    size is the number of body bytes read, which is counted as they're read.
+    """
+    def __init__(self):
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, method, path, status, latency, size=0, started_at=None):
+        """Adds a request and returns its record
+
+        The record is a dict, ``size`` is updated on it as the body is read.
+        """
+        record = dict(
+            method=method,
+            path=path,
+            template=path_template(path),
+            status=status,
+            started_at=started_at,
+            latency=latency,
+            size=size,
+        )
+        with self._lock:
+            self.records.append(record)
+
+        return record
+
+    def summary(self):
+        """Returns a list of per endpoint dicts ordered by the total time spent
+
+        Each has method, template, count, p50, p95, max (latencies in seconds),
+        total (seconds) and bytes.
+        """
+        endpoints = {}
+        with self._lock:
+            for record in self.records:
+                endpoints.setdefault((record['method'], record['template']), []).append(record)
+
+        rows = []
+        for (method, template), records in endpoints.items():
+            latencies = sorted(record['latency'] for record in records)
+            rows.append(dict(
+                method=method,
+                template=template,
+                count=len(records),
+                p50=percentile(latencies, 0.5),
+                p95=percentile(latencies, 0.95),
+                max=latencies[-1],
+                total=sum(latencies),
+                bytes=sum(record['size'] for record in records),
+            ))
+
+        return sorted(rows, key=lambda row: (-row['total'], row['template']))
+
+    def format_summary(self):
+        rows = self.summary()
+        lines = [
+            'HTTP requests: {0}, {1} bytes received'.format(
+                sum(row['count'] for row in rows),
+                sum(row['bytes'] for row in rows),
+            ),
+            '{0:<6} {1:<56} {2:>6} {3:>9} {4:>9} {5:>9} {6:>11}'.format(
+                'method', 'endpoint', 'count', 'p50 ms', 'p95 ms', 'max ms', 'bytes'),
+        ]
+        for row in rows:
+            lines.append('{0:<6} {1:<56} {2:>6} {3:>9.1f} {4:>9.1f} {5:>9.1f} {6:>11}'.format(
+                row['method'],
+                row['template'],
+                row['count'],
+                row['p50'] * 1000,
+                row['p95'] * 1000,
+                row['max'] * 1000,
+                row['bytes'],
+            ))
+
+        return '\n'.join(lines)
+
+    def write_trace(self, path):
+        """Writes all records as JSON to `path`"""
+        with self._lock:
+            records = list(self.records)
+
+        with open(path, 'w') as fp:
+            json.dump(dict(requests=records), fp, indent=2)
+
+
+def report(recorder, trace_path=None, out=None):
+    """Prints the summary of `recorder` and writes the trace file
+
+    Args:
+      recorder: a :class:`RequestRecorder`
+      trace_path (str): where to write the JSON trace, no trace when falsey
+      out: where to print the summary. Default: sys.stderr
+    """
+    print(recorder.format_summary(), file=out or sys.stderr)
+    if trace_path:
+        recorder.write_trace(trace_path)
+
+
+class RecordedResponse(object):
+    """Wraps a urllib2 response and counts the body bytes read into `record`"""
+    def __init__(self, response, record):
+        self._response = response
+        self._record = record
+
+    def read(self, *args):
+        data = self._response.read(*args)
+        self._record['size'] += len(data)
+        return data
+
+    def readline(self, *args):
+        data = self._response.readline(*args)
+        self._record['size'] += len(data)
+        return data
+
+    def readlines(self, *args):
+        lines = self._response.readlines(*args)
+        self._record['size'] += sum(len(line) for line in lines)
+        return lines
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
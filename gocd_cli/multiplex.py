@@ -0,0 +1,679 @@
+"""
+Makes many requests to the Go server at the same time from one thread.
+
+Python 2 has no asyncio, so this is a small event loop of its own over
+non-blocking sockets. Every connection has one request in flight and is
+kept open for the next one. The sockets are waited on with ``select.poll``
+where it's available, so the number of connections isn't limited to
+what ``select.select`` can handle.
+
+The requests are built by `gocd_cli.server.Server`, so they carry the same
+authentication and session cookie as those made through it, and they're
+recorded in its recorder when ``--profile-http`` is given. Its governor's
+rate limit, max in flight and pauses after 429 and 503 responses apply as
+well, as do its retrier and circuit breaker. Proxies aren't supported, use
+the thread backend for a Go server behind one.
+
+Example:
+    client = MultiplexClient(server, max_in_flight=1000)
+    for call, response, error in client.map(status(name) for name in names):
+        ...
+"""
+import errno
+import heapq
+import httplib
+import os
+import select
+import socket
+import ssl
+import tempfile
+import time
+from collections import deque
+from StringIO import StringIO
+from urllib import splitport
+from urllib2 import HTTPError
+
+from gocd.api.response import Response
+
+from gocd_cli.console import SPOOL_SIZE, finished_jobs
+from gocd_cli.retry import TRANSIENT_STATUSES, CircuitOpenError, is_transient
+
+READ = 1
+WRITE = 2
+
+CONSOLE_PATH = 'go/files/{0}/{1}/{2}/{3}/{4}/cruise-output/console.log'
+
+# Errors from a non-blocking socket meaning it isn't ready yet
+_NOT_READY = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINPROGRESS, errno.EINTR)
+
+
+class Call(object):
+    """A request to make with :meth:`MultiplexClient.map`
+
+    Args:
+      path (str): The path on the Go server
+      data: The POST data, the request is a GET when None
+      headers (dict): Extra request headers
+      ok_status (int): The status of a successful response. Default: 200
+      key: Anything identifying the call to the caller
+      spool (int): When given the response body is written to a temporary
+        file, which is only kept in memory while it's smaller than this
+        many bytes, and is the `fp` of the response. Default: None
+    """
+    def __init__(self, path, data=None, headers=None, ok_status=None, key=None, spool=None):
+        self.path = path
+        self.data = data
+        self.headers = headers
+        self.ok_status = ok_status
+        self.key = key
+        self.spool = spool
+
+
+def pipeline_groups(key=None):
+    return Call('go/api/config/pipeline_groups', key=key)
+
+
+def status(name, key=None):
+    return Call('go/api/pipelines/{0}/status'.format(name), key=key)
+
+
+def history(name, offset=0, key=None):
+    return Call('go/api/pipelines/{0}/history/{1:d}'.format(name, offset or 0), key=key)
+
+
+def instance(name, counter, key=None):
+    return Call('go/api/pipelines/{0}/instance/{1:d}'.format(name, int(counter)), key=key)
+
+
+def schedule(name, variables=None, secure_variables=None, key=None):
+    data = dict(
+        (k, v) for k, v in dict(variables=variables, secure_variables=secure_variables).items()
+        if v is not None
+    )
+    return Call('go/api/pipelines/{0}/schedule'.format(name), data=data,
+                headers={'Confirm': True}, ok_status=202, key=key)
+
+
+def unlock(name, key=None):
+    return Call('go/api/pipelines/{0}/releaseLock'.format(name), data={},
+                headers={'Confirm': True}, key=key)
+
+
+def console(name, counter, stage, stage_counter, job, key=None):
+    return Call(CONSOLE_PATH.format(name, counter, stage, stage_counter, job), key=key,
+                spool=SPOOL_SIZE)
+
+
+def latest_instance(history_response):
+    """Returns the latest instance in a :func:`history` response, like
+    `gocd.api.Pipeline.instance` does without a counter.
+    """
+    if not history_response:
+        return history_response
+
+    pipelines = history_response['pipelines']
+    return Response._from_json(pipelines[0] if pipelines else {})
+
+
+def console_output(client, name, pipeline_instance):
+    """Fetches the console logs of all finished jobs in `pipeline_instance`
+    at the same time, like `gocd_cli.console.console_outputs`
+
+    Yields:
+      tuple: (metadata, file) in stage and job order. A log that doesn't
+        exist is empty. Close each file when done with it.
+
+    Raises:
+      socket.error: when a console log couldn't be fetched
+      HTTPError: when the Go server answered with an error, like
+        `gocd_cli.console.read_console`
+    """
+    jobs = list(finished_jobs(name, pipeline_instance))
+    calls = [
+        console(name, metadata['pipeline_counter'], metadata['stage'],
+                metadata['stage_counter'], metadata['job'])
+        for metadata in jobs
+    ]
+
+    for metadata, (call, response, error) in zip(jobs, client.map(calls)):
+        if error:
+            raise error
+
+        if response.status_code == 404:  # Like read_console, the log isn't there yet
+            response.fp.close()
+            yield metadata, StringIO('')
+        elif not response:
+            raise HTTPError(
+                call.path,
+                response.status_code,
+                httplib.responses.get(response.status_code, ''),
+                response.headers,
+                response.fp,
+            )
+        else:
+            yield metadata, response.fp
+
+
+class MultiplexClient(object):
+    """Makes requests to the Go server concurrently on one thread
+
+    Args:
+      server (gocd_cli.server.Server): The server the requests are built by
+      max_in_flight (int): The max number of requests, and connections,
+        at the same time. Default: 100
+      timeout (float): Seconds without any progress before a request
+        fails. Default: 60
+    """
+    def __init__(self, server, max_in_flight=100, timeout=60):
+        self.server = server
+        self.max_in_flight = max(int(max_in_flight), 1)
+        self.timeout = timeout
+        self._idle = {}  # (scheme, host, port): [_Connection]
+        self._addresses = {}
+
+    def map(self, calls, ordered=True):
+        """Makes all `calls`, at most `max_in_flight` at a time
+
+        Args:
+          calls: An iterable of :class:`Call`
+          ordered (bool): When true the results are yielded in the order of
+            `calls`, otherwise as soon as they finish. Default: True
+
+        Yields:
+          tuple: (call, response, error) for every call. The response is a
+            `gocd.api.response.Response`, or None when the request failed
+            with error, e.g. a `socket.error` or `socket.timeout`.
+        """
+        pending = deque(enumerate(calls))
+        poller = _Poller()
+        transfers = {}  # fd: _Transfer
+        done = {}  # index: result, before deciding whether to retry it
+        finished = {}  # index: result
+        delayed = []  # heap of (retry at, index, call)
+        retries = {}  # index: the number of retries so far
+        next_index = 0
+
+        governor = getattr(self.server, 'governor', None)
+        retrier = getattr(self.server, 'retrier', None)
+        breaker = retrier.breaker if retrier is not None else None
+        max_in_flight = self.max_in_flight
+        if governor is not None and governor.max_in_flight:
+            max_in_flight = min(max_in_flight, governor.max_in_flight)
+
+        try:
+            while pending or transfers or finished or delayed:
+                now = time.time()
+                while delayed and delayed[0][0] <= now:
+                    _, index, call = heapq.heappop(delayed)
+                    pending.appendleft((index, call))
+
+                wait = delayed[0][0] - now if delayed else 0
+                while pending and len(transfers) < max_in_flight:
+                    wait = governor.try_acquire() if governor is not None else 0
+                    if wait:
+                        break
+
+                    index, call = pending.popleft()
+                    try:
+                        if breaker is not None:
+                            breaker.before()
+                    except CircuitOpenError as exc:
+                        finished[index] = (call, None, exc)
+                        continue
+
+                    self._start(index, call, transfers, done, poller)
+
+                if wait and not transfers and not done:
+                    time.sleep(wait)
+                elif transfers:
+                    for fd in poller.poll(min(self.timeout, wait or 1)):
+                        transfer = transfers.get(fd)
+                        if transfer is not None:
+                            self._advance(transfer, transfers, done, poller)
+
+                    self._expire(transfers, done, poller)
+
+                for index, (call, response, error) in sorted(done.items()):
+                    del done[index]
+                    delay = self._retry_delay(retrier, retries.get(index, 0), call,
+                                              response, error)
+                    if delay is None:
+                        finished[index] = (call, response, error)
+                    else:
+                        retries[index] = retries.get(index, 0) + 1
+                        heapq.heappush(delayed, (time.time() + delay, index, call))
+
+                if ordered:
+                    while next_index in finished:
+                        yield finished.pop(next_index)
+                        next_index += 1
+                else:
+                    for index in sorted(finished):
+                        yield finished.pop(index)
+        finally:
+            for transfer in transfers.values():
+                transfer.connection.close()
+
+    def close(self):
+        """Closes all idle connections"""
+        for connections in self._idle.values():
+            for connection in connections:
+                connection.close()
+        self._idle.clear()
+
+    def _retry_delay(self, retrier, retries, call, response, error):
+        """Tells the server's retrier and circuit breaker about the outcome
+        of `call`, like `gocd_cli.retry.Retrier.call` does
+
+        Returns:
+          float: seconds until `call` is retried, or None when it's done
+        """
+        if retrier is None:
+            return None
+
+        if error is not None:
+            transient = is_transient(error)
+        else:
+            transient = response.status_code in TRANSIENT_STATUSES
+
+        if retrier.breaker is not None:
+            if transient:
+                retrier.breaker.failed()
+            else:
+                retrier.breaker.succeeded()
+
+        if not transient or call.data is not None or retries >= retrier.retries:
+            return None
+
+        return retrier.interval(retries)
+
+    def _start(self, index, call, transfers, finished, poller, fresh=False):
+        request = self.server._request(call.path, data=call.data, headers=call.headers)
+        try:
+            connection, reused = self._connection(request, fresh)
+        except socket.error as exc:
+            finished[index] = (call, None, exc)
+            return
+
+        transfer = _Transfer(index, call, request, connection, reused)
+        transfers[connection.fileno()] = transfer
+        poller.register(connection.fileno(), transfer.events())
+
+    def _advance(self, transfer, transfers, finished, poller):
+        fd = transfer.connection.fileno()
+        try:
+            done = transfer.advance()
+        except (socket.error, ssl.SSLError, ValueError) as exc:
+            del transfers[fd]
+            poller.unregister(fd)
+            transfer.connection.close()
+            if transfer.reused and not transfer.parser.received:
+                # The server closed the idle connection, retry on a new one
+                self._start(transfer.index, transfer.call, transfers, finished, poller,
+                            fresh=True)
+            else:
+                finished[transfer.index] = (transfer.call, None, exc)
+            return
+
+        if not done:
+            poller.register(fd, transfer.events())
+            return
+
+        del transfers[fd]
+        poller.unregister(fd)
+        finished[transfer.index] = (transfer.call, self._finish(transfer), None)
+
+    def _expire(self, transfers, finished, poller):
+        now = time.time()
+        for fd, transfer in list(transfers.items()):
+            if now - transfer.active_at > self.timeout:
+                del transfers[fd]
+                poller.unregister(fd)
+                transfer.connection.close()
+                finished[transfer.index] = (transfer.call, None, socket.timeout('timed out'))
+
+    def _finish(self, transfer):
+        parser = transfer.parser
+        if isinstance(parser.body, list):
+            body = ''.join(parser.body)
+        else:
+            body = parser.body
+            body.seek(0)
+
+        response = Response(
+            parser.status,
+            body,
+            parser.headers,
+            ok_status=transfer.call.ok_status,
+        )
+        self.server._set_session_cookie(response)
+
+        governor = getattr(self.server, 'governor', None)
+        if governor is not None:
+            governor.record(parser.status, parser.headers.get('retry-after'))
+
+        if self.server.recorder:
+            self.server.recorder.record(
+                transfer.request.get_method(), transfer.call.path, parser.status,
+                transfer.latency or time.time() - transfer.started_at,
+                size=parser.body_size, started_at=transfer.started_at,
+            )
+
+        if parser.will_close:
+            transfer.connection.close()
+        else:
+            idle = self._idle.setdefault(transfer.connection.key, [])
+            if len(idle) < self.max_in_flight:
+                idle.append(transfer.connection)
+            else:
+                transfer.connection.close()
+
+        return response
+
+    def _connection(self, request, fresh):
+        scheme = request.get_type()
+        host, port = splitport(request.get_host())
+        port = int(port or (443 if scheme == 'https' else 80))
+        key = (scheme, host, port)
+
+        idle = self._idle.get(key)
+        if idle and not fresh:
+            return idle.pop(), True
+
+        if key not in self._addresses:
+            self._addresses[key] = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0]
+
+        return _Connection(key, self._addresses[key]), False
+
+
+class _Connection(object):
+    """A non-blocking connection to the Go server"""
+    def __init__(self, key, address):
+        self.key = key
+        self.scheme, self.host, _ = key
+        self.connected = False
+        self.secured = self.scheme != 'https'
+
+        family, socktype, proto, _, sockaddr = address
+        self.sock = socket.socket(family, socktype, proto)
+        self.sock.setblocking(0)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        err = self.sock.connect_ex(sockaddr)
+        if err and err not in _NOT_READY:
+            self.sock.close()
+            raise socket.error(err, os.strerror(err))
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def finish_connect(self):
+        err = self.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err:
+            raise socket.error(err, os.strerror(err))
+
+        self.connected = True
+        if not self.secured:
+            if hasattr(ssl, 'create_default_context'):
+                context = ssl._create_default_https_context()
+                self.sock = context.wrap_socket(self.sock, server_hostname=self.host,
+                                                do_handshake_on_connect=False)
+            else:
+                self.sock = ssl.wrap_socket(self.sock, do_handshake_on_connect=False)
+
+    def close(self):
+        self.sock.close()
+
+
+class _Transfer(object):
+    """One request and its response on a :class:`_Connection`"""
+    def __init__(self, index, call, request, connection, reused):
+        self.index = index
+        self.call = call
+        self.request = request
+        self.connection = connection
+        self.reused = reused
+        self.data = _request_bytes(request)
+        self.parser = _ResponseParser(
+            request.get_method(),
+            tempfile.SpooledTemporaryFile(max_size=call.spool) if call.spool else None,
+        )
+        self.started_at = self.active_at = time.time()
+        self.latency = None
+        self._want = WRITE
+
+    def events(self):
+        return self._want
+
+    def advance(self):
+        """Makes as much progress as the socket allows
+
+        Returns:
+          bool: whether the response has been received
+        """
+        self.active_at = time.time()
+        connection = self.connection
+        try:
+            if not connection.connected:
+                connection.finish_connect()
+
+            if not connection.secured:
+                connection.sock.do_handshake()
+                connection.secured = True
+
+            if self.data:
+                self._want = WRITE
+                sent = connection.sock.send(self.data)
+                self.data = self.data[sent:]
+                if self.data:
+                    return False
+
+            self._want = READ
+            return self._receive()
+        except ssl.SSLError as exc:
+            if exc.args[0] == ssl.SSL_ERROR_WANT_READ:
+                self._want = READ
+            elif exc.args[0] == ssl.SSL_ERROR_WANT_WRITE:
+                self._want = WRITE
+            else:
+                raise
+        except socket.error as exc:
+            if exc.args[0] not in _NOT_READY:
+                raise
+
+        return False
+
+    def _receive(self):
+        while True:
+            data = self.connection.sock.recv(65536)
+            if not data:
+                if self.parser.feed_eof():
+                    return True
+                raise socket.error(errno.ECONNRESET, 'Connection closed by the Go server')
+
+            done = self.parser.feed(data)
+            if self.latency is None and self.parser.headers is not None:
+                self.latency = time.time() - self.started_at
+
+            if done:
+                return True
+
+            # Decrypted data can be waiting that poll won't tell about
+            if not getattr(self.connection.sock, 'pending', lambda: 0)():
+                return False
+
+
+class _ResponseParser(object):
+    """Parses an HTTP/1.1 response as it arrives
+
+    The body is collected in a list of strings, or written to the file
+    `body` when given.
+    """
+    def __init__(self, method, body=None):
+        self.method = method
+        self.received = 0
+        self.status = None
+        self.headers = None
+        self.body = [] if body is None else body
+        self._write = self.body.append if body is None else body.write
+        self.body_size = 0
+        self.will_close = False
+        self._buffer = ''
+        self._remaining = None  # Body bytes left, None until the connection closes
+        self._chunked = False
+        self._chunk_left = None  # None while waiting for a chunk size line
+        self._trailer = False
+        self._done = False
+
+    def feed(self, data):
+        """Adds received `data`, returns whether the response is complete"""
+        self.received += len(data)
+        self._buffer += data
+        while self.headers is None:
+            if not self._parse_head():
+                return False
+
+        return self._parse_body()
+
+    def feed_eof(self):
+        """The connection was closed, returns whether the response is complete"""
+        if self.headers is not None and self._remaining is None and not self._chunked:
+            self._done = True
+
+        return self._done
+
+    def _parse_head(self):
+        end = self._buffer.find('\r\n\r\n')
+        if end < 0:
+            return False
+
+        head, self._buffer = self._buffer[:end], self._buffer[end + 4:]
+        status_line, _, header_lines = head.partition('\r\n')
+        version, status = status_line.split(' ', 2)[:2]
+        if status.startswith('1'):  # e.g. 100 Continue, the real response follows
+            return True
+
+        self.status = int(status)
+        self.headers = httplib.HTTPMessage(StringIO(header_lines + '\r\n'))
+
+        connection = (self.headers.get('connection') or '').lower()
+        self.will_close = connection == 'close' or (
+            version == 'HTTP/1.0' and connection != 'keep-alive')
+
+        if self.method == 'HEAD' or self.status in (204, 304):
+            self._remaining = 0
+        elif 'chunked' in (self.headers.get('transfer-encoding') or '').lower():
+            self._chunked = True
+        elif self.headers.get('content-length') is not None:
+            self._remaining = int(self.headers.get('content-length'))
+        else:
+            self.will_close = True  # The body ends when the connection closes
+
+        return True
+
+    def _parse_body(self):
+        if self._chunked:
+            return self._parse_chunks()
+
+        if self._remaining is None:
+            self._take(len(self._buffer))
+            return False
+
+        self._remaining -= self._take(min(self._remaining, len(self._buffer)))
+        self._done = self._remaining == 0
+        return self._done
+
+    def _parse_chunks(self):
+        while True:
+            if self._chunk_left:
+                self._chunk_left -= self._take(min(self._chunk_left, len(self._buffer)))
+                if self._chunk_left:
+                    return False
+
+            end = self._buffer.find('\r\n')
+            if end < 0:
+                return False
+
+            line, self._buffer = self._buffer[:end], self._buffer[end + 2:]
+            if self._trailer:
+                if not line:
+                    self._done = True
+                    return True
+            elif self._chunk_left == 0:  # The line ending a chunk's data
+                self._chunk_left = None
+            else:
+                self._chunk_left = int(line.split(';', 1)[0], 16)
+                self._trailer = self._chunk_left == 0
+
+    def _take(self, size):
+        if size:
+            self._write(self._buffer[:size])
+            self.body_size += size
+            self._buffer = self._buffer[size:]
+
+        return size
+
+
+class _Poller(object):
+    """Waits for sockets with ``select.poll``, or ``select.select`` where
+    poll isn't available
+    """
+    def __init__(self):
+        self._poll = select.poll() if hasattr(select, 'poll') else None
+        self._fds = {}
+
+    def register(self, fd, events):
+        if self._fds.get(fd) == events:
+            return
+
+        if self._poll is not None:
+            mask = (select.POLLIN if events & READ else 0) | (
+                select.POLLOUT if events & WRITE else 0)
+            if fd in self._fds:
+                self._poll.modify(fd, mask)
+            else:
+                self._poll.register(fd, mask)
+
+        self._fds[fd] = events
+
+    def unregister(self, fd):
+        if self._fds.pop(fd, None) is not None and self._poll is not None:
+            self._poll.unregister(fd)
+
+    def poll(self, timeout):
+        """Returns the fds that are ready, or have failed"""
+        try:
+            if self._poll is not None:
+                return [fd for fd, _ in self._poll.poll(timeout * 1000)]
+
+            readable, writable, failed = select.select(
+                [fd for fd, events in self._fds.items() if events & READ],
+                [fd for fd, events in self._fds.items() if events & WRITE],
+                list(self._fds),
+                timeout,
+            )
+            return set(readable + writable + failed)
+        except (select.error, IOError) as exc:
+            if exc.args[0] == errno.EINTR:
+                return []
+            raise
+
+
+def _request_bytes(request):
+    headers = dict(request.unredirected_hdrs)
+    headers.update(dict((k, v) for k, v in request.headers.items() if k not in headers))
+    headers = dict((name.title(), value) for name, value in headers.items())
+    headers.setdefault('Host', request.get_host())
+    headers['Connection'] = 'keep-alive'
+
+    data = request.get_data()
+    if data is not None:
+        headers.setdefault('Content-Type', 'application/x-www-form-urlencoded')
+        headers['Content-Length'] = str(len(data))
+
+    lines = ['{0} {1} HTTP/1.1'.format(request.get_method(), request.get_selector())]
+    lines.extend('{0}: {1}'.format(name, value) for name, value in sorted(headers.items()))
+    head = '\r\n'.join(lines) + '\r\n\r\n'
+    if isinstance(head, unicode):
+        head = head.encode('utf-8')
+
+    return head + (data or '')
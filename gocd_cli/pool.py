@@ -0,0 +1,186 @@
+import httplib
+import socket
+import threading
+import time
+import urllib2
+from urllib import addinfourl
+
+
+class ConnectionPool(object):
+    """Keeps idle HTTP connections around so later requests to the same
+    host can reuse them instead of connecting (and handshaking) again.
+
+    Args:
+      size (int): The max number of idle connections kept per host.
+        Connections handed back when the pool is full are closed.
+        Default: 10
+      idle_timeout (float): How many seconds an idle connection is kept
+        before it's closed instead of reused. Default: 30
+    """
+    def __init__(self, size=10, idle_timeout=30):
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns an idle connection for `key` or None when there are none"""
+        stale = []
+        connection = None
+
+        with self._lock:
+            idle = self._idle.get(key, [])
+            while idle:
+                conn, last_used = idle.pop()
+                if time.time() - last_used < self.idle_timeout:
+                    connection = conn
+                    break
+                stale.append(conn)
+
+        for conn in stale:
+            conn.close()
+
+        return connection
+
+    def put(self, key, connection):
+        """Hands back a connection that's done with its response"""
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.size:
+                idle.append((connection, time.time()))
+                return
+
+        connection.close()
+
+    def close(self):
+        """Closes all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+
+        for connections in idle.values():
+            for conn, _ in connections:
+                conn.close()
+
+
+class PooledResponseReader(object):
+    """Reads a response and hands its connection back to the pool as soon
+    as the whole body has been read.
+
+    If the response is closed before it has been read to the end the
+    connection is closed, since it can't be used for another request.
+    """
+    def __init__(self, pool, key, connection, response):
+        self._pool = pool
+        self._key = key
+        self._connection = connection
+        self._response = response
+        self._released = False
+
+    def read(self, amt=None):
+        data = self._response.read() if amt is None else self._response.read(amt)
+        if self._response.isclosed() or (not data and amt != 0):
+            self._release()
+
+        return data
+
+    #: `socket._fileobject` calls this to fill its buffer
+    recv = read
+
+    def close(self):
+        if self._released or self._response.isclosed():
+            return self._release()
+
+        # The body hasn't been read to the end so the connection can't be reused
+        self._released = True
+        self._response.close()
+        self._connection.close()
+
+    def _release(self):
+        if self._released:
+            return
+
+        self._released = True
+        self._response.close()
+        if self._response.will_close:
+            self._connection.close()
+        else:
+            self._pool.put(self._key, self._connection)
+
+
+class KeepAliveHandlerMixin(object):
+    """Opens requests on persistent connections taken from a
+    :class:`ConnectionPool`.
+
+    This is a stand in for `urllib2.AbstractHTTPHandler.do_open` with the
+    difference that the connection isn't closed after each request.
+    """
+    def __init__(self, pool, debuglevel=0, **connection_kwargs):
+        self.pool = pool
+        self._connection_kwargs = connection_kwargs
+        urllib2.AbstractHTTPHandler.__init__(self, debuglevel=debuglevel)
+
+    def do_open_keep_alive(self, connection_class, req):
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('no host given')
+
+        tunnel_host = getattr(req, '_tunnel_host', None)
+        key = (connection_class.__name__, host, tunnel_host)
+        headers = self._headers(req)
+
+        connection = self.pool.get(key)
+        if connection is not None:
+            try:
+                response = self._send(connection, req, headers)
+            except (socket.error, httplib.HTTPException):
+                # The server closed the idle connection, fall through and
+                # make the request on a new connection instead.
+                connection.close()
+                connection = None
+
+        if connection is None:
+            connection = connection_class(host, timeout=req.timeout, **self._connection_kwargs)
+            connection.set_debuglevel(self._debuglevel)
+            if tunnel_host:
+                tunnel_headers = {}
+                if 'Proxy-Authorization' in headers:
+                    tunnel_headers['Proxy-Authorization'] = headers.pop('Proxy-Authorization')
+                connection.set_tunnel(tunnel_host, headers=tunnel_headers)
+
+            try:
+                response = self._send(connection, req, headers)
+            except socket.error as err:
+                connection.close()
+                raise urllib2.URLError(err)
+
+        reader = PooledResponseReader(self.pool, key, connection, response)
+        resp = addinfourl(socket._fileobject(reader, close=True), response.msg,
+                          req.get_full_url())
+        resp.code = response.status
+        resp.msg = response.reason
+
+        return resp
+
+    def _headers(self, req):
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k, v) for k, v in req.headers.items() if k not in headers))
+        headers['Connection'] = 'keep-alive'
+
+        return dict((name.title(), val) for name, val in headers.items())
+
+    def _send(self, connection, req, headers):
+        connection.request(req.get_method(), req.get_selector(), req.data, headers)
+        try:
+            return connection.getresponse(buffering=True)
+        except TypeError:  # buffering kw not supported (Python 2.6)
+            return connection.getresponse()
+
+
+class KeepAliveHTTPHandler(KeepAliveHandlerMixin, urllib2.HTTPHandler):
+    def http_open(self, req):
+        return self.do_open_keep_alive(httplib.HTTPConnection, req)
+
+
+class KeepAliveHTTPSHandler(KeepAliveHandlerMixin, urllib2.HTTPSHandler):
+    def https_open(self, req):
+        return self.do_open_keep_alive(httplib.HTTPSConnection, req)
@@ -0,0 +1,186 @@
+from contextlib import contextmanager
+from email.utils import mktime_tz, parsedate_tz
+import threading
+import time
+
+#: The response statuses that the Go server, or a proxy in front of it,
+#: asks clients to slow down with
+THROTTLED_STATUSES = (429, 503)
+
+
+class TokenBucket(object):
+    """Limits how often something happens, shared between threads
+
+    Tokens are added at `rate` per second up to `burst`, every
+    :meth:`acquire` takes one and waits for it when there are none.
+
+    Args:
+      rate (float): tokens added per second, 0 or less means no limit
+      burst (int): the max number of tokens saved up. Default: 1
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(float(burst), 1)
+        self._tokens = self.burst
+        self._updated_at = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token, waiting until one is available
+
+        Returns:
+          float: how many seconds were spent waiting
+        """
+        if self.rate <= 0:
+            return 0
+
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            # When in debt the token is handed out once the debt is paid
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait:
+            time.sleep(wait)
+
+        return wait
+
+    def try_acquire(self):
+        """Takes a token if one is available, without waiting
+
+        Returns:
+          float: 0 when a token was taken, otherwise how many seconds
+            until one is available
+        """
+        if self.rate <= 0:
+            return 0
+
+        with self._lock:
+            now = time.time()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            if self._tokens < 1:
+                return (1 - self._tokens) / self.rate
+
+            self._tokens -= 1
+            return 0
+
+
+def parse_retry_after(value):
+    """Parses a Retry-After header, either seconds or an HTTP date
+
+    Returns:
+      float: how many seconds to wait, or None when `value` is missing
+        or invalid
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+
+    date = parsedate_tz(value)
+    if date is None:
+        return None
+
+    return max(mktime_tz(date) - time.time(), 0)
+
+
+class Governor(object):
+    """Limits the requests made to the Go server, shared between threads
+
+    Every request waits for a token from a :class:`TokenBucket` and a free
+    slot when `max_in_flight` requests are already being made. When the
+    server answers 429 or 503 all requests are paused for as long as its
+    Retry-After header asks, or otherwise for a second that doubles for
+    every throttled response in a row.
+
+    Args:
+      rate (float): requests per second, 0 or less means no limit.
+        Default: 0
+      burst (int): how many requests can be made at once after being idle.
+        Default: 1
+      max_in_flight (int): the max number of requests at the same time,
+        0 or less means no limit. Default: 0
+      max_pause (float): the longest requests are paused after a throttled
+        response, whatever its Retry-After says. Default: 60
+    """
+    def __init__(self, rate=0, burst=1, max_in_flight=0, max_pause=60):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_in_flight = max(int(max_in_flight), 0)
+        self.max_pause = float(max_pause)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight) if self.max_in_flight else None
+        self._paused_until = 0
+        self._penalty = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def request(self):
+        """Waits until a request can be made, the request is made inside
+        the with block"""
+        if self._slots:
+            self._slots.acquire()
+
+        try:
+            self.wait()
+            self.bucket.acquire()
+            yield
+        finally:
+            if self._slots:
+                self._slots.release()
+
+    def wait(self):
+        """Waits until requests are no longer paused
+
+        Returns:
+          float: how many seconds were spent waiting
+        """
+        wait = self.paused_for()
+        if wait:
+            time.sleep(wait)
+
+        return wait
+
+    def paused_for(self):
+        """How many seconds requests are still paused"""
+        return max(self._paused_until - time.time(), 0)
+
+    def try_acquire(self):
+        """Lets a request be made if it can be right away, for callers that
+        can't block, like :class:`gocd_cli.multiplex.MultiplexClient`.
+        `max_in_flight` is up to the caller.
+
+        Returns:
+          float: 0 when the request can be made, otherwise how many
+            seconds to wait before trying again
+        """
+        return self.paused_for() or self.bucket.try_acquire()
+
+    def record(self, status, retry_after=None):
+        """Records the `status` of a response, pausing all requests when
+        the server asks to slow down
+
+        Args:
+          status (int): the response status
+          retry_after (str): the Retry-After header of the response
+
+        Returns:
+          float: how many seconds requests are paused for
+        """
+        if status not in THROTTLED_STATUSES:
+            self._penalty = 0
+            return 0
+
+        pause = parse_retry_after(retry_after)
+        with self._lock:
+            if pause is None:
+                self._penalty = min(max(self._penalty * 2, 1), self.max_pause)
+                pause = self._penalty
+
+            pause = min(pause, self.max_pause)
+            self._paused_until = max(self._paused_until, time.time() + pause)
+
+        return pause
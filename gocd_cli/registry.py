@@ -0,0 +1,168 @@
+"""
+A manifest of all available commands, their subcommands and documentation.
+
+Building the manifest means importing every command module, so it's
+cached on disk and only rebuilt when a command module has changed or a
+package registering commands has been installed/upgraded. Printing the
+help then never has to import a command module.
+
+The manifest looks like::
+
+    {
+        "fingerprint": "...",
+        "commands": [
+            {
+                "name": "pipeline",
+                "module": "gocd_cli.commands.pipeline",
+                "subcommands": [
+                    {
+                        "name": "check",
+                        "class_name": "Check",
+                        "summary": "Check whether a pipeline has run successfully",
+                        "usage": "check <name> [--ran-after] ..."
+                    }
+                ]
+            }
+        ]
+    }
+"""
+import errno
+import hashlib
+import json
+import os
+import pkgutil
+import tempfile
+
+import gocd_cli
+from gocd_cli import commands
+from gocd_cli.utils import (
+    classify_name,
+    dasherize_name,
+    expand_user,
+    list_command_entry_points,
+)
+
+MANIFEST_PATH = '~/.gocd/cache/commands.json'
+
+
+def command_modules():
+    """Returns a list of (command, module name) for all available commands
+
+    The commands in the `gocd_cli.commands` namespace take precedence over
+    commands with the same name registered through entry points.
+    """
+    modules = {}
+    for entry_point in list_command_entry_points():
+        modules.setdefault(entry_point.name, entry_point.module_name)
+
+    for path in commands.__path__:
+        for _, name, _ in pkgutil.iter_modules([path]):
+            modules[name] = 'gocd_cli.commands.{0}'.format(name)
+
+    return sorted(modules.items())
+
+
+def fingerprint():
+    """A hash that changes whenever a command could've been added or changed
+
+    Only looks at file modification times and installed versions, no
+    command module is imported.
+    """
+    parts = [gocd_cli.__version__]
+
+    for path in commands.__path__:
+        for dirpath, _, filenames in os.walk(path):
+            for filename in filenames:
+                if filename.endswith('.py'):
+                    filename = os.path.join(dirpath, filename)
+                    parts.append('{0}:{1}'.format(filename, os.path.getmtime(filename)))
+
+    for entry_point in list_command_entry_points():
+        parts.append('{0}={1}:{2}'.format(
+            entry_point.name, entry_point.module_name, entry_point.dist,
+        ))
+
+    return hashlib.sha1('\n'.join(sorted(parts))).hexdigest()
+
+
+def build_manifest():
+    """Imports every command module and describes its subcommands"""
+    manifest = dict(fingerprint=fingerprint(), commands=[])
+
+    for command, module_name in command_modules():
+        module = __import__(module_name, fromlist=('',))
+        subcommands = []
+        for class_name in module.__all__:
+            cmd = getattr(module, class_name)
+            subcommands.append(dict(
+                name=dasherize_name(class_name),
+                class_name=class_name,
+                summary=cmd.get_usage_summary(),
+                usage=cmd.get_usage(),
+            ))
+
+        manifest['commands'].append(dict(
+            name=command,
+            module=module_name,
+            subcommands=subcommands,
+        ))
+
+    return manifest
+
+
+def get_manifest(path=MANIFEST_PATH):
+    """Returns the cached manifest, rebuilding it when it's out of date
+
+    Failing to store the manifest isn't an error, it'll just be rebuilt
+    next time as well.
+
+    Args:
+      path (str): Where the manifest is cached. Default: `MANIFEST_PATH`
+
+    Returns:
+      dict: the manifest
+    """
+    path = expand_user(path)
+    try:
+        with open(path) as fp:
+            manifest = json.load(fp)
+
+        if manifest.get('fingerprint') == fingerprint():
+            return manifest
+    except (IOError, ValueError):
+        pass
+
+    manifest = build_manifest()
+    try:
+        _write(path, manifest)
+    except (IOError, OSError):
+        pass
+
+    return manifest
+
+
+def find_command(manifest, command, subcommand=None):
+    """Looks up a command, or a subcommand of it, in the `manifest`
+
+    Returns:
+      dict: the command/subcommand or None when not found
+    """
+    found = next((cmd for cmd in manifest['commands'] if cmd['name'] == command), None)
+    if found is None or subcommand is None:
+        return found
+
+    class_name = classify_name(subcommand)
+    return next((cmd for cmd in found['subcommands'] if cmd['class_name'] == class_name), None)
+
+
+def _write(path, manifest):
+    try:
+        os.makedirs(os.path.dirname(path), 0o700)
+    except OSError as exc:
+        if exc.errno != errno.EEXIST:
+            raise
+
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, 'w') as fp:
+        json.dump(manifest, fp)
+    os.rename(tmp_path, path)
@@ -0,0 +1,192 @@
+"""
+Retries requests to the Go server that failed for a reason that's likely
+to pass, like a 502 from a load balancer while the server is in a long
+garbage collection, and stops making requests once it's clearly down.
+
+Only idempotent requests, GETs without a body, are retried. Every retry
+waits exponentially longer with jitter, so the many requests of a
+concurrent command don't all come back at the same moment.
+
+A :class:`CircuitBreaker` counts the transient failures in a row. Once
+there are too many it's open, and every request fails right away with a
+:class:`CircuitOpenError` instead of waiting for yet another timeout.
+After a while one request is let through to try again.
+"""
+import httplib
+import random
+import socket
+import threading
+import time
+from itertools import islice
+from urllib2 import HTTPError, URLError
+
+#: The response statuses of a server that's temporarily unable to answer
+TRANSIENT_STATUSES = (502, 503, 504)
+
+
+def backoff_intervals(initial=1, factor=2, maximum=30, jitter=0.1):
+    """Yields an endless sequence of exponentially growing wait times
+
+    Every interval is randomly spread out by `jitter` so that many
+    clients started at the same time don't end up waiting in lockstep.
+
+    Args:
+      initial (float): The first interval in seconds. Default: 1
+      factor (float): How much each interval grows over the previous.
+        Default: 2
+      maximum (float): The longest interval in seconds. Default: 30
+      jitter (float): The fraction each interval is randomly spread by.
+        Default: 0.1
+
+    Yields:
+      float: seconds to wait
+    """
+    interval = min(initial, maximum)
+    while True:
+        yield min(interval * random.uniform(1 - jitter, 1 + jitter), maximum)
+        interval = min(interval * factor, maximum)
+
+
+def is_transient(exc):
+    """Whether the request that raised `exc` might succeed when retried"""
+    if isinstance(exc, HTTPError):
+        return exc.code in TRANSIENT_STATUSES
+
+    return isinstance(exc, (URLError, socket.error, httplib.HTTPException))
+
+
+class CircuitOpenError(URLError):
+    """Raised instead of making a request while the circuit is open"""
+
+
+class CircuitBreaker(object):
+    """Fails requests fast once the Go server is clearly down, shared
+    between threads
+
+    Args:
+      threshold (int): the number of transient failures in a row that
+        opens the circuit. Default: 5
+      reset_timeout (float): seconds the circuit stays open before one
+        request is let through to try again. Default: 30
+    """
+    def __init__(self, threshold=5, reset_timeout=30):
+        self.threshold = max(int(threshold), 1)
+        self.reset_timeout = float(reset_timeout)
+        self.failures = 0
+        self._opened_at = None
+        self._trying = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self._opened_at is not None
+
+    def before(self):
+        """Called before every request
+
+        Raises:
+          CircuitOpenError: when the circuit is open, or another request
+            is already trying whether the server is back
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+
+            if self._trying or time.time() - self._opened_at < self.reset_timeout:
+                raise CircuitOpenError(
+                    'the Go server failed {0} times in a row, not trying again for '
+                    '{1:.0f} seconds'.format(
+                        self.failures,
+                        max(self._opened_at + self.reset_timeout - time.time(), 0),
+                    )
+                )
+
+            self._trying = True
+
+    def succeeded(self):
+        """Called when the server answered, whatever the answer was"""
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._trying = False
+
+    def failed(self):
+        """Called when a request failed transiently"""
+        with self._lock:
+            self.failures += 1
+            if self._trying or self.failures >= self.threshold:
+                self._opened_at = time.time()
+            self._trying = False
+
+
+class Retrier(object):
+    """Makes requests, retrying the idempotent ones that failed transiently
+
+    Args:
+      retries (int): how many times a request is retried. Default: 2
+      backoff (float): seconds before the first retry, doubling for every
+        retry after it. Default: 0.5
+      max_backoff (float): the longest wait between retries. Default: 10
+      breaker: a :class:`CircuitBreaker` that's checked before every
+        attempt and told about its outcome. Default: None
+    """
+    def __init__(self, retries=2, backoff=0.5, max_backoff=10, breaker=None):
+        self.retries = max(int(retries), 0)
+        self.backoff = float(backoff)
+        self.max_backoff = float(max_backoff)
+        self.breaker = breaker
+
+    def interval(self, retry):
+        """Seconds to wait before `retry`, counting from 0"""
+        intervals = backoff_intervals(
+            initial=self.backoff, maximum=self.max_backoff, jitter=0.5,
+        )
+        return next(islice(intervals, retry, None))
+
+    def call(self, request, idempotent=True):
+        """Calls `request` until it succeeds, fails in a way a retry won't
+        fix, or there are no retries left
+
+        Args:
+          request: a callable that makes the request and returns its
+            response, raising e.g. `urllib2.HTTPError` when it fails
+          idempotent (bool): whether the request may be retried.
+            Default: True
+
+        Returns:
+          whatever `request` returns
+
+        Raises:
+          CircuitOpenError: when the circuit breaker is open
+          Exception: whatever the last attempt raised
+        """
+        retries = self.retries if idempotent else 0
+        retry = 0
+
+        while True:
+            if self.breaker:
+                self.breaker.before()
+
+            try:
+                response = request()
+            except Exception as exc:
+                transient = is_transient(exc)
+                if self.breaker:
+                    if transient:
+                        self.breaker.failed()
+                    else:
+                        self.breaker.succeeded()
+
+                if not transient or retry >= retries:
+                    raise
+
+                if isinstance(exc, HTTPError):
+                    exc.close()
+                time.sleep(self.interval(retry))
+                retry += 1
+                continue
+
+            if self.breaker:
+                self.breaker.succeeded()
+
+            return response
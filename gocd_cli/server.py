@@ -0,0 +1,145 @@
+import base64
+import time
+from urllib2 import HTTPBasicAuthHandler, HTTPError, HTTPPasswordMgrWithDefaultRealm, build_opener
+
+import gocd
+
+from gocd_cli.instrumentation import RecordedResponse
+from gocd_cli.pool import ConnectionPool, KeepAliveHTTPHandler, KeepAliveHTTPSHandler
+
+
+class Server(gocd.Server):
+    """A `gocd.Server` that shares persistent connections between all
+    requests made through it.
+
+    `gocd.Server` installs a global urllib2 opener and connects anew for
+    every request, this instead uses its own opener backed by a
+    :class:`gocd_cli.pool.ConnectionPool`. The credentials are also sent
+    with every request instead of waiting to be challenged for them.
+
+    Args:
+      host (str): The base URL for your go server.
+      user (str): The username to login as
+      password (str): The password for this user
+      pool_size (int): The max number of idle connections to keep open.
+        Default: 10
+      pool_idle_timeout (float): How many seconds an idle connection is
+        kept open. Default: 30
+      cache: A :class:`gocd_cli.cache.ResponseCache` that GET requests are
+        answered from when possible. Default: no caching
+      recorder: A :class:`gocd_cli.instrumentation.RequestRecorder` that
+        every request to the Go server is recorded in. Default: no recording
+      governor: A :class:`gocd_cli.ratelimit.Governor` that limits the
+        requests to the Go server. Default: no limits
+      retrier: A :class:`gocd_cli.retry.Retrier` that retries the requests
+        that failed transiently. Default: no retries
+    """
+    def __init__(self, host, user=None, password=None, pool_size=10, pool_idle_timeout=30,
+                 cache=None, recorder=None, governor=None, retrier=None):
+        self.pool = ConnectionPool(size=pool_size, idle_timeout=pool_idle_timeout)
+        self.cache = cache
+        self.recorder = recorder
+        self.governor = governor
+        self.retrier = retrier
+        self._opener = build_opener(*self._handlers())
+
+        super(Server, self).__init__(host, user=user, password=password)
+
+    def request(self, path, data=None, headers=None, method=None):
+        if isinstance(data, unicode):
+            data = data.encode('utf-8')
+
+        request_args = dict(data=data, headers=headers)
+        if method:  # Not supported by older versions of gocd
+            request_args['method'] = method
+
+        if self.cache and data is None and method in (None, 'GET'):
+            return self.cache.fetch(
+                path,
+                lambda: self._open(path, request_args),
+                headers=headers,
+            )
+
+        return self._open(path, request_args)
+
+    def close(self):
+        """Closes all idle connections to the Go server"""
+        self.pool.close()
+
+    def _open(self, path, request_args):
+        if self.retrier is None:
+            return self._attempt(path, request_args)
+
+        return self.retrier.call(
+            lambda: self._attempt(path, request_args),
+            idempotent=(request_args.get('data') is None and
+                        request_args.get('method') in (None, 'GET', 'HEAD')),
+        )
+
+    def _attempt(self, path, request_args):
+        if self.governor is None:
+            return self._send(path, request_args)
+
+        with self.governor.request():
+            try:
+                response = self._send(path, request_args)
+            except HTTPError as exc:
+                self.governor.record(exc.code, exc.headers.get('Retry-After'))
+                raise
+
+        self.governor.record(response.code)
+        return response
+
+    def _send(self, path, request_args):
+        if self.recorder:
+            return self._open_recorded(path, request_args)
+
+        response = self._opener.open(self._request(path, **request_args))
+        self._set_session_cookie(response)
+
+        return response
+
+    def _open_recorded(self, path, request_args):
+        request = self._request(path, **request_args)
+        started_at = time.time()
+        try:
+            response = self._opener.open(request)
+        except HTTPError as exc:
+            self.recorder.record(
+                request.get_method(), path, exc.code, time.time() - started_at,
+                size=int(exc.headers.get('content-length') or 0), started_at=started_at,
+            )
+            raise
+
+        record = self.recorder.record(
+            request.get_method(), path, response.code, time.time() - started_at,
+            started_at=started_at,
+        )
+        self._set_session_cookie(response)
+
+        return RecordedResponse(response, record)
+
+    def _handlers(self):
+        return [
+            KeepAliveHTTPHandler(self.pool, debuglevel=self.request_debug_level),
+            KeepAliveHTTPSHandler(self.pool, debuglevel=self.request_debug_level),
+        ]
+
+    def _add_basic_auth(self):
+        auth_handler = HTTPBasicAuthHandler(HTTPPasswordMgrWithDefaultRealm())
+        auth_handler.add_password(
+            realm=None,
+            uri=self.host,
+            user=self.user,
+            passwd=self.password,
+        )
+        self._opener = build_opener(auth_handler, *self._handlers())
+
+    def _request(self, path, **kwargs):
+        request = super(Server, self)._request(path, **kwargs)
+        if self.user and self.password:
+            request.add_unredirected_header('Authorization', 'Basic {0}'.format(
+                base64.b64encode('{0}:{1}'.format(self.user, self.password))
+            ))
+
+        return request
@@ -1,6 +1,10 @@
 import ConfigParser
 from os import getenv
 
+# Plaintexts by (encryption module, ciphertext), shared by all settings
+# objects in the process so every value is decrypted at most once.
+_decrypted = {}
+
 
 class BaseSettings(object):
     def __init__(self, **kwargs):
@@ -77,20 +81,29 @@ class EncryptedSettings(BaseSettings):
     This relies on being able to get the ciphertext from the other
     methods of retrieving configuration values. Therefore it has to be
     listed first in the mixed in class.
+
+    Decrypted values are remembered for the rest of the process and, when
+    a :mod:`gocd_cli.agent` is running, shared with later processes
+    through it. The encryption module is only imported when a value has
+    to be decrypted.
     """
-    encryption_module = False
+    encryption_module_name = None
+    _encryption_module = None
 
     def __init__(self, **kwargs):
         super(EncryptedSettings, self).__init__(**kwargs)
 
-        encryption_module = self.get('encryption_module')
-        if encryption_module:
-            mod = __import__(encryption_module, fromlist=('',))
-            if mod:
-                self.encryption_module = mod
+        self.encryption_module_name = self.get('encryption_module') or None
+
+    @property
+    def encryption_module(self):
+        if self._encryption_module is None and self.encryption_module_name:
+            self._encryption_module = __import__(self.encryption_module_name, fromlist=('',))
+
+        return self._encryption_module or False
 
     def get(self, option):
-        if self.encryption_module:
+        if self.encryption_module_name:
             val = super(EncryptedSettings, self).get('{0}_encrypted'.format(option))
             if val:
                 return self._decrypt(val)
@@ -98,7 +111,19 @@ class EncryptedSettings(BaseSettings):
         return super(EncryptedSettings, self).get(option)
 
     def _decrypt(self, val):
-        return self.encryption_module.decrypt(val)
+        key = (self.encryption_module_name, val)
+        if key not in _decrypted:
+            # Imported here since gocd_cli.agent depends on gocd_cli.utils,
+            # which depends on this module.
+            from gocd_cli import agent
+
+            _decrypted[key] = agent.get_or_decrypt(
+                self.encryption_module_name,
+                val,
+                lambda: self.encryption_module.decrypt(val),
+            )
+
+        return _decrypted[key]
 
 
 class Settings(EncryptedSettings, EnvironmentSettings, IniSettings):
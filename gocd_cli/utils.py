@@ -1,12 +1,21 @@
+from contextlib import contextmanager
+from StringIO import StringIO
 import os.path
 import pkgutil
 import pwd
 import re
 import string
+import sys
+import threading
+
+import pkg_resources
 
 from gocd_cli import commands
 from gocd_cli.settings import Settings
-import gocd
+
+# What's only needed to run a command against the Go server, like
+# gocd_cli.server, is imported where it's used so that printing the help
+# and usage doesn't load it.
 
 
 def dasherize_name(name):
@@ -23,12 +32,27 @@ def classify_name(name):
     return string.capwords(name, '-').replace('-', '')
 
 
+#: Packages outside of the gocd_cli.commands namespace can register commands here,
+#: the entry point name is the command and it points to the command module.
+COMMAND_ENTRY_POINT_GROUP = 'gocd_cli.commands'
+
+
 def list_commands():
     return [module[1] for module in pkgutil.walk_packages(commands.__path__)]
 
 
+def list_command_entry_points():
+    return list(pkg_resources.iter_entry_points(COMMAND_ENTRY_POINT_GROUP))
+
+
 def get_command_module(command):  # TODO: rename this function, I just don't know to what
-    return __import__('gocd_cli.commands.{0}'.format(command), fromlist=(str(command),))
+    try:
+        return __import__('gocd_cli.commands.{0}'.format(command), fromlist=(str(command),))
+    except ImportError:
+        for entry_point in pkg_resources.iter_entry_points(COMMAND_ENTRY_POINT_GROUP, command):
+            return __import__(entry_point.module_name, fromlist=('',))
+
+        raise
 
 
 def expand_user(path):
@@ -54,6 +78,44 @@ def expand_user(path):
         return os.path.expanduser(path)
 
 
+_invocation = threading.local()
+
+
+@contextmanager
+def working_directory(path):
+    """Makes :func:`local_path` resolve relative paths against `path` in
+    the current thread, e.g. the directory of the gocd invocation a daemon
+    runs a command for
+
+    Args:
+      path (str): An absolute path, None leaves relative paths as they are
+    """
+    previous = getattr(_invocation, 'working_directory', None)
+    _invocation.working_directory = path
+    try:
+        yield
+    finally:
+        _invocation.working_directory = previous
+
+
+def local_path(path):
+    """Expands ~ and makes a relative `path` absolute against the working
+    directory set with :func:`working_directory`, if any
+
+    Args:
+        path (str): A path given to a command
+
+    Returns:
+        str: the path to use
+    """
+    path = expand_user(path)
+    directory = getattr(_invocation, 'working_directory', None)
+    if directory and not os.path.isabs(path):
+        return os.path.join(directory, path)
+
+    return path
+
+
 def is_file_readable(path):
     path = expand_user(path)
     return os.path.isfile(path) and os.access(path, os.R_OK)
@@ -96,6 +158,31 @@ def format_arguments(*args):
     return positional_args, kwargs
 
 
+def split_global_options(args):
+    """Splits the leading ``--options`` meant for gocd itself from the
+    command and its arguments.
+
+    Handled formats are:
+    * --option, which sets the option to True
+    * --option=value
+
+    Args:
+      args (list): the arguments from the command line
+
+    Returns:
+      ({options}, [remaining args])
+    """
+    options = {}
+    args = list(args)
+
+    while args and args[0].startswith('--'):
+        arg = args.pop(0)[2:]
+        key, has_value, value = arg.partition('=')
+        options[key.replace('-', '_')] = value if has_value else True
+
+    return options, args
+
+
 def get_command(go_server, command, subcommand, *args):  # TODO: Think about this, it feels ugly
     """
 
@@ -123,6 +210,150 @@ def get_command(go_server, command, subcommand, *args):  # TODO: Think about thi
         raise TypeError('{0}: {1}'.format(class_name, exc))
 
 
+def run_concurrently(func, items, concurrency=1, ordered=True):
+    """Calls `func` for every item in `items` using a bounded pool of
+    worker threads.
+
+    With a concurrency of 1 or less, or at most one item, no threads are
+    started and every item is processed in turn in the calling thread.
+
+    Args:
+      func: A callable that takes one item as its only argument
+      items: An iterable of the items to process
+      concurrency (int): The max number of items processed at the same time.
+        Default: 1
+      ordered (bool): When true the results are yielded in the same order
+        as `items`, otherwise in the order they finish. Default: True
+
+    Yields:
+      The return value of `func` for each item.
+      Any exception raised by `func` is raised when its result is reached.
+    """
+    if concurrency > 1:
+        items = list(items)
+
+    if concurrency <= 1 or len(items) <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    from multiprocessing.pool import ThreadPool
+
+    pool = ThreadPool(min(concurrency, len(items)))
+    try:
+        results = pool.imap(func, items) if ordered else pool.imap_unordered(func, items)
+        for result in results:
+            yield result
+    finally:
+        pool.terminate()
+
+
+class ThreadLocalOutput(object):
+    """A stand in for `sys.stdout` that lets each thread capture what it
+    prints without seeing the output of other threads.
+
+    When the current thread isn't capturing the output goes to `stream`.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+        self._local = threading.local()
+
+    @property
+    def buffers(self):
+        if not hasattr(self._local, 'buffers'):
+            self._local.buffers = []
+
+        return self._local.buffers
+
+    def write(self, data):
+        (self.buffers[-1] if self.buffers else self.stream).write(data)
+
+    def flush(self):
+        if not self.buffers:
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+_capture_lock = threading.Lock()
+_captures = 0
+_thread_local_output = None
+
+
+@contextmanager
+def capture_output(output=None):
+    """Captures everything the current thread prints to stdout
+
+    Example:
+      with capture_output() as output:
+          print('hello')
+      output.getvalue()  # 'hello\\n'
+
+    Args:
+      output: A file like object to write the captured output to.
+        Default: a new `StringIO`
+
+    Yields:
+      the file like object the output is written to
+    """
+    global _thread_local_output, _captures
+
+    with _capture_lock:
+        if not _captures:
+            _thread_local_output = sys.stdout = ThreadLocalOutput(sys.stdout)
+        _captures += 1
+        stdout = _thread_local_output
+
+    if output is None:
+        output = StringIO()
+    stdout.buffers.append(output)
+    try:
+        yield output
+    finally:
+        stdout.buffers.remove(output)
+
+        with _capture_lock:
+            _captures -= 1
+            if not _captures:  # Put the original stdout back
+                if sys.stdout is stdout:
+                    sys.stdout = stdout.stream
+                _thread_local_output = None
+
+
+def system_exit_code(exc):
+    """The exit code of a process exiting with the `SystemExit` `exc`
+
+    Like the interpreter: None is 0, a number is itself and anything
+    else, e.g. a message, is 1.
+    """
+    if exc.code is None:
+        return 0
+
+    return exc.code if isinstance(exc.code, int) else 1
+
+
+def run_command(go_server, command, subcommand, *args):
+    """Runs a command the same way as it's run from the command line
+
+    Args:
+      go_server: the `gocd.Server` to run the command against
+      command: the command package
+      subcommand: the command class in the package
+      *args: the arguments for the command
+
+    Returns:
+      (exit_code, output): output is None when there's nothing to print
+    """
+    result = get_command(go_server, command, subcommand, *args).run()
+
+    response = getattr(result, 'get', None)
+    if response:
+        return response('exit_code', 0), response('output', False) or None
+
+    return 0, None
+
+
 def get_settings(section='gocd', settings_paths=('~/.gocd/gocd-cli.cfg', '/etc/go/gocd-cli.cfg')):
     """Returns a `gocd_cli.settings.Settings` configured for settings file
 
@@ -151,22 +382,144 @@ def get_settings(section='gocd', settings_paths=('~/.gocd/gocd-cli.cfg', '/etc/g
     return Settings(prefix=section, section=section, filename=config_file)
 
 
-def get_go_server(settings=None):
+def get_response_cache(settings, refresh=False):
+    """Returns a `gocd_cli.cache.ResponseCache` configured by the
+    `settings` object, or None if caching has been turned off.
+
+    Args:
+      settings: a `gocd_cli.settings.Settings` object.
+      refresh (bool): never use cached responses, only store new ones.
+        Default: False
+
+    Returns:
+      gocd_cli.cache.ResponseCache: or None when the setting ``cache`` is false
+    """
+    from gocd_cli.cache import ENDPOINTS, ResponseCache
+
+    if (settings.get('cache') or 'true').lower().strip() == 'false':
+        return None
+
+    ttls = {}
+    for name, _, _ in ENDPOINTS:
+        ttl = settings.get('cache_{0}_ttl'.format(name))
+        if ttl is not None:
+            ttls[name] = float(ttl)
+
+    return ResponseCache(
+        expand_user(settings.get('cache_dir') or '~/.gocd/cache'),
+        namespace='{0}|{1}'.format(settings.get('server'), settings.get('user')),
+        ttls=ttls,
+        refresh=refresh,
+    )
+
+
+def get_result_cache(server, ttl=None):
+    """Returns a `gocd_cli.cache.ResultCache` for the results of commands
+    run against `server`, or None if results aren't cached.
+
+    Results are stored next to the cached responses of `server`, so they're
+    not cached when it doesn't cache responses, i.e. with ``--no-cache``, and
+    ``--refresh`` makes a new result be computed.
+
+    Args:
+      server: the `gocd.Server` the command runs against
+      ttl (float): how many seconds a result is fresh. Default: the setting
+        ``check_cache_ttl``, which defaults to 0 meaning no caching
+
+    Returns:
+      gocd_cli.cache.ResultCache: or None
+    """
+    from gocd_cli.cache import ResultCache
+
+    response_cache = getattr(server, 'cache', None)
+    if response_cache is None:
+        return None
+
+    if ttl is None:
+        ttl = get_settings().get('check_cache_ttl')
+
+    if not float(ttl or 0):
+        return None
+
+    return ResultCache(
+        response_cache.directory,
+        namespace=response_cache.namespace,
+        ttl=float(ttl),
+        refresh=response_cache.refresh,
+    )
+
+
+def get_go_server(settings=None, no_cache=False, refresh=False, profile_http=False):
     """Returns a `gocd.Server` configured by the `settings`
     object.
 
+    All requests made through the server share a pool of persistent
+    connections, see `gocd_cli.server.Server`, and are limited by the
+    settings ``rate_limit``, ``rate_limit_burst`` and ``max_in_flight``,
+    see `gocd_cli.ratelimit.Governor`. Idempotent requests that fail
+    transiently are retried, see `gocd_cli.retry`.
+
     Args:
       settings: a `gocd_cli.settings.Settings` object.
         Default: if falsey calls `get_settings`.
+      no_cache (bool): don't read or store any cached responses.
+        Default: False
+      refresh (bool): don't read any cached responses, but store the new
+        ones. Default: False
+      profile_http: record every request made to the Go server in
+        ``server.recorder``, see `gocd_cli.instrumentation`. Default: False
 
     Returns:
-      gocd.Server: a configured gocd.Server instance
+      gocd_cli.server.Server: a configured gocd.Server instance
     """
+    from gocd_cli.instrumentation import RequestRecorder
+    from gocd_cli.ratelimit import Governor
+    from gocd_cli.server import Server
+
     if not settings:
         settings = get_settings()
 
-    return gocd.Server(
+    return Server(
         settings.get('server'),
         user=settings.get('user'),
         password=settings.get('password'),
+        pool_size=int(settings.get('pool_size') or 10),
+        pool_idle_timeout=float(settings.get('pool_idle_timeout') or 30),
+        cache=None if no_cache else get_response_cache(settings, refresh=refresh),
+        recorder=RequestRecorder() if profile_http else None,
+        governor=Governor(
+            rate=float(settings.get('rate_limit') or 0),
+            burst=int(settings.get('rate_limit_burst') or 1),
+            max_in_flight=int(settings.get('max_in_flight') or 0),
+        ),
+        retrier=get_retrier(settings),
+    )
+
+
+def get_retrier(settings):
+    """Returns a `gocd_cli.retry.Retrier` configured by the `settings`
+    object
+
+    Args:
+      settings: a `gocd_cli.settings.Settings` object.
+
+    Returns:
+      gocd_cli.retry.Retrier: with a circuit breaker unless the setting
+        ``circuit_breaker_threshold`` is 0
+    """
+    from gocd_cli.retry import CircuitBreaker, Retrier
+
+    threshold = int(settings.get('circuit_breaker_threshold') or 5)
+    breaker = None
+    if threshold > 0:
+        breaker = CircuitBreaker(
+            threshold=threshold,
+            reset_timeout=float(settings.get('circuit_breaker_reset_timeout') or 30),
+        )
+
+    return Retrier(
+        retries=int(settings.get('retries') or 2),
+        backoff=float(settings.get('retry_backoff') or 0.5),
+        max_backoff=float(settings.get('retry_max_backoff') or 10),
+        breaker=breaker,
     )
@@ -40,7 +40,7 @@ setup(
     description='A CLI client for interacting with Go Continuous Delivery',
     long_description=README,
     version=version(),
-    packages=find_packages(exclude=('tests',)),
+    packages=find_packages(exclude=('tests', 'tests.*', 'benchmarks', 'benchmarks.*')),
     namespace_packages=('gocd_cli', 'gocd_cli.commands', 'gocd_cli.encryption'),
     cmdclass={'test': PyTest},
     scripts=('bin/gocd',),
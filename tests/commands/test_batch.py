@@ -0,0 +1,123 @@
+from __future__ import print_function
+
+import sys
+
+import pytest
+from mock import MagicMock
+
+from gocd import Server
+from gocd_cli.commands.batch import Run
+
+
+class FakeCommand(object):
+    def __init__(self, server, name, exit_code=0, printed=None):
+        self.name = name
+        self.exit_code = int(exit_code)
+        self.printed = printed
+
+    def run(self):
+        if self.printed:
+            print(self.printed)
+        if self.name == 'Boom':
+            raise ValueError('Kaboom')
+        if self.name == 'Quiet':
+            return None
+        if self.name == 'Exit':
+            sys.exit()
+
+        return dict(exit_code=self.exit_code, output='{0} done'.format(self.name))
+
+
+@pytest.fixture
+def go_server():
+    return MagicMock(spec=Server)
+
+
+@pytest.fixture(autouse=True)
+def fake_get_command(monkeypatch):
+    servers = []
+
+    def get_command(server, command, subcommand, *args):
+        servers.append(server)
+        name = args[0]
+        kwargs = dict(arg[2:].split('=') for arg in args[1:])
+        return FakeCommand(server, name, **kwargs)
+
+    monkeypatch.setattr('gocd_cli.utils.get_command', get_command)
+
+    return servers
+
+
+@pytest.fixture
+def batch_file(tmpdir):
+    def write(*lines):
+        path = tmpdir.join('commands.txt')
+        path.write('\n'.join(lines))
+        return str(path)
+
+    return write
+
+
+def test_runs_each_line_on_the_same_server(go_server, batch_file, fake_get_command, capsys):
+    filename = batch_file(
+        '# Deploy',
+        'pipeline pause First',
+        '',
+        'pipeline trigger "Second Pipeline" --printed=hello',
+    )
+    result = Run(go_server, filename).run()
+    out, _ = capsys.readouterr()
+
+    assert result == dict(exit_code=0, output=False)
+    assert out == '\n'.join((
+        '=== pipeline pause First (exit 0) ===',
+        'First done',
+        '=== pipeline trigger "Second Pipeline" --printed=hello (exit 0) ===',
+        'hello',
+        'Second Pipeline done',
+        '',
+    ))
+    assert fake_get_command == [go_server, go_server]
+
+
+def test_exits_with_the_highest_exit_code(go_server, batch_file, capsys):
+    filename = batch_file(
+        'pipeline check First --exit_code=1',
+        'pipeline check Boom',
+        'pipeline check Quiet',
+    )
+    result = Run(go_server, filename).run()
+    out, _ = capsys.readouterr()
+
+    assert result['exit_code'] == 1
+    assert '=== pipeline check Boom (exit 1) ===\nValueError: Kaboom\n' in out
+    assert '=== pipeline check Quiet (exit 0) ===\n' in out
+
+
+def test_exiting_without_a_code_is_a_success(go_server, batch_file, capsys):
+    result = Run(go_server, batch_file('pipeline check Exit')).run()
+    out, _ = capsys.readouterr()
+
+    assert result['exit_code'] == 0
+    assert '=== pipeline check Exit (exit 0) ===\n' in out
+
+
+def test_stop_on_error(go_server, batch_file, capsys):
+    filename = batch_file('pipeline check First --exit_code=2', 'pipeline check Second')
+    result = Run(go_server, filename, stop_on_error='true').run()
+    out, _ = capsys.readouterr()
+
+    assert result['exit_code'] == 2
+    assert 'Second' not in out
+
+
+def test_concurrent_lines_keep_their_own_output(go_server, batch_file, capsys):
+    lines = ['pipeline check P{0} --printed=output-{0}'.format(i) for i in range(20)]
+    Run(go_server, batch_file(*lines), concurrency=8).run()
+    out, _ = capsys.readouterr()
+
+    expected = []
+    for i, line in enumerate(lines):
+        expected.extend(['=== {0} (exit 0) ==='.format(line), 'output-{0}'.format(i),
+                         'P{0} done'.format(i)])
+    assert out.splitlines() == expected
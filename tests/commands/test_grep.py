@@ -0,0 +1,113 @@
+import re
+
+import pytest
+
+from gocd_cli.commands.pipeline import Grep
+from gocd_cli.commands.pipeline import grep
+from gocd_cli.commands.pipeline.grep import parse_counters
+from gocd_cli.console import matching_lines
+from gocd_cli.server import Server
+
+
+def instance(counter, *jobs):
+    return dict(counter=counter, stages=[
+        dict(name='build', counter=1, jobs=[dict(name=name, result=result)
+                                            for name, result in jobs]),
+    ])
+
+
+def test_parse_counters():
+    assert parse_counters(None) is None
+    assert parse_counters('42') == [42]
+    assert parse_counters('40-42') == [40, 41, 42]
+
+    with pytest.raises(AssertionError):
+        parse_counters('42-40')
+
+
+@pytest.mark.parametrize('chunk_size', [1, 4, 100])
+def test_matching_lines_across_chunks(chunk_size):
+    log = 'compiling\nERROR: disk full\nretrying\r\nERROR: still full'
+    chunks = [log[i:i + chunk_size] for i in range(0, len(log), chunk_size)]
+
+    assert list(matching_lines(chunks, re.compile('ERROR'))) == [
+        (2, 'ERROR: disk full'),
+        (4, 'ERROR: still full'),
+    ]
+
+
+class TestGrep(object):
+    @pytest.fixture(autouse=True)
+    def setup(self, http_server):
+        self.http_server = http_server
+        self.server = Server(http_server.url)
+        self.respond('go/api/pipelines/Deploy/history/0', dict(pipelines=[
+            instance(7, ('compile', 'Passed'), ('test', 'Failed'), ('lint', 'Unknown')),
+        ]))
+        self.respond('go/api/pipelines/Deploy/instance/6', instance(6, ('test', 'Passed')))
+        self.log(7, 'compile', 'warning: unused\nok\n')
+        self.log(7, 'test', 'test_a ok\nERROR: test_b\nERROR: test_c\n')
+        self.log(6, 'test', 'ERROR: flaky\n')
+
+    def respond(self, path, body, status=200):
+        headers = {} if isinstance(body, dict) else {'Content-Type': 'text/plain'}
+        self.http_server.responses['/' + path] = [(status, headers, body)]
+
+    def log(self, counter, job, body):
+        self.respond('go/files/Deploy/{0}/build/1/{1}/cruise-output/console.log'.format(
+            counter, job), body)
+
+    @pytest.mark.parametrize('backend', ['threads', 'multiplex'])
+    def test_searches_the_finished_jobs_of_the_latest_run(self, capsys, backend):
+        result = Grep(self.server, 'Deploy', 'error|warning', ignore_case=True,
+                      backend=backend).run()
+        out, _ = capsys.readouterr()
+
+        assert result == dict(exit_code=0, output='')
+        assert out.splitlines() == [
+            'Deploy/7/build/1/compile:1:warning: unused',
+            'Deploy/7/build/1/test:2:ERROR: test_b',
+            'Deploy/7/build/1/test:3:ERROR: test_c',
+        ]
+
+    def test_counter_range_and_max_count(self, capsys):
+        self.respond('go/api/pipelines/Deploy/instance/7', instance(7, ('test', 'Failed')))
+
+        Grep(self.server, 'Deploy', 'ERROR', counter='6-7', max_count=1).run()
+        out, _ = capsys.readouterr()
+
+        assert out.splitlines() == [
+            'Deploy/6/build/1/test:1:ERROR: flaky',
+            'Deploy/7/build/1/test:2:ERROR: test_b',
+        ]
+
+    def test_many_matches_are_spooled_to_disk(self, capsys, monkeypatch):
+        monkeypatch.setattr(grep, 'SPOOL_SIZE', 64)
+        self.log(7, 'test', ''.join('ERROR: test_{0}\n'.format(i) for i in range(100)))
+
+        result = Grep(self.server, 'Deploy', 'ERROR', job='test').run()
+        out, _ = capsys.readouterr()
+
+        assert result == dict(exit_code=0, output='')
+        assert out.splitlines() == [
+            'Deploy/7/build/1/test:{0}:ERROR: test_{1}'.format(i + 1, i) for i in range(100)
+        ]
+
+    def test_first_match(self, capsys):
+        result = Grep(self.server, 'Deploy', 'ERROR', first=True).run()
+        out, _ = capsys.readouterr()
+
+        assert result['exit_code'] == 0
+        assert out == 'Deploy/7/build/1/test:2:ERROR: test_b\n'
+
+    def test_only_the_given_job(self, capsys):
+        result = Grep(self.server, 'Deploy', 'ERROR', job='compile').run()
+
+        assert result == dict(exit_code=1, output='')
+        assert capsys.readouterr()[0] == ''
+
+    def test_failures(self, capsys):
+        result = Grep(self.server, 'Deploy', 'ERROR', counter='5-6').run()
+
+        assert result == dict(exit_code=3, output='Failed to get run 5: HTTP 404')
+        assert capsys.readouterr()[0] == 'Deploy/6/build/1/test:1:ERROR: flaky\n'
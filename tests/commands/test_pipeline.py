@@ -1,11 +1,17 @@
+import json
 import pytest
 import time
 from datetime import datetime, timedelta
+from StringIO import StringIO
+from urllib import addinfourl
+from urllib2 import HTTPError
 from gocd import Server
 from gocd.api import Pipeline
 from mock import MagicMock
 from gocd.api.response import Response
-from gocd_cli.commands.pipeline import Check, Pause, Trigger, Unlock, Unpause
+from gocd_cli.cache import ResponseCache
+from gocd_cli.commands.pipeline import Check, CheckAll, List, Pause, Trigger, Unlock, Unpause
+from gocd_cli.retry import CircuitOpenError
 
 
 @pytest.fixture
@@ -79,6 +85,44 @@ class TestTrigger(object):
 #         assert output['output'] == "I'm so output, I'll blow your mind"
 
 
+class TestTriggerPolling(object):
+    @pytest.fixture(autouse=True)
+    def setup(self, go_server, monkeypatch):
+        self.sleeps = []
+        monkeypatch.setattr('time.sleep', self.sleeps.append)
+
+        self.cmd = Trigger(go_server, 'Simple-Pipeline', wait_until_finished=True)
+        self.cmd.pipeline.final_results = Pipeline.final_results
+        self.cmd.pipeline.schedule.return_value = self._instance('Unknown')
+        self.cmd.pipeline.instance.side_effect = [
+            self._instance('Unknown'),
+            self._instance('Unknown'),
+            self._instance('Passed'),
+        ]
+
+    def _instance(self, result):
+        return Response._from_json(dict(counter=1, stages=[dict(result=result, jobs=[])]))
+
+    def test_polls_quickly_and_then_backs_off(self):
+        assert self.cmd.run()['exit_code'] == 0
+        assert len(self.sleeps) == 3
+        assert self.sleeps[0] < self.sleeps[1] < self.sleeps[2]
+        assert self.sleeps[0] <= 1.1
+
+    def test_never_waits_longer_than_the_max_poll_interval(self):
+        self.cmd.max_poll_interval = 1.5
+        self.cmd.run()
+
+        assert max(self.sleeps) <= 1.5
+
+    def test_first_poll_is_just_before_the_expected_run_time(self):
+        self.cmd.expected_run_time = 10
+        self.cmd.run()
+
+        assert self.sleeps[0] == 10 * 60 * 0.9
+        assert self.sleeps[1] <= 1.1
+
+
 class TestUnlock(object):
     @pytest.fixture(autouse=True)
     def setup(self, go_server):
@@ -210,6 +254,30 @@ class TestMonitor(object):
     def _assert_ok(self, cmd):
         assert cmd.run()['output'].startswith('OK: Successful')
 
+    def test_ndjson_record_of_a_failed_pipeline(self):
+        pipeline = self._red_pipeline()
+        pipeline.payload['counter'] = 12
+        cmd = self._check('Red-Pipeline', pipeline, format='ndjson')
+
+        result = cmd.run()
+
+        assert result['exit_code'] == 2
+        record = json.loads(result['output'])
+        assert record['pipeline'] == 'Red-Pipeline'
+        assert record['status'] == 'critical'
+        assert record['exit_code'] == 2
+        assert record['output'].startswith('CRITICAL: Pipeline "Red-Pipeline" failed')
+        assert record['counter'] == 12
+        assert record['run_time'] is None
+
+    def test_ndjson_record_has_the_run_time_of_a_running_pipeline(self):
+        cmd = self._check('Building-Pipeline', self._building_pipeline(), format='ndjson')
+
+        record = json.loads(cmd.run()['output'])
+
+        assert record['status'] == 'ok'
+        assert 20 * 60 - 5 <= record['run_time'] <= 20 * 60 + 5
+
     def test_determines_pipeline_has_stalled_warning(self):
         cmd = self._check(
             'Stalled-Pipeline',
@@ -337,3 +405,295 @@ class TestMonitor(object):
         cmd = self._check('Never-Run', Response._from_json({}), ran_after='18:00')
 
         self._assert_critical_run_after(cmd)
+
+
+class TestCheckAll(object):
+    results = {
+        'Green': dict(exit_code=0, output='OK: Successful'),
+        'Paused': dict(exit_code=3, output='UNKNOWN: Pipeline "Paused" is paused'),
+        'Red': dict(exit_code=2, output='CRITICAL: Pipeline "Red" failed'),
+        'Stalled': dict(exit_code=1, output='WARNING: Pipeline "Stalled" stalled'),
+    }
+
+    @pytest.fixture(autouse=True)
+    def setup(self, go_server, monkeypatch):
+        self.go_server = go_server
+        self.go_server.pipeline_groups.return_value.pipelines = set(self.results.keys())
+        self.go_server.request.side_effect = HTTPError(
+            'go/api/dashboard', 404, 'Not Found', {}, StringIO(''))
+
+        results = self.results
+
+        class FakeCheck(object):
+            def __init__(self, server, name, **kwargs):
+                self.name = name
+
+            def run(self):
+                return results[self.name]
+
+        monkeypatch.setattr('gocd_cli.commands.pipeline.Check', FakeCheck)
+        monkeypatch.setattr(
+            'gocd_cli.commands.pipeline.get_settings',
+            lambda section: MagicMock(get=lambda key: None)
+        )
+
+    def test_reports_the_worst_status_and_all_failures_in_order(self):
+        result = CheckAll(self.go_server).run()
+
+        assert result['exit_code'] == 2
+        assert result['output'] == '\n'.join((
+            self.results['Red']['output'],
+            self.results['Stalled']['output'],
+        ))
+
+    def test_concurrent_check_gives_the_same_result_as_sequential(self):
+        sequential = CheckAll(self.go_server).run()
+        concurrent = CheckAll(self.go_server, concurrency='4').run()
+
+        assert concurrent == sequential
+
+    def test_all_green(self):
+        self.go_server.pipeline_groups.return_value.pipelines = set(['Green', 'Paused'])
+
+        assert CheckAll(self.go_server, concurrency=2).run() == dict(
+            exit_code=0,
+            output='OK: All green',
+        )
+
+
+class TestCheckAllFromDashboard(object):
+    @pytest.fixture(autouse=True)
+    def setup(self, go_server, monkeypatch):
+        self.go_server = go_server
+        self.pipelines = {}
+        self.go_server.pipeline.side_effect = lambda name: self.pipelines.setdefault(
+            name, MagicMock(spec=Pipeline))
+        self.go_server.request.side_effect = self._request
+        monkeypatch.setattr(
+            'gocd_cli.commands.pipeline.get_settings',
+            lambda section: MagicMock(get=lambda key: None)
+        )
+
+        scheduled_at = (time.time() - 60 * 5) * 1000
+        self.dashboard = {'_embedded': {'pipeline_groups': [{
+            'name': 'First',
+            '_embedded': {'pipelines': [
+                self._dashboard_pipeline('Green', scheduled_at, ['Passed', 'Unknown']),
+                self._dashboard_pipeline('Paused', scheduled_at, ['Passed'], paused=True),
+                self._dashboard_pipeline('Never-Run', scheduled_at, None),
+                self._dashboard_pipeline('Building', scheduled_at, ['Passed', 'Building']),
+            ]},
+        }]}}
+
+    def _dashboard_pipeline(self, name, scheduled_at, stage_statuses, paused=False):
+        instances = []
+        if stage_statuses is not None:
+            instances.append({
+                '_links': {'self': {
+                    'href': 'http://go:8153/go/api/pipelines/{0}/instance/42'.format(name),
+                }},
+                'label': 'release-42',
+                'schedule_at': scheduled_at,
+                '_embedded': {'stages': [
+                    dict(name='stage{0}'.format(i), status=status)
+                    for i, status in enumerate(stage_statuses)
+                ]},
+            })
+
+        return {
+            'name': name,
+            'pause_info': dict(paused=paused),
+            '_embedded': dict(instances=instances),
+        }
+
+    def _request(self, path, headers=None, **kwargs):
+        assert path == 'go/api/dashboard'
+        return addinfourl(
+            StringIO(json.dumps(self.dashboard)),
+            {'content-type': 'application/vnd.go.cd.v1+json'},
+            path,
+            200,
+        )
+
+    def test_settled_pipelines_only_need_the_dashboard(self):
+        self.dashboard['_embedded']['pipeline_groups'][0]['_embedded']['pipelines'].pop()
+
+        result = CheckAll(self.go_server, concurrency=2).run()
+
+        assert result == dict(exit_code=0, output='OK: All green')
+        assert not self.go_server.pipeline_groups.called
+        for pipeline in self.pipelines.values():
+            assert not pipeline.status.called
+            assert not pipeline.instance.called
+
+    def test_reports_paused_pipelines_from_the_dashboard(self):
+        self.dashboard['_embedded']['pipeline_groups'][0]['_embedded']['pipelines'].pop()
+        cmd = CheckAll(self.go_server, skip_paused=False)
+        cmd.run()
+
+        assert cmd.error_messages == ['UNKNOWN: Pipeline "Paused" is paused']
+        assert not self.pipelines['Paused'].status.called
+
+    def test_running_pipelines_are_checked_individually(self):
+        def pipeline(name):
+            self.pipelines.setdefault(name, MagicMock(spec=Pipeline))
+            self.pipelines[name].status.return_value = Response._from_json(dict(paused=False))
+            self.pipelines[name].instance.return_value = Response._from_json({'stages': [{
+                'name': 'stage1',
+                'result': 'Unknown',
+                'scheduled': True,
+                'jobs': [dict(state='Building', scheduled_date=time.time() * 1000 - 60000 * 90)],
+            }]})
+
+            return self.pipelines[name]
+        self.go_server.pipeline.side_effect = pipeline
+
+        result = CheckAll(self.go_server).run()
+
+        assert result['exit_code'] == 2
+        assert result['output'].startswith('CRITICAL: Pipeline "Building" stalled at')
+        assert self.pipelines['Building'].instance.called
+        assert not self.pipelines['Green'].instance.called
+
+    def test_multiplexed_checks_are_critical_once_the_circuit_is_open(self, monkeypatch):
+        class OpenCircuitClient(object):
+            def __init__(self, server, max_in_flight):
+                pass
+
+            def map(self, calls):
+                for call in calls:
+                    yield call, None, CircuitOpenError('the Go server failed 5 times in a row')
+
+            def close(self):
+                pass
+
+        monkeypatch.setattr('gocd_cli.commands.pipeline.MultiplexClient', OpenCircuitClient)
+
+        result = CheckAll(self.go_server, backend='multiplex').run()
+
+        assert result == dict(
+            exit_code=2,
+            output='CRITICAL: The Go server is unavailable, the Go server failed 5 times in a row',
+        )
+
+    def test_ndjson_streams_a_record_per_pipeline(self, capsys):
+        self.dashboard['_embedded']['pipeline_groups'][0]['_embedded']['pipelines'].pop()
+
+        result = CheckAll(self.go_server, skip_paused=False, format='ndjson', concurrency=2).run()
+        out, _ = capsys.readouterr()
+
+        assert result == dict(exit_code=0, output='')
+        assert [(record['pipeline'], record['status'], record['counter']) for record in map(
+            json.loads, out.splitlines())] == [
+            ('Green', 'ok', 42),
+            ('Never-Run', 'ok', None),
+            ('Paused', 'unknown', None),
+        ]
+
+    def test_without_bulk_every_pipeline_is_checked_individually(self):
+        self.go_server.pipeline_groups.return_value.pipelines = set(['Green'])
+        self.go_server.pipeline.side_effect = None
+        self.go_server.pipeline.return_value.status.return_value = dict(paused=False)
+        self.go_server.pipeline.return_value.instance.return_value = Response._from_json({})
+
+        result = CheckAll(self.go_server, bulk='false').run()
+
+        assert result == dict(exit_code=0, output='OK: All green')
+        assert not self.go_server.request.called
+
+
+class TestCachedResults(object):
+    @pytest.fixture(autouse=True)
+    def setup(self, go_server, tmpdir, monkeypatch):
+        self.go_server = go_server
+        self.go_server.cache = ResponseCache(str(tmpdir.join('cache')), namespace='test')
+        self.go_server.pipeline.return_value.status.return_value = dict(paused=False)
+        self.go_server.pipeline.return_value.instance.return_value = Response._from_json({
+            'stages': [{'name': 'stage1', 'result': 'Failed', 'scheduled': True,
+                        'jobs': [dict(state='Completed', scheduled_date=0)]}],
+        })
+        self.go_server.pipeline_groups.return_value.pipelines = set(['Red'])
+        self.go_server.request.side_effect = HTTPError(
+            'go/api/dashboard', 404, 'Not Found', {}, StringIO(''))
+        monkeypatch.setattr(
+            'gocd_cli.commands.pipeline.get_settings',
+            lambda section: MagicMock(get=lambda key: None)
+        )
+
+    def _instance_calls(self):
+        return self.go_server.pipeline.return_value.instance.call_count
+
+    def test_fresh_check_results_are_reused(self):
+        first = Check(self.go_server, 'Red', cache_ttl=60).run()
+        second = Check(self.go_server, 'Red', cache_ttl=60).run()
+
+        assert first == second
+        assert second['exit_code'] == 2
+        assert self._instance_calls() == 1
+
+    def test_different_arguments_are_checked_again(self):
+        Check(self.go_server, 'Red', cache_ttl=60).run()
+        Check(self.go_server, 'Red', warn_run_time=5, cache_ttl=60).run()
+
+        assert self._instance_calls() == 2
+
+    def test_nothing_is_cached_by_default(self, monkeypatch):
+        monkeypatch.setattr('gocd_cli.utils.get_settings', lambda: MagicMock(get=lambda key: None))
+        Check(self.go_server, 'Red').run()
+        Check(self.go_server, 'Red').run()
+
+        assert self._instance_calls() == 2
+
+    def test_check_all_caches_its_result_as_a_whole(self):
+        first = CheckAll(self.go_server, cache_ttl=60).run()
+        second = CheckAll(self.go_server, cache_ttl=60).run()
+
+        assert first == second
+        assert first['exit_code'] == 2
+        assert self._instance_calls() == 1
+        assert self.go_server.pipeline_groups.call_count == 1
+
+
+class TestList(object):
+    @pytest.fixture(autouse=True)
+    def setup(self, go_server):
+        self.go_server = go_server
+        self.go_server.pipeline_groups.return_value.pipelines = set(['Broken', 'Green', 'Locked'])
+
+        def pipeline(name):
+            pipeline = MagicMock(spec=Pipeline)
+            if name == 'Broken':
+                pipeline.status.return_value = Response(500, 'Oops', {})
+            else:
+                pipeline.status.return_value = Response._from_json(dict(locked=name == 'Locked'))
+
+            return pipeline
+        self.go_server.pipeline.side_effect = pipeline
+
+    def test_prints_every_pipeline_and_reports_errors_at_the_end(self, capsys):
+        result = List(self.go_server, concurrency=3).run()
+        out, _ = capsys.readouterr()
+
+        assert out == 'Green: locked=False\nLocked: locked=True\n'
+        assert result == dict(exit_code=3, output='Error getting status for "Broken"')
+
+    def test_collects_exceptions_as_errors(self, capsys):
+        self.go_server.pipeline.side_effect = IOError('Connection refused')
+        result = List(self.go_server, order='completed').run()
+
+        assert result['exit_code'] == 3
+        assert result['output'].split('\n') == [
+            'Error getting status for "{0}": Connection refused'.format(name)
+            for name in ('Broken', 'Green', 'Locked')
+        ]
+
+    def test_ndjson_prints_errors_in_place(self, capsys):
+        result = List(self.go_server, format='ndjson').run()
+        out, _ = capsys.readouterr()
+
+        assert result == dict(exit_code=3, output='')
+        assert [json.loads(line) for line in out.splitlines()] == [
+            dict(pipeline='Broken', error='HTTP 500'),
+            dict(pipeline='Green', locked=False),
+            dict(pipeline='Locked', locked=True),
+        ]
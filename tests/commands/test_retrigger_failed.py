@@ -0,0 +1,109 @@
+import pytest
+from gocd import Server
+from gocd.api import Pipeline
+from gocd.api.response import Response
+from mock import MagicMock
+
+from gocd_cli.commands.pipeline import RetriggerFailedAll
+
+
+def history(*results):
+    return Response._from_json(dict(pipelines=[dict(
+        counter=7,
+        stages=[dict(name='stage{0}'.format(i), result=result) for i, result in enumerate(results)],
+    )]))
+
+
+class TestRetriggerFailedAll(object):
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.histories = {
+            'deploy-api': history('Passed', 'Failed'),
+            'deploy-web': history('Passed', 'Passed'),
+            'build-api': history('Failed'),
+            'broken': Response(500, 'Oops', {}),
+            'new': Response._from_json(dict(pipelines=[])),
+        }
+        self.pipelines = {}
+        self.go_server = MagicMock(spec=Server)
+        self.go_server.pipeline.side_effect = self._pipeline
+        self.go_server.pipeline_groups.return_value.pipelines = set(self.histories)
+        self.go_server.pipeline_groups.return_value.response = Response._from_json([
+            dict(name='Deploy', pipelines=[dict(name='deploy-api'), dict(name='deploy-web')]),
+            dict(name='Build', pipelines=[
+                dict(name='build-api'), dict(name='broken'), dict(name='new'),
+            ]),
+        ])
+
+    def _pipeline(self, name):
+        if name not in self.pipelines:
+            pipeline = self.pipelines[name] = MagicMock(spec=Pipeline)
+            pipeline.history.return_value = self.histories[name]
+            pipeline.unlock.return_value = Response(406, '', {})
+            pipeline.trigger.return_value = Response(202, '', {}, ok_status=202)
+
+        return self.pipelines[name]
+
+    def _triggered(self):
+        return sorted(name for name, pipeline in self.pipelines.items() if pipeline.trigger.called)
+
+    def test_retriggers_every_failed_pipeline(self):
+        result = RetriggerFailedAll(self.go_server, concurrency=3, rate=0).run()
+
+        assert self._triggered() == ['build-api', 'deploy-api']
+        assert result['exit_code'] == 3
+        assert result['output'].split('\n') == [
+            'Pipeline    Failed stage  Result',
+            'broken                    error: Cannot continue like this. Response was invalid!',
+            'build-api   stage0        retriggered',
+            'deploy-api  stage1        retriggered',
+            'deploy-web                not failed',
+            'new                       no runs',
+        ]
+
+    def test_dry_run_only_lists_what_would_be_retriggered(self):
+        result = RetriggerFailedAll(self.go_server, pattern='*-api', dry_run='true').run()
+
+        assert self._triggered() == []
+        assert result['exit_code'] == 0
+        assert result['output'].split('\n')[1:] == [
+            'build-api   stage0        would retrigger',
+            'deploy-api  stage1        would retrigger',
+        ]
+
+    def test_select_by_group_pattern_and_list(self):
+        cmd = RetriggerFailedAll(self.go_server, group='Deploy', pattern='deploy-*',
+                                 pipelines='deploy-api,build-api')
+
+        assert cmd._pipelines() == ['deploy-api']
+        assert self.go_server.pipeline_groups.call_count == 1
+
+    def test_a_list_of_pipelines_doesnt_need_the_pipeline_groups(self):
+        cmd = RetriggerFailedAll(self.go_server, pattern='*-api', pipelines='deploy-api,unknown')
+
+        assert cmd._pipelines() == ['deploy-api']
+        assert not self.go_server.pipeline_groups.called
+
+    def test_only_when_the_given_stage_failed(self):
+        RetriggerFailedAll(self.go_server, pipelines='deploy-api,build-api', stage='stage1').run()
+
+        assert self._triggered() == ['deploy-api']
+
+    def test_failing_to_retrigger_is_an_error(self):
+        self._pipeline('build-api').trigger.return_value = Response(409, 'Busy', {})
+        result = RetriggerFailedAll(self.go_server, pipelines='build-api').run()
+
+        assert result['exit_code'] == 3
+        assert result['output'].endswith('error: retriggering failed with HTTP 409')
+
+    def test_nothing_selected(self):
+        result = RetriggerFailedAll(self.go_server, group='Missing').run()
+
+        assert result == dict(exit_code=1, output='No pipelines selected')
+
+    def test_a_pipeline_that_never_ran_is_not_retriggered(self):
+        result = RetriggerFailedAll(self.go_server, pipelines='new').run()
+
+        assert self._triggered() == []
+        assert result['exit_code'] == 0
+        assert result['output'].split('\n')[1:] == ['new                     no runs']
@@ -0,0 +1,120 @@
+import pytest
+
+from gocd_cli.commands.pipeline import TriggerMany
+from gocd_cli.commands.pipeline.trigger_many import parse_variables, run_outcome
+from gocd_cli.server import Server
+
+
+def run(counter, *results):
+    return dict(counter=counter, stages=[dict(name='stage', result=result) for result in results])
+
+
+class TestRunOutcome(object):
+    def test_passed_once_every_stage_passed(self):
+        assert run_outcome(run(1, 'Passed', 'Passed')) == 'passed'
+        assert run_outcome(run(1, 'Passed', 'Unknown')) is None
+
+    def test_failed_as_soon_as_a_stage_failed(self):
+        assert run_outcome(run(1, 'Failed', 'Unknown')) == 'failed'
+        assert run_outcome(run(1, 'Passed', 'Cancelled')) == 'failed'
+
+
+class TestParseVariables(object):
+    def test_shared_and_per_pipeline(self):
+        variables = parse_variables(
+            'VERSION=1.4,web:PURGE=true,api:VERSION=1.5', ['api', 'web', 'db'])
+
+        assert variables == dict(
+            api=dict(VERSION='1.5'),
+            web=dict(VERSION='1.4', PURGE='true'),
+            db=dict(VERSION='1.4'),
+        )
+
+    def test_no_variables(self):
+        assert parse_variables(None, ['api']) == dict(api=None)
+
+    def test_unknown_pipeline(self):
+        with pytest.raises(AssertionError):
+            parse_variables('db:VERSION=1', ['api'])
+
+
+class TestTriggerMany(object):
+    @pytest.fixture(autouse=True)
+    def setup(self, http_server, monkeypatch):
+        monkeypatch.setattr('gocd_cli.commands.pipeline.trigger_many.time.sleep', lambda _: None)
+        self.http_server = http_server
+        self.server = Server(http_server.url)
+        for name in ('api', 'web'):
+            self.respond(name, 'schedule', (202, {}, ''))
+            self.respond(name, 'status', (200, {}, dict(locked=False)))
+
+        self.respond('api', 'history/0',
+                     (200, {}, dict(pipelines=[run(4, 'Passed')])),
+                     (200, {}, dict(pipelines=[run(5, 'Unknown'), run(4, 'Passed')])))
+        self.respond('api', 'instance/5',
+                     (200, {}, run(5, 'Unknown')),
+                     (200, {}, run(5, 'Passed')))
+        self.respond('web', 'history/0',
+                     (200, {}, dict(pipelines=[])),
+                     (200, {}, dict(pipelines=[])),
+                     (200, {}, dict(pipelines=[run(1, 'Unknown')])))
+        self.respond('web', 'instance/1',
+                     (200, {}, run(1, 'Unknown')),
+                     (200, {}, run(1, 'Unknown')),
+                     (200, {}, run(1, 'Passed')))
+
+    def respond(self, name, path, *responses):
+        self.http_server.responses['/go/api/pipelines/{0}/{1}'.format(name, path)] = list(responses)
+
+    def paths(self, method=None):
+        return [path for request_method, path, _ in self.http_server.requests
+                if method in (None, request_method)]
+
+    def test_waits_for_every_pipeline(self, capsys):
+        result = TriggerMany(self.server, 'api,web').run()
+        out, _ = capsys.readouterr()
+
+        assert result == dict(exit_code=0, output='2 passed, 0 failed')
+        assert out.splitlines() == ['api 5 passed', 'web 1 passed']
+        assert sorted(self.paths('POST')) == [
+            '/go/api/pipelines/api/schedule', '/go/api/pipelines/web/schedule']
+
+    def test_fail_fast(self, capsys):
+        self.respond('api', 'instance/5', (200, {}, run(5, 'Failed', 'Unknown')))
+
+        result = TriggerMany(self.server, 'api,web', fail_fast=True).run()
+        out, _ = capsys.readouterr()
+
+        assert result['exit_code'] == 2
+        assert result['output'] == '0 passed, 1 failed\nNot finished: web'
+        assert out == 'api 5 failed\n'
+
+    def test_failures_to_trigger(self, capsys):
+        self.respond('web', 'schedule', (
+            409, {'Content-Type': 'text/plain'}, 'Stage [build] is still in progress',
+        ))
+
+        result = TriggerMany(self.server, 'api,web').run()
+
+        assert result['exit_code'] == 3
+        assert result['output'] == (
+            '1 passed, 0 failed\n'
+            'Failed to trigger "web": HTTP 409 Stage [build] is still in progress'
+        )
+
+    def test_unlocks_the_locked_pipelines(self):
+        self.respond('web', 'status', (200, {}, dict(locked=True)))
+        self.respond('web', 'releaseLock', (200, {}, ''))
+
+        TriggerMany(self.server, 'api,web', unlock=True, wait_until_finished=False).run()
+
+        posts = self.paths('POST')
+        assert posts[0] == '/go/api/pipelines/web/releaseLock'
+        assert sorted(posts[1:]) == [
+            '/go/api/pipelines/api/schedule', '/go/api/pipelines/web/schedule']
+
+    def test_without_waiting(self):
+        result = TriggerMany(self.server, 'api,web', wait_until_finished=False).run()
+
+        assert result == dict(exit_code=0, output='Triggered 2 pipelines')
+        assert len(self.paths()) == 2
@@ -0,0 +1,162 @@
+import json
+from StringIO import StringIO
+from urllib import addinfourl
+from urllib2 import HTTPError
+
+import pytest
+from gocd import Server
+from mock import MagicMock
+
+from gocd_cli.commands.pipeline import Watch
+from gocd_cli.commands.pipeline.watch import transitions
+
+
+def dashboard_pipeline(name, counter, statuses, paused=False, locked=False):
+    return {
+        'name': name,
+        'locked': locked,
+        'pause_info': dict(paused=paused),
+        '_embedded': dict(instances=[{
+            '_links': {'self': {'href': 'http://go:8153/go/api/pipelines/{0}/instance/{1}'.format(
+                name, counter,
+            )}},
+            'label': str(counter),
+            'schedule_at': counter * 1000,
+            '_embedded': {'stages': [dict(name='stage', status=status) for status in statuses]},
+        }]),
+    }
+
+
+def state(run=1, result='passed', paused=False, locked=False):
+    return dict(run=run, label=str(run), result=result, paused=paused, locked=locked)
+
+
+class TestTransitions(object):
+    def test_nothing_changed(self):
+        assert transitions(state(), state()) == []
+
+    def test_new_run_building(self):
+        assert transitions(state(), state(run=2, result='building')) == ['started']
+
+    def test_new_run_that_already_finished(self):
+        assert transitions(state(), state(run=2, result='failed')) == ['started', 'failed']
+
+    def test_run_finished(self):
+        assert transitions(state(result='building'), state(result='passed')) == ['passed']
+
+    def test_stage_rerun(self):
+        assert transitions(state(result='failed'), state(result='building')) == ['started']
+
+    def test_paused_and_locked(self):
+        assert transitions(state(), state(paused=True, locked=True)) == ['paused', 'locked']
+        assert transitions(state(paused=True, locked=True), state()) == ['unpaused', 'unlocked']
+
+
+class TestWatch(object):
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.pipelines = {
+            'Build': dashboard_pipeline('Build', 4, ['Passed', 'Passed']),
+            'Deploy': dashboard_pipeline('Deploy', 7, ['Passed', 'Building']),
+        }
+        self.etag = '"1"'
+        self.requests = []
+        self.go_server = MagicMock(spec=Server)
+        self.go_server.request.side_effect = self._request
+
+    def _request(self, path, headers=None, **kwargs):
+        self.requests.append(headers)
+        if headers.get('If-None-Match') == self.etag:
+            raise HTTPError(path, 304, 'Not Modified', {}, StringIO(''))
+
+        body = {'_embedded': {'pipelines': list(self.pipelines.values())}}
+        return addinfourl(
+            StringIO(json.dumps(body)),
+            {'content-type': 'application/vnd.go.cd.v1+json', 'ETag': self.etag},
+            path,
+            200,
+        )
+
+    def _change(self, name, *args, **kwargs):
+        self.pipelines[name] = dashboard_pipeline(name, *args, **kwargs)
+        self.etag = '"{0}"'.format(int(self.etag.strip('"')) + 1)
+
+    def test_first_poll_only_records_the_state(self):
+        watch = Watch(self.go_server)
+
+        assert watch.poll() == []
+        assert sorted(watch.states) == ['Build', 'Deploy']
+
+    def test_unchanged_dashboard_is_not_downloaded_again(self):
+        watch = Watch(self.go_server)
+        watch.poll()
+
+        assert watch.poll() == []
+        assert self.requests[-1]['If-None-Match'] == '"1"'
+
+    def test_only_emits_transitions(self):
+        watch = Watch(self.go_server)
+        watch.poll()
+        self._change('Deploy', 7, ['Passed', 'Failed'])
+        self._change('Build', 5, ['Building', 'Unknown'], locked=True)
+
+        events = [(event['pipeline'], event['event'], event['counter'])
+                  for event in watch.poll()]
+
+        assert events == [
+            ('Build', 'started', 5),
+            ('Build', 'locked', 5),
+            ('Deploy', 'failed', 7),
+        ]
+
+    def test_only_the_given_pipelines(self):
+        watch = Watch(self.go_server, pipelines='Deploy')
+        watch.poll()
+        self._change('Build', 5, ['Building'])
+
+        assert watch.poll() == []
+        assert list(watch.states) == ['Deploy']
+
+    def test_prints_events_until_interrupted(self, capsys, monkeypatch):
+        changes = [
+            lambda: self._change('Deploy', 7, ['Passed', 'Passed']),
+            lambda: None,
+            lambda: self._change('Build', 4, ['Passed', 'Passed'], paused=True),
+        ]
+        sleeps = []
+
+        def sleep(seconds):
+            sleeps.append(seconds)
+            if not changes:
+                raise KeyboardInterrupt
+            changes.pop(0)()
+        monkeypatch.setattr('gocd_cli.commands.pipeline.watch.time.sleep', sleep)
+
+        result = Watch(self.go_server, format='ndjson', min_interval=1, max_interval=10).run()
+        out, _ = capsys.readouterr()
+
+        assert result == dict(exit_code=0, output='')
+        assert [(event['pipeline'], event['event'], event['label'])
+                for event in map(json.loads, out.splitlines())] == [
+            ('Deploy', 'passed', '7'),
+            ('Build', 'paused', '4'),
+        ]
+        # Backs off while nothing changes and starts over after a change
+        assert sleeps[1] < sleeps[2]
+        assert sleeps[3] < sleeps[2]
+
+    def test_text_format(self):
+        watch = Watch(self.go_server)
+
+        assert watch._format_event(dict(
+            time='2016-01-01T10:00:00Z', pipeline='Deploy', event='failed', counter=7, label='7',
+        )) == '2016-01-01T10:00:00Z Deploy 7 failed'
+
+    def test_exits_when_there_is_no_dashboard(self):
+        self.go_server.request.side_effect = HTTPError(
+            'go/api/dashboard', 404, 'Not Found', {}, StringIO(''))
+
+        result = Watch(self.go_server).run()
+
+        assert result['exit_code'] == 3
+        assert result['output'].startswith('Failed to get the dashboard:')
@@ -0,0 +1,79 @@
+import json
+import socket
+import threading
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+
+import pytest
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class GoHandler(BaseHTTPRequestHandler):
+    """Answers with whatever response the test has set up for the path"""
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        self.server.connections += 1
+        self.server.sockets.append(self.connection)
+
+    def do_GET(self):
+        self._respond()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self._respond()
+
+    def _respond(self):
+        self.server.requests.append((self.command, self.path, dict(self.headers)))
+        responses = self.server.responses.get(self.path.split('?')[0], [(404, {}, '')])
+        status, headers, body = responses.pop(0) if len(responses) > 1 else responses[0]
+        if not isinstance(body, str):
+            body = json.dumps(body)
+            headers = dict(headers, **{'Content-Type': 'application/json'})
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def http_server(request):
+    """A local HTTP/1.1 server with keep-alive
+
+    Set up responses with ``http_server.responses[path] = [(status, headers, body)]``,
+    when more than one response is listed they're returned in turn.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GoHandler)
+    server.responses = {}
+    server.requests = []
+    server.connections = 0
+    server.sockets = []
+    server.url = 'http://127.0.0.1:{0}/'.format(server.server_address[1])
+
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+    thread.daemon = True
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        server.server_close()
+        # Let the handlers of kept-alive connections finish now instead of
+        # failing when the interpreter exits
+        for sock in server.sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+    request.addfinalizer(stop)
+
+    return server
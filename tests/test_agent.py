@@ -0,0 +1,144 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import pytest
+
+from gocd_cli import agent, settings
+from gocd_cli.commands.agent import Status, Stop
+from gocd_cli.settings import Settings
+
+
+@pytest.fixture
+def socket_path(request, monkeypatch):
+    # Unix socket paths are limited to ~100 characters, keep it short
+    directory = tempfile.mkdtemp(prefix='gocd')
+    request.addfinalizer(lambda: shutil.rmtree(directory))
+    path = os.path.join(directory, 'agent.sock')
+    monkeypatch.setenv('GOCD_AGENT_SOCKET', path)
+
+    return path
+
+
+@pytest.fixture
+def agent_server(request, socket_path):
+    server = agent.AgentServer(socket_path, ttl=60)
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+    thread.daemon = True
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        thread.join()
+    request.addfinalizer(stop)
+
+    return server
+
+
+@pytest.fixture
+def decrypted(monkeypatch):
+    monkeypatch.setattr(settings, '_decrypted', {})
+
+
+class Decrypter(object):
+    def __init__(self, plaintext='super secret'):
+        self.plaintext = plaintext
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.plaintext
+
+
+def test_decrypts_when_no_agent_is_running(socket_path):
+    decrypt = Decrypter()
+
+    assert agent.get_or_decrypt('caesar', 'fhcre frperg', decrypt) == 'super secret'
+    assert agent.get_or_decrypt('caesar', 'fhcre frperg', decrypt) == 'super secret'
+    assert decrypt.calls == 2
+
+
+def test_decrypts_when_the_agent_hangs(socket_path, monkeypatch):
+    class HangingHandler(agent.AgentRequestHandler):
+        def handle(self):
+            self.rfile.readline()
+            time.sleep(1)
+    server = agent.UnixSocketServer(socket_path, HangingHandler)
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+    thread.daemon = True
+    thread.start()
+    monkeypatch.setattr(agent, 'TIMEOUT', 0.1)
+    decrypt = Decrypter()
+
+    try:
+        started_at = time.time()
+        assert agent.get_or_decrypt('caesar', 'fhcre frperg', decrypt) == 'super secret'
+        assert time.time() - started_at < 0.5
+        assert decrypt.calls == 1
+    finally:
+        server.shutdown()
+        thread.join()
+        server.server_close()
+
+
+def test_only_the_first_process_decrypts(agent_server):
+    decrypt = Decrypter()
+
+    for _ in range(3):
+        assert agent.get_or_decrypt('caesar', 'fhcre frperg', decrypt) == 'super secret'
+
+    assert decrypt.calls == 1
+    assert agent.get_or_decrypt('caesar', 'other', Decrypter('other')) == 'other'
+    assert agent.get_or_decrypt('blowfish', 'fhcre frperg', Decrypter('blow')) == 'blow'
+
+
+def test_secrets_expire(agent_server):
+    agent_server.ttl = 0.01
+    decrypt = Decrypter()
+
+    agent.get_or_decrypt('caesar', 'fhcre frperg', decrypt)
+    time.sleep(0.02)
+    agent.get_or_decrypt('caesar', 'fhcre frperg', decrypt)
+
+    assert decrypt.calls == 2
+    assert agent_server.status()['secrets'] == 1
+
+
+def test_socket_is_only_accessible_by_the_user(agent_server, socket_path):
+    assert os.stat(socket_path).st_mode & 0o077 == 0
+
+
+def test_settings_are_decrypted_once_per_process(decrypted, monkeypatch, socket_path):
+    monkeypatch.setenv('GOCD_ENCRYPTION_MODULE', 'gocd_cli.encryption.caesar')
+    monkeypatch.setenv('GOCD_PASSWORD_ENCRYPTED', 'fhcre frperg')
+    calls = []
+    monkeypatch.setattr('gocd_cli.encryption.caesar.decrypt',
+                        lambda ciphertext: calls.append(ciphertext) or 'super secret')
+
+    for _ in range(2):
+        assert Settings(prefix='gocd', section='gocd').get('password') == 'super secret'
+
+    assert calls == ['fhcre frperg']
+
+
+def test_settings_get_secrets_from_the_agent(decrypted, agent_server, monkeypatch):
+    monkeypatch.setenv('GOCD_ENCRYPTION_MODULE', 'no.such.module')
+    monkeypatch.setenv('GOCD_PASSWORD_ENCRYPTED', 'fhcre frperg')
+    agent_server.put(agent.secret_key('no.such.module', 'fhcre frperg'), 'super secret')
+
+    # The encryption module is never imported
+    assert Settings(prefix='gocd', section='gocd').get('password') == 'super secret'
+
+
+def test_status_and_stop_commands(agent_server, socket_path):
+    agent_server.put('key', 'value')
+
+    status = Status(None, socket=socket_path).run()
+    assert status['exit_code'] == 0
+    assert status['output'].startswith('Running with pid {0},'.format(os.getpid()))
+    assert status['output'].endswith('holding 1 secrets')
+
+    assert Stop(None, socket=socket_path).run()['exit_code'] == 0
+    assert Status(None, socket=socket_path).run() == dict(exit_code=1, output='Not running')
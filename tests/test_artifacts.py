@@ -0,0 +1,327 @@
+import hashlib
+import os
+import socket
+from StringIO import StringIO
+from urllib import addinfourl
+from urllib2 import HTTPError
+
+import pytest
+from gocd.api import Pipeline
+from gocd.api.artifact import Artifact
+from gocd.api.response import Response
+from mock import MagicMock
+
+from gocd_cli import artifacts
+from gocd_cli.artifacts import (
+    ChecksumMismatch,
+    UnsafePath,
+    destination_path,
+    download,
+    fetch_checksums,
+    list_files,
+    parse_checksums,
+    select_files,
+)
+from gocd_cli.commands.artifact import Download, List
+
+BASE_PATH = 'go/files/Simple/3/build/1/compile'
+
+
+def md5(content):
+    return hashlib.md5(content).hexdigest()
+
+
+class Interrupted(StringIO):
+    """A response body that fails after `size` bytes"""
+    def __init__(self, content, size):
+        StringIO.__init__(self, content[:size])
+
+    def read(self, size=-1):
+        chunk = StringIO.read(self, size)
+        if not chunk:
+            raise socket.error(104, 'Connection reset by peer')
+        return chunk
+
+
+class FakeFileServer(object):
+    """Serves files and honors Range, the first `interrupt` requests of a
+    file fail after that many bytes"""
+    def __init__(self, files, interrupt=None):
+        self.files = files
+        self.interrupt = dict(interrupt or {})
+        self.requests = []
+
+    def request(self, path, headers=None):
+        self.requests.append((path, headers))
+        if path not in self.files:
+            raise HTTPError(path, 404, 'Not Found', {}, StringIO(''))
+
+        content = self.files[path]
+        status = 200
+        if headers:
+            offset = int(headers['Range'][len('bytes='):-1])
+            if offset >= len(content):
+                raise HTTPError(path, 416, 'Range Not Satisfiable', {}, StringIO(''))
+            content, status = content[offset:], 206
+
+        body = StringIO(content)
+        if self.interrupt.get(path):
+            sizes = self.interrupt[path]
+            body, self.interrupt[path] = Interrupted(content, sizes[0]), sizes[1:]
+
+        return addinfourl(body, {}, path, status)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(artifacts.time, 'sleep', lambda seconds: None)
+
+
+def test_list_files_flattens_folders():
+    nodes = [
+        dict(name='cruise-output', type='folder', files=[
+            dict(name='console.log', type='file'),
+        ]),
+        dict(name='dist', type='folder', files=[
+            dict(name='app.jar', type='file'),
+            dict(name='docs', type='folder', files=[dict(name='index.html', type='file')]),
+        ]),
+        dict(name='README', type='file'),
+    ]
+
+    assert list_files(nodes) == [
+        'cruise-output/console.log', 'dist/app.jar', 'dist/docs/index.html', 'README',
+    ]
+
+
+def test_select_files_matches_files_and_directories():
+    paths = ['dist/app.jar', 'dist/docs/index.html', 'distribution.txt', 'README']
+
+    assert select_files(paths, ['dist/', 'README']) == [
+        'dist/app.jar', 'dist/docs/index.html', 'README',
+    ]
+
+
+def test_parse_checksums():
+    text = '\n'.join([
+        '#Mon May 02 09:14:03 UTC 2016',
+        'dist/app.jar=D41D8CD98F00B204E9800998ECF8427E',
+        'with\\ space.txt:0cc175b9c0f1b6a831c399e269772661',
+        '',
+    ])
+
+    assert parse_checksums(text) == {
+        'dist/app.jar': 'd41d8cd98f00b204e9800998ecf8427e',
+        'with space.txt': '0cc175b9c0f1b6a831c399e269772661',
+    }
+
+
+def test_destination_path_stays_in_the_destination(tmpdir):
+    destination = str(tmpdir)
+
+    assert destination_path(destination, 'dist/app.jar') == os.path.join(
+        destination, 'dist', 'app.jar'
+    )
+    assert destination_path(destination, 'dist/../app.jar') == os.path.join(
+        destination, 'app.jar'
+    )
+    for path in ['../app.jar', 'dist/../../app.jar', '/etc/passwd', '..', '']:
+        with pytest.raises(UnsafePath):
+            destination_path(destination, path)
+
+
+def test_fetch_checksums_without_any_stored():
+    assert fetch_checksums(FakeFileServer({}), BASE_PATH) == {}
+
+
+class TestDownload(object):
+    path = BASE_PATH + '/dist/app.jar'
+    content = 'x' * 100
+
+    def test_downloads_in_chunks(self, tmpdir):
+        destination = str(tmpdir.join('dist', 'app.jar'))
+        server = FakeFileServer({self.path: self.content})
+
+        assert download(server, self.path, destination, md5(self.content), chunk_size=7) == (
+            'downloaded'
+        )
+        assert open(destination).read() == self.content
+        assert not os.path.exists(destination + '.part')
+
+    def test_skips_unchanged_files(self, tmpdir):
+        destination = str(tmpdir.join('app.jar'))
+        open(destination, 'w').write(self.content)
+        server = FakeFileServer({self.path: self.content})
+
+        assert download(server, self.path, destination, md5(self.content)) == 'unchanged'
+        assert server.requests == []
+
+    def test_downloads_changed_files_again(self, tmpdir):
+        destination = str(tmpdir.join('app.jar'))
+        open(destination, 'w').write('old')
+        server = FakeFileServer({self.path: self.content})
+
+        assert download(server, self.path, destination, md5(self.content)) == 'downloaded'
+        assert open(destination).read() == self.content
+
+    def test_continues_an_interrupted_download(self, tmpdir):
+        destination = str(tmpdir.join('app.jar'))
+        server = FakeFileServer({self.path: self.content}, interrupt={self.path: [30, 20]})
+
+        assert download(server, self.path, destination, md5(self.content), chunk_size=8) == (
+            'resumed'
+        )
+        assert open(destination).read() == self.content
+        assert [headers for _, headers in server.requests] == [
+            None, {'Range': 'bytes=30-'}, {'Range': 'bytes=50-'},
+        ]
+
+    def test_continues_from_an_earlier_run(self, tmpdir):
+        destination = str(tmpdir.join('app.jar'))
+        open(destination + '.part', 'w').write(self.content[:60])
+        server = FakeFileServer({self.path: self.content})
+
+        assert download(server, self.path, destination, md5(self.content)) == 'resumed'
+        assert open(destination).read() == self.content
+        assert server.requests == [(self.path, {'Range': 'bytes=60-'})]
+
+    def test_a_complete_partial_file_is_not_downloaded_again(self, tmpdir):
+        destination = str(tmpdir.join('app.jar'))
+        open(destination + '.part', 'w').write(self.content)
+        server = FakeFileServer({self.path: self.content})
+
+        assert download(server, self.path, destination) == 'resumed'
+        assert open(destination).read() == self.content
+
+    def test_gives_up_after_the_retries(self, tmpdir):
+        destination = str(tmpdir.join('app.jar'))
+        server = FakeFileServer({self.path: self.content}, interrupt={self.path: [10] * 3})
+
+        with pytest.raises(socket.error):
+            download(server, self.path, destination, retries=2)
+
+        # What was downloaded is kept for the next run
+        assert open(destination + '.part').read() == self.content[:30]
+
+    def test_checksum_mismatch_removes_the_partial_file(self, tmpdir):
+        destination = str(tmpdir.join('app.jar'))
+        server = FakeFileServer({self.path: self.content})
+
+        with pytest.raises(ChecksumMismatch):
+            download(server, self.path, destination, md5('something else'))
+
+        assert not os.path.exists(destination)
+        assert not os.path.exists(destination + '.part')
+
+    def test_http_errors_are_not_retried(self, tmpdir):
+        server = FakeFileServer({})
+
+        with pytest.raises(HTTPError):
+            download(server, self.path, str(tmpdir.join('app.jar')))
+
+        assert len(server.requests) == 1
+
+
+def job_server(files, nodes, history=None):
+    """A server with the pipeline Simple, whose latest run is counter 3"""
+    server = FakeFileServer(files)
+    pipeline = MagicMock(spec=Pipeline)
+    pipeline.name = 'Simple'
+    pipeline.history.return_value = history or Response._from_json(
+        dict(pipelines=[dict(counter=3)])
+    )
+    artifact = MagicMock(spec=Artifact)
+    artifact.list.return_value = Response._from_json(nodes)
+    pipeline.artifact.return_value = artifact
+    server.pipeline = MagicMock(return_value=pipeline)
+
+    return server
+
+
+class TestArtifactCommands(object):
+    nodes = [
+        dict(name='dist', type='folder', files=[
+            dict(name='app.jar', type='file'),
+            dict(name='app.pom', type='file'),
+        ]),
+        dict(name='build.log', type='file'),
+    ]
+    files = {
+        BASE_PATH + '/dist/app.jar': 'jar',
+        BASE_PATH + '/dist/app.pom': 'pom',
+        BASE_PATH + '/build.log': 'log',
+        BASE_PATH + '/cruise-output/md5.checksum': 'dist/app.jar={0}\ndist/app.pom={1}\n'.format(
+            md5('jar'), md5('pom'),
+        ),
+    }
+
+    def test_list(self):
+        server = job_server(self.files, self.nodes)
+
+        result = List(server, 'Simple', 'build', 'compile').run()
+
+        assert result == dict(output='dist/app.jar\ndist/app.pom\nbuild.log', exit_code=0)
+        server.pipeline.return_value.artifact.assert_called_with(3, 'build', 'compile', 1)
+
+    def test_list_without_runs(self):
+        server = job_server(self.files, self.nodes, history=Response._from_json(dict(pipelines=[])))
+
+        result = List(server, 'Simple', 'build', 'compile').run()
+
+        assert result == dict(output='Failed to find a run of "Simple"', exit_code=3)
+
+    def test_download(self, tmpdir):
+        server = job_server(self.files, self.nodes)
+        tmpdir.join('dist').mkdir()
+        tmpdir.join('dist', 'app.pom').write('pom')
+
+        result = Download(
+            server, 'Simple', 'build', 'compile', destination=str(tmpdir), concurrency=2,
+        ).run()
+
+        assert result == dict(output='Downloaded 2, resumed 0, unchanged 1 files', exit_code=0)
+        assert tmpdir.join('dist', 'app.jar').read() == 'jar'
+        assert tmpdir.join('build.log').read() == 'log'
+
+    def test_download_selected_paths(self, tmpdir):
+        server = job_server(self.files, self.nodes)
+
+        result = Download(
+            server, 'Simple', 'build', 'compile', counter='3', paths='dist',
+            destination=str(tmpdir),
+        ).run()
+
+        assert result['output'] == 'Downloaded 2, resumed 0, unchanged 0 files'
+        assert not tmpdir.join('build.log').check()
+
+    def test_download_errors(self, tmpdir):
+        files = dict(self.files)
+        files[BASE_PATH + '/dist/app.jar'] = 'corrupt'
+        del files[BASE_PATH + '/build.log']
+        server = job_server(files, self.nodes)
+
+        result = Download(server, 'Simple', 'build', 'compile', destination=str(tmpdir)).run()
+
+        assert result['exit_code'] == 3
+        assert result['output'].split('\n') == [
+            'Downloaded 1, resumed 0, unchanged 0 files',
+            'Error downloading "build.log": HTTP Error 404: Not Found',
+            'Error downloading "dist/app.jar": expected md5 {0} but got {1}'.format(
+                md5('jar'), md5('corrupt'),
+            ),
+        ]
+
+    def test_download_refuses_paths_outside_the_destination(self, tmpdir):
+        destination = tmpdir.join('artifacts')
+        nodes = [dict(name='..', type='folder', files=[dict(name='escaped', type='file')])]
+        server = job_server({BASE_PATH + '/../escaped': 'evil'}, nodes)
+
+        result = Download(server, 'Simple', 'build', 'compile', destination=str(destination)).run()
+
+        assert result['exit_code'] == 3
+        assert result['output'].split('\n') == [
+            'Downloaded 0, resumed 0, unchanged 0 files',
+            'Error downloading "../escaped": "../escaped" is outside of the destination',
+        ]
+        assert not tmpdir.join('escaped').check()
+        assert server.requests == [(BASE_PATH + '/cruise-output/md5.checksum', None)]
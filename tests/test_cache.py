@@ -0,0 +1,194 @@
+import os
+import threading
+import time
+
+import pytest
+
+from gocd_cli.cache import ResponseCache, ResultCache
+from gocd_cli.server import Server
+from gocd_cli.utils import run_concurrently
+
+PIPELINE_GROUPS = '/go/api/config/pipeline_groups'
+
+
+@pytest.fixture
+def pipeline_groups():
+    return [dict(name='First', pipelines=[dict(name='Simple')])]
+
+
+class TestResponseCache(object):
+    @pytest.fixture(autouse=True)
+    def setup(self, tmpdir, http_server, pipeline_groups):
+        self.directory = str(tmpdir.join('cache'))
+        self.http_server = http_server
+        self.http_server.responses[PIPELINE_GROUPS] = [(200, {}, pipeline_groups)]
+        self.pipeline_groups = pipeline_groups
+
+    def _server(self, **kwargs):
+        cache = ResponseCache(self.directory, namespace='test', **kwargs)
+        return Server(self.http_server.url, cache=cache)
+
+    def _requests(self):
+        return len(self.http_server.requests)
+
+    def test_only_fetches_once_while_fresh(self):
+        for _ in range(2):
+            response = self._server().pipeline_groups()
+            assert response.pipelines == set(['Simple'])
+            assert response.response.payload == self.pipeline_groups
+
+        assert self._requests() == 1
+
+    def test_fetches_again_when_expired(self):
+        self._server(ttls=dict(pipeline_groups=0.01)).pipeline_groups().pipelines
+        time.sleep(0.02)
+        self._server(ttls=dict(pipeline_groups=0.01)).pipeline_groups().pipelines
+
+        assert self._requests() == 2
+
+    def test_refresh_ignores_cached_entries_but_stores_new(self):
+        self._server().pipeline_groups().pipelines
+        self._server(refresh=True).pipeline_groups().pipelines
+        self._server().pipeline_groups().pipelines
+
+        assert self._requests() == 2
+
+    def test_endpoints_without_ttl_are_not_cached(self):
+        self.http_server.responses['/go/api/pipelines/Simple/status'] = [(200, {}, dict())]
+        server = self._server()
+        server.pipeline('Simple').status()
+        server.pipeline('Simple').status()
+
+        assert self._requests() == 2
+
+    def test_errors_are_not_cached(self):
+        self.http_server.responses[PIPELINE_GROUPS] = [(500, {}, 'Oops')]
+        assert not self._server().pipeline_groups().response
+        assert not self._server().pipeline_groups().response
+
+        assert self._requests() == 2
+
+    def test_namespaces_are_kept_apart(self):
+        self._server().pipeline_groups().pipelines
+        cache = ResponseCache(self.directory, namespace='other')
+        Server(self.http_server.url, cache=cache).pipeline_groups().pipelines
+
+        assert self._requests() == 2
+
+    def test_concurrent_misses_make_one_request(self):
+        def fetch(_):
+            return self._server().pipeline_groups().pipelines
+
+        results = run_concurrently(fetch, range(5), concurrency=5)
+
+        assert list(results) == [set(['Simple'])] * 5
+        assert self._requests() == 1
+
+    def test_an_unwritable_directory_isnt_cached(self, tmpdir):
+        tmpdir.join('not-a-directory').write('')
+        self.directory = str(tmpdir.join('not-a-directory', 'cache'))
+
+        for _ in range(2):
+            assert self._server().pipeline_groups().pipelines == set(['Simple'])
+
+        assert self._requests() == 2
+
+
+class TestResultCache(object):
+    @pytest.fixture(autouse=True)
+    def setup(self, tmpdir):
+        self.directory = str(tmpdir.join('cache'))
+        self.computed = []
+
+    def _cache(self, ttl=60, **kwargs):
+        return ResultCache(self.directory, namespace='test', ttl=ttl, **kwargs)
+
+    def _compute(self, exit_code=2):
+        self.computed.append(exit_code)
+        return dict(exit_code=exit_code, output='CRITICAL: Pipeline "Red" failed')
+
+    def test_returns_the_same_result_while_fresh(self):
+        first = self._cache().fetch(['check', 'Red'], self._compute)
+        second = self._cache().fetch(['check', 'Red'], lambda: self._compute(0))
+
+        assert first == second == dict(exit_code=2, output='CRITICAL: Pipeline "Red" failed')
+        assert self.computed == [2]
+
+    def test_computes_again_when_expired(self):
+        self._cache(ttl=0.01).fetch(['check', 'Red'], self._compute)
+        time.sleep(0.02)
+        self._cache(ttl=0.01).fetch(['check', 'Red'], self._compute)
+
+        assert len(self.computed) == 2
+
+    def test_keys_and_namespaces_are_kept_apart(self):
+        self._cache().fetch(['check', 'Red'], self._compute)
+        self._cache().fetch(['check', 'Green'], self._compute)
+        ResultCache(self.directory, namespace='other', ttl=60).fetch(
+            ['check', 'Red'], self._compute
+        )
+
+        assert len(self.computed) == 3
+
+    def test_refresh_computes_but_stores_the_new_result(self):
+        self._cache().fetch(['check', 'Red'], self._compute)
+        self._cache(refresh=True).fetch(['check', 'Red'], lambda: self._compute(0))
+
+        assert self._cache().fetch(['check', 'Red'], self._compute)['exit_code'] == 0
+
+    def test_errors_are_not_cached(self):
+        def fail():
+            raise Exception('Invalid response!')
+
+        with pytest.raises(Exception):
+            self._cache().fetch(['check', 'Red'], fail)
+
+        self._cache().fetch(['check', 'Red'], self._compute)
+        assert self.computed == [2]
+
+    def test_concurrent_misses_compute_once(self):
+        def compute():
+            time.sleep(0.05)
+            return self._compute()
+
+        def fetch(_):
+            return self._cache().fetch(['check', 'Red'], compute)
+
+        assert len(set(
+            result['exit_code'] for result in run_concurrently(fetch, range(5), concurrency=5)
+        )) == 1
+        assert self.computed == [2]
+
+    def test_an_unwritable_directory_isnt_cached(self, tmpdir):
+        tmpdir.join('not-a-directory').write('')
+        self.directory = str(tmpdir.join('not-a-directory', 'cache'))
+
+        for _ in range(2):
+            assert self._cache().fetch(['check', 'Red'], self._compute)['exit_code'] == 2
+
+        assert len(self.computed) == 2
+
+    def test_one_lock_file_for_all_entries(self):
+        for key in ('First', 'Second', 'Third'):
+            self._cache().fetch(['check', key], self._compute)
+
+        assert sorted(name for name in os.listdir(self.directory) if 'lock' in name) == ['.lock']
+
+    def test_other_entries_dont_wait_for_a_slow_one(self):
+        started, finish = threading.Event(), threading.Event()
+
+        def slow():
+            started.set()
+            finish.wait(5)
+            return self._compute()
+        thread = threading.Thread(target=self._cache().fetch, args=(['check', 'Slow'], slow))
+        thread.start()
+        started.wait(5)
+
+        try:
+            assert self._cache().fetch(['check', 'Fast'], lambda: self._compute(0)) == dict(
+                exit_code=0, output='CRITICAL: Pipeline "Red" failed',
+            )
+        finally:
+            finish.set()
+            thread.join()
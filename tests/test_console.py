@@ -0,0 +1,177 @@
+import time
+from StringIO import StringIO
+from urllib import addinfourl
+from urllib2 import HTTPError
+
+import pytest
+from mock import MagicMock
+
+from gocd import Server
+from gocd.api import Pipeline
+from gocd_cli.console import (
+    ConsoleTail,
+    console_log_path,
+    console_outputs,
+    read_console,
+    spool_console,
+    write_stripped,
+)
+
+
+class FakeLogServer(object):
+    """Serves console logs that grow between requests and honors Range"""
+    def __init__(self, logs, honor_range=True):
+        self.logs = logs
+        self.honor_range = honor_range
+        self.requests = []
+
+    def request(self, path, headers=None):
+        self.requests.append((path, headers))
+        if path not in self.logs:
+            raise HTTPError(path, 404, 'Not Found', {}, StringIO(''))
+
+        log = self.logs[path]
+        if headers and self.honor_range:
+            offset = int(headers['Range'][len('bytes='):-1])
+            if offset >= len(log):
+                raise HTTPError(path, 416, 'Range Not Satisfiable', {}, StringIO(''))
+
+            return addinfourl(StringIO(log[offset:]), {}, path, 206)
+
+        return addinfourl(StringIO(log), {}, path, 200)
+
+
+def test_console_log_path():
+    assert console_log_path('Simple', 3, 'defaultStage', 1, 'defaultJob') == (
+        'go/files/Simple/3/defaultStage/1/defaultJob/cruise-output/console.log'
+    )
+
+
+class TestReadConsole(object):
+    path = 'go/files/Simple/1/stage/1/job/cruise-output/console.log'
+
+    def test_reads_in_chunks(self):
+        server = FakeLogServer({self.path: 'abcdefg'})
+
+        assert list(read_console(server, self.path, chunk_size=3)) == ['abc', 'def', 'g']
+        assert server.requests == [(self.path, None)]
+
+    def test_only_asks_for_new_bytes(self):
+        server = FakeLogServer({self.path: 'abcdefg'})
+
+        assert ''.join(read_console(server, self.path, offset=4)) == 'efg'
+        assert server.requests == [(self.path, {'Range': 'bytes=4-'})]
+
+    def test_skips_old_bytes_when_range_is_ignored(self):
+        server = FakeLogServer({self.path: 'abcdefg'}, honor_range=False)
+
+        assert ''.join(read_console(server, self.path, offset=4, chunk_size=3)) == 'efg'
+
+    def test_nothing_when_log_missing_or_unchanged(self):
+        server = FakeLogServer({self.path: 'abc'})
+
+        assert list(read_console(server, 'go/files/missing', 0)) == []
+        assert list(read_console(server, self.path, offset=3)) == []
+
+
+class TestConsoleTail(object):
+    path = console_log_path('Simple', 1, 'defaultStage', 1, 'defaultJob')
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        self.server = FakeLogServer({})
+        self.pipeline = MagicMock(spec=Pipeline)
+        self.pipeline.name = 'Simple'
+        self.pipeline.server = MagicMock(spec=Server, request=self.server.request)
+        self.pipeline.final_results = Pipeline.final_results
+        self.out = StringIO()
+        self.tail = ConsoleTail(self.pipeline, out=self.out)
+
+    def _instance(self, state='Building', result='Unknown'):
+        return dict(counter=1, stages=[dict(
+            name='defaultStage',
+            counter=1,
+            jobs=[dict(name='defaultJob', state=state, result=result)],
+        )])
+
+    def test_prints_only_new_output_with_a_single_masthead(self):
+        self.server.logs[self.path] = 'first\n'
+        self.tail.update(self._instance())
+        self.server.logs[self.path] = 'first\nsecond\n'
+        self.tail.update(self._instance())
+
+        output = self.out.getvalue()
+        assert output.count('=== ') == 1
+        assert 'job="defaultJob"' in output
+        assert output.endswith('first\nsecond\n')
+
+    def test_stops_asking_once_job_has_finished(self):
+        self.server.logs[self.path] = 'done\n'
+        self.tail.update(self._instance('Completed', 'Passed'))
+        self.tail.update(self._instance('Completed', 'Passed'))
+
+        assert len(self.server.requests) == 1
+
+    def test_a_finished_job_is_asked_again_until_its_log_is_uploaded(self):
+        self.tail.update(self._instance('Completed', 'Passed'))
+        self.server.logs[self.path] = 'done\n'
+        self.tail.update(self._instance('Completed', 'Passed'))
+        self.tail.update(self._instance('Completed', 'Passed'))
+
+        assert len(self.server.requests) == 2
+        assert self.out.getvalue().endswith('done\n')
+
+    def test_skips_jobs_that_have_not_been_assigned(self):
+        self.tail.update(self._instance('Scheduled'))
+
+        assert self.server.requests == []
+
+
+class TestConsoleOutputs(object):
+    def _instance(self, jobs):
+        return dict(counter=3, stages=[
+            dict(name='build', counter=1, jobs=[
+                dict(name=name, result=result) for name, result in jobs
+            ]),
+        ])
+
+    def test_in_job_order_whatever_finishes_first(self, monkeypatch):
+        logs = dict(
+            (console_log_path('Simple', 3, 'build', 1, job), 'output of {0}\n'.format(job))
+            for job in ('compile', 'test', 'lint')
+        )
+        server = FakeLogServer(logs)
+        request = server.request
+
+        def slow_first_job(path, headers=None):
+            if '/compile/' in path:
+                time.sleep(0.05)
+            return request(path, headers)
+        server.request = slow_first_job
+
+        instance = self._instance([('compile', 'Passed'), ('test', 'Failed'),
+                                   ('lint', 'Passed'), ('deploy', 'Unknown')])
+        output = [(metadata['job'], metadata['job_result'], log.read())
+                  for metadata, log in console_outputs(server, 'Simple', instance, 3)]
+
+        assert output == [
+            ('compile', 'Passed', 'output of compile\n'),
+            ('test', 'Failed', 'output of test\n'),
+            ('lint', 'Passed', 'output of lint\n'),
+        ]
+
+    def test_large_logs_are_spooled_to_disk(self):
+        path = console_log_path('Simple', 3, 'build', 1, 'compile')
+        log = spool_console(FakeLogServer({path: 'x' * 100}), path, spool_size=10)
+
+        assert log._rolled
+        assert log.read() == 'x' * 100
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 3, 100])
+def test_write_stripped(chunk_size):
+    for log in ('\n  first\n\n  second  \n\n', 'no whitespace', '   \n ', ''):
+        out = StringIO()
+        write_stripped(StringIO(log), out, chunk_size=chunk_size)
+
+        assert out.getvalue() == log.strip()
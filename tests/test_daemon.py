@@ -0,0 +1,180 @@
+import os
+import shutil
+import tempfile
+import threading
+from StringIO import StringIO
+
+import pytest
+from mock import MagicMock
+
+from gocd import Server
+from gocd_cli import daemon
+from gocd_cli.utils import local_path
+from gocd_cli.commands.daemon import Status, Stop
+
+
+class FakeCommand(object):
+    def __init__(self, server, name):
+        self.server = server
+        self.name = name
+
+    def run(self):
+        if self.name == 'Boom':
+            raise ValueError('Kaboom')
+        elif self.name == 'Where':
+            return dict(exit_code=0, output=local_path('relative.db'))
+
+        print('Checking {0}'.format(self.name))
+        return dict(exit_code=2, output='CRITICAL: {0} failed'.format(self.name))
+
+
+@pytest.fixture
+def socket_path(request):
+    # Unix socket paths are limited to ~100 characters, keep it short
+    directory = tempfile.mkdtemp(prefix='gocd')
+    request.addfinalizer(lambda: shutil.rmtree(directory))
+
+    return os.path.join(directory, 'daemon.sock')
+
+
+@pytest.fixture
+def go_server(monkeypatch):
+    servers = []
+
+    def get_command(server, command, subcommand, *args):
+        servers.append(server)
+        return FakeCommand(server, *args)
+    monkeypatch.setattr('gocd_cli.utils.get_command', get_command)
+
+    server = MagicMock(spec=Server)
+    server.servers = servers
+    return server
+
+
+@pytest.fixture
+def daemon_server(request, socket_path, go_server):
+    server = daemon.DaemonServer(socket_path, go_server)
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+    thread.daemon = True
+    thread.start()
+
+    def stop():
+        server.shutdown()
+        thread.join()
+    request.addfinalizer(stop)
+
+    return server
+
+
+def test_not_forwarded_without_a_daemon(socket_path):
+    assert daemon.forward(['pipeline', 'check', 'Simple'], path=socket_path) is None
+
+
+def test_not_forwarded_when_turned_off(monkeypatch):
+    monkeypatch.setenv('GOCD_DAEMON_SOCKET', '')
+
+    assert daemon.socket_path() is None
+    assert daemon.forward(['pipeline', 'check', 'Simple']) is None
+
+
+def test_local_commands_are_never_forwarded(daemon_server, socket_path):
+    for argv in (['help', 'pipeline'], ['batch', 'run'], ['--no-cache', 'pipeline', 'list'],
+                 ['pipeline', 'watch']):
+        assert daemon.forward(argv, path=socket_path) is None
+
+
+def test_runs_the_command_in_the_daemon(daemon_server, socket_path, go_server):
+    out = StringIO()
+
+    assert daemon.forward(['pipeline', 'check', 'Simple'], path=socket_path, out=out) == 2
+    assert out.getvalue() == 'Checking Simple\nCRITICAL: Simple failed\n'
+    assert go_server.servers == [go_server]
+
+
+def test_refused_when_the_settings_environment_differs(
+        daemon_server, socket_path, go_server, monkeypatch):
+    monkeypatch.setenv('GOCD_SERVER', 'http://other-go-server:8153/')
+
+    assert daemon.forward(['pipeline', 'check', 'Simple'], path=socket_path) is None
+    assert go_server.servers == []
+
+    monkeypatch.delenv('GOCD_SERVER')
+    monkeypatch.setenv('GOCD_DAEMON_SOCKET', socket_path)
+    out = StringIO()
+
+    assert daemon.forward(['pipeline', 'check', 'Simple'], path=socket_path, out=out) == 2
+    assert go_server.servers == [go_server]
+
+
+def test_settings_environment():
+    environ = dict(GOCD_USER='admin', CHECK_ALL_IGNORED_PIPELINES='Old', GOCD_AGENT_SOCKET='',
+                   HOME='/home/dev')
+
+    assert daemon.settings_environment(environ) == dict(
+        GOCD_USER='admin', CHECK_ALL_IGNORED_PIPELINES='Old',
+    )
+
+
+def test_exceptions_are_reported(daemon_server, socket_path):
+    out = StringIO()
+
+    assert daemon.forward(['pipeline', 'check', 'Boom'], path=socket_path, out=out) == 1
+    assert 'ValueError: Kaboom' in out.getvalue()
+
+
+def test_relative_paths_are_resolved_against_the_callers_directory(
+        daemon_server, socket_path, monkeypatch, tmpdir):
+    monkeypatch.chdir(tmpdir)
+    out = StringIO()
+
+    assert daemon.forward(['pipeline', 'check', 'Where'], path=socket_path, out=out) == 0
+    assert out.getvalue() == '{0}\n'.format(tmpdir.join('relative.db'))
+
+    sock = daemon.connect(socket_path)
+    try:
+        messages = list(daemon.send(sock, dict(
+            argv=['pipeline', 'check', 'Where'], cwd='/home/dev/project',
+            environment=daemon.settings_environment(),
+        )))
+    finally:
+        sock.close()
+    assert ''.join(message.get('output', '') for message in messages) == (
+        '/home/dev/project/relative.db\n'
+    )
+    assert messages[-1] == dict(exit_code=0)
+
+
+def test_socket_is_only_accessible_by_the_user(daemon_server, socket_path):
+    assert os.stat(socket_path).st_mode & 0o077 == 0
+
+
+def test_refuses_to_start_twice(daemon_server, socket_path, go_server):
+    with pytest.raises(RuntimeError):
+        daemon.DaemonServer(socket_path, go_server)
+
+
+def test_replaces_a_stale_socket(socket_path, go_server):
+    open(socket_path, 'w').close()
+    server = daemon.DaemonServer(socket_path, go_server)
+    server.server_close()
+
+    assert not os.path.exists(socket_path)
+
+
+def test_stops_when_idle(socket_path, go_server):
+    server = daemon.DaemonServer(socket_path, go_server, idle_timeout=0.05)
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+    thread.start()
+    thread.join(5)
+
+    assert not thread.is_alive()
+    assert not os.path.exists(socket_path)
+
+
+def test_status_and_stop_commands(daemon_server, socket_path, go_server):
+    status = Status(go_server, socket=socket_path).run()
+    assert status['exit_code'] == 0
+    assert status['output'].startswith('Running with pid {0},'.format(os.getpid()))
+
+    assert Stop(go_server, socket=socket_path).run()['exit_code'] == 0
+    assert Status(go_server, socket=socket_path).run() == dict(exit_code=1, output='Not running')
@@ -0,0 +1,182 @@
+import sqlite3
+
+import pytest
+from gocd import Server
+from gocd.api import Pipeline
+from gocd.api.response import Response
+from mock import MagicMock
+
+from gocd_cli.commands.history import Sync
+from gocd_cli.history import HistoryStore, fetch_new_runs, high_water_mark
+
+
+def run(counter, state='Completed', result='Passed'):
+    return dict(
+        counter=counter,
+        label=str(counter),
+        build_cause=dict(trigger_message='modified by dev'),
+        stages=[dict(
+            name='build',
+            counter='1',
+            result=result,
+            approved_by='changes',
+            jobs=[dict(name='compile', state=state, result=result, scheduled_date=counter * 1000)],
+        )],
+    )
+
+
+def paged_pipeline(runs, page_size=2):
+    """A mocked pipeline that serves `runs` (newest first) in pages"""
+    def history(offset=0):
+        return Response._from_json(dict(
+            pipelines=runs[offset:offset + page_size],
+            pagination=dict(offset=offset, total=len(runs), page_size=page_size),
+        ))
+
+    pipeline = MagicMock(spec=Pipeline)
+    pipeline.history.side_effect = history
+    return pipeline
+
+
+class TestFetchNewRuns(object):
+    def test_fetches_every_page(self):
+        pipeline = paged_pipeline([run(i) for i in range(5, 0, -1)])
+
+        assert [r['counter'] for r in fetch_new_runs(pipeline)] == [5, 4, 3, 2, 1]
+        assert pipeline.history.call_count == 3
+
+    def test_stops_at_the_first_page_reaching_since(self):
+        pipeline = paged_pipeline([run(i) for i in range(9, 0, -1)])
+
+        assert [r['counter'] for r in fetch_new_runs(pipeline, since=6)] == [9, 8, 7]
+        assert pipeline.history.call_count == 2
+
+    def test_raises_on_errors(self):
+        pipeline = MagicMock(spec=Pipeline)
+        pipeline.history.return_value = Response(500, 'Oops', {})
+
+        with pytest.raises(Exception) as exc:
+            fetch_new_runs(pipeline)
+
+        assert 'HTTP 500' in str(exc.value)
+
+
+class TestHighWaterMark(object):
+    def test_is_the_newest_counter_when_all_finished(self):
+        assert high_water_mark([run(3), run(2)], since=1) == 3
+
+    def test_stops_below_the_oldest_unfinished_run(self):
+        runs = [run(5), run(4, state='Building'), run(3)]
+
+        assert high_water_mark(runs, since=2) == 3
+
+    def test_keeps_since_without_finished_runs(self):
+        assert high_water_mark([], since=4) == 4
+        assert high_water_mark([run(5, state='Scheduled')], since=4) == 4
+
+
+class TestHistoryStore(object):
+    def test_stores_runs_stages_and_jobs(self, tmpdir):
+        path = str(tmpdir.join('history', 'history.sqlite'))
+        store = HistoryStore(path)
+        store.store('Deploy', [run(2, result='Failed'), run(1)], 2, 1234)
+        store.close()
+
+        db = sqlite3.connect(path)
+        assert db.execute('SELECT * FROM pipelines').fetchall() == [('Deploy', 2, 1234)]
+        assert db.execute(
+            'SELECT counter, result, scheduled_at, trigger_message FROM pipeline_runs '
+            'ORDER BY counter'
+        ).fetchall() == [(1, 'Passed', 1000, 'modified by dev'),
+                         (2, 'Failed', 2000, 'modified by dev')]
+        assert db.execute(
+            'SELECT pipeline_counter, name, counter, approved_by FROM stages ORDER BY 1'
+        ).fetchall() == [(1, 'build', 1, 'changes'), (2, 'build', 1, 'changes')]
+        assert db.execute(
+            'SELECT pipeline_counter, stage, name, state, result FROM jobs ORDER BY 1'
+        ).fetchall() == [(1, 'build', 'compile', 'Completed', 'Passed'),
+                         (2, 'build', 'compile', 'Completed', 'Failed')]
+
+    def test_replaces_runs_stored_before(self, tmpdir):
+        store = HistoryStore(str(tmpdir.join('history.sqlite')))
+        store.store('Deploy', [run(1, state='Building', result='Unknown')], 0, 1)
+        store.store('Deploy', [run(1)], 1, 2)
+
+        assert store.high_water_marks() == {'Deploy': 1}
+        assert store.connection.execute(
+            'SELECT state FROM jobs').fetchall() == [('Completed',)]
+
+
+class TestSync(object):
+    @pytest.fixture(autouse=True)
+    def setup(self, tmpdir):
+        self.database = str(tmpdir.join('history.sqlite'))
+        self.runs = {
+            'Deploy': [run(3, state='Building', result='Unknown'), run(2), run(1)],
+            'Build': [run(i) for i in range(5, 0, -1)],
+        }
+        self.pipelines = {}
+        self.go_server = MagicMock(spec=Server)
+        self.go_server.pipeline.side_effect = self._pipeline
+        self.go_server.pipeline_groups.return_value.pipelines = set(self.runs)
+
+    def _pipeline(self, name):
+        if name not in self.pipelines:
+            self.pipelines[name] = paged_pipeline(self.runs[name])
+
+        return self.pipelines[name]
+
+    def _sync(self, **kwargs):
+        self.pipelines.clear()
+        return Sync(self.go_server, database=self.database, **kwargs).run()
+
+    def _query(self, sql):
+        return sqlite3.connect(self.database).execute(sql).fetchall()
+
+    def test_syncs_every_pipeline(self):
+        result = self._sync(concurrency=2)
+
+        assert result == dict(exit_code=0, output='Synced 8 new runs of 2 pipelines')
+        assert self._query('SELECT name, high_water_mark FROM pipelines ORDER BY name') == [
+            ('Build', 5), ('Deploy', 2),
+        ]
+        assert self._query('SELECT COUNT(*) FROM jobs') == [(8,)]
+
+    def test_only_fetches_runs_after_the_high_water_mark(self):
+        self._sync()
+        self.runs['Build'].insert(0, run(6))
+        self.runs['Deploy'][0] = run(3)
+
+        result = self._sync()
+
+        assert result['output'] == 'Synced 2 new runs of 2 pipelines'
+        assert self.pipelines['Build'].history.call_count == 1
+        assert self._query('SELECT name, high_water_mark FROM pipelines ORDER BY name') == [
+            ('Build', 6), ('Deploy', 3),
+        ]
+        assert self._query("SELECT result FROM pipeline_runs WHERE pipeline = 'Deploy' "
+                           "AND counter = 3") == [('Passed',)]
+
+    def test_full_fetches_everything_again(self):
+        self._sync()
+
+        assert self._sync(full='true')['output'] == 'Synced 8 new runs of 2 pipelines'
+
+    def test_only_the_given_pipelines(self):
+        result = self._sync(pipelines='Deploy')
+
+        assert result['output'] == 'Synced 3 new runs of 1 pipelines'
+        assert self._query('SELECT name FROM pipelines') == [('Deploy',)]
+
+    def test_reports_pipelines_that_failed(self):
+        self.go_server.pipeline.side_effect = None
+        self.go_server.pipeline.return_value.history.return_value = Response(500, 'Oops', {})
+
+        result = self._sync(pipelines='Deploy')
+
+        assert result['exit_code'] == 3
+        assert result['output'] == (
+            'Synced 0 new runs of 0 pipelines\n'
+            'Error syncing "Deploy": Failed to get the history: HTTP 500'
+        )
+        assert self._query('SELECT * FROM pipelines') == []
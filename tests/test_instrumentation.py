@@ -0,0 +1,76 @@
+import json
+from StringIO import StringIO
+
+import pytest
+
+from gocd_cli.instrumentation import RequestRecorder, path_template, percentile, report
+from gocd_cli.server import Server
+
+
+@pytest.mark.parametrize('path,template', [
+    ('go/api/pipelines/Simple/status', 'go/api/pipelines/:pipeline/status'),
+    ('go/api/pipelines/Simple/history/10', 'go/api/pipelines/:pipeline/history/:n'),
+    ('/go/api/pipelines/Simple/instance/3?x=1', 'go/api/pipelines/:pipeline/instance/:n'),
+    ('go/files/Simple/3/build/1/unit/cruise-output/console.log',
+     'go/files/:pipeline/:counter/:stage/:stage_counter/:job/cruise-output/console.log'),
+    ('go/run/Simple/3/deploy', 'go/run/:pipeline/:counter/:stage'),
+    ('go/api/config/pipeline_groups', 'go/api/config/pipeline_groups'),
+])
+def test_path_template(path, template):
+    assert path_template(path) == template
+
+
+def test_percentile():
+    values = range(1, 101)
+
+    assert percentile(values, 0.5) == 50
+    assert percentile(values, 0.95) == 95
+    assert percentile([7], 0.95) == 7
+    assert percentile([], 0.5) == 0
+
+
+def test_summary_per_endpoint():
+    recorder = RequestRecorder()
+    for name, latency in (('First', 0.1), ('Second', 0.3), ('Third', 0.2)):
+        recorder.record('GET', 'go/api/pipelines/{0}/status'.format(name), 200, latency, size=10)
+    recorder.record('GET', 'go/api/config/pipeline_groups', 200, 0.05, size=1000)
+
+    status, groups = recorder.summary()
+
+    assert status == dict(method='GET', template='go/api/pipelines/:pipeline/status', count=3,
+                          p50=0.2, p95=0.3, max=0.3, total=pytest.approx(0.6), bytes=30)
+    assert groups['count'] == 1
+    assert groups['bytes'] == 1000
+
+
+def test_report_writes_the_summary_and_the_trace(tmpdir):
+    recorder = RequestRecorder()
+    recorder.record('POST', 'go/api/pipelines/Simple/schedule', 202, 0.25, size=5)
+    out = StringIO()
+    trace_path = str(tmpdir.join('trace.json'))
+
+    report(recorder, trace_path=trace_path, out=out)
+
+    lines = out.getvalue().splitlines()
+    assert lines[0] == 'HTTP requests: 1, 5 bytes received'
+    assert lines[2].split() == ['POST', 'go/api/pipelines/:pipeline/schedule', '1',
+                                '250.0', '250.0', '250.0', '5']
+    with open(trace_path) as fp:
+        (record,) = json.load(fp)['requests']
+    assert record['status'] == 202
+    assert record['path'] == 'go/api/pipelines/Simple/schedule'
+
+
+def test_server_records_every_request(http_server):
+    http_server.responses['/go/api/pipelines/Simple/status'] = [(200, {}, dict(paused=False))]
+    recorder = RequestRecorder()
+    server = Server(http_server.url, recorder=recorder)
+
+    assert server.pipeline('Simple').status()['paused'] is False
+    assert not server.pipeline('Missing').status()
+
+    ok, missing = recorder.records
+    assert (ok['method'], ok['status'], ok['size']) == ('GET', 200, len('{"paused": false}'))
+    assert ok['template'] == 'go/api/pipelines/:pipeline/status'
+    assert ok['latency'] > 0
+    assert (missing['status'], missing['path']) == (404, 'go/api/pipelines/Missing/status')
@@ -0,0 +1,236 @@
+import json
+import socket
+import time
+from urllib2 import HTTPError
+
+import pytest
+from mock import MagicMock
+
+from gocd_cli import multiplex
+from gocd_cli.commands.pipeline import CheckAll, List
+from gocd_cli.instrumentation import RequestRecorder
+from gocd_cli.multiplex import MultiplexClient, _ResponseParser
+from gocd_cli.ratelimit import Governor
+from gocd_cli.server import Server
+
+NAMES = ['pipeline-{0}'.format(i) for i in range(20)]
+
+
+class TestMultiplexClient(object):
+    @pytest.fixture(autouse=True)
+    def setup(self, http_server):
+        self.http_server = http_server
+        for name in NAMES:
+            http_server.responses['/go/api/pipelines/{0}/status'.format(name)] = [
+                (200, {}, dict(paused=False, name=name))]
+        self.server = Server(http_server.url, user='admin', password='badger')
+
+    def test_results_are_in_order(self):
+        client = MultiplexClient(self.server, max_in_flight=5)
+
+        results = list(client.map(multiplex.status(name, key=name) for name in NAMES))
+
+        assert [call.key for call, _, _ in results] == NAMES
+        assert [response['name'] for _, response, _ in results] == NAMES
+        assert all(response.is_ok and error is None for _, response, error in results)
+
+    def test_connections_are_kept_open_and_reused(self):
+        client = MultiplexClient(self.server, max_in_flight=5)
+        list(client.map(multiplex.status(name) for name in NAMES))
+        list(client.map(multiplex.status(name) for name in NAMES))
+
+        assert len(self.http_server.requests) == 40
+        assert self.http_server.connections <= 5
+
+    def test_governor_limits_the_requests(self):
+        self.server.governor = Governor(max_in_flight=2)
+        self.http_server.responses['/go/api/pipelines/pipeline-0/status'] = [
+            (503, {'Retry-After': '1'}, '')]
+        client = MultiplexClient(self.server, max_in_flight=10)
+
+        started_at = time.time()
+        results = list(client.map(multiplex.status(name) for name in NAMES))
+
+        assert self.http_server.connections <= 2
+        assert results[0][1].status_code == 503
+        assert all(response for _, response, _ in results[1:])
+        assert time.time() - started_at >= 0.9
+
+    def test_unordered_gives_every_result(self):
+        client = MultiplexClient(self.server, max_in_flight=20)
+
+        results = client.map((multiplex.status(name, key=name) for name in NAMES), ordered=False)
+
+        assert sorted(call.key for call, _, _ in results) == sorted(NAMES)
+
+    def test_requests_are_authenticated_and_posts_confirmed(self):
+        self.http_server.responses['/go/api/pipelines/Simple/schedule'] = [(202, {}, 'OK')]
+        client = MultiplexClient(self.server)
+
+        [(_, response, _)] = client.map([multiplex.schedule('Simple')])
+
+        assert response.is_ok
+        method, path, headers = self.http_server.requests[0]
+        assert (method, path) == ('POST', '/go/api/pipelines/Simple/schedule')
+        assert headers['authorization'] == 'Basic YWRtaW46YmFkZ2Vy'
+        assert headers['confirm'] == 'True'
+
+    def test_error_responses_are_returned(self):
+        client = MultiplexClient(self.server)
+
+        [(_, response, error)] = client.map([multiplex.status('Missing')])
+
+        assert error is None
+        assert response.status_code == 404
+        assert not response
+
+    def test_requests_are_recorded(self):
+        self.server.recorder = RequestRecorder()
+        client = MultiplexClient(self.server)
+        list(client.map(multiplex.status(name) for name in NAMES[:3]))
+
+        assert [record['template'] for record in self.server.recorder.records] == [
+            'go/api/pipelines/:pipeline/status'] * 3
+        assert all(record['size'] > 0 for record in self.server.recorder.records)
+
+    def test_connection_errors_are_returned(self):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        port = listener.getsockname()[1]
+        listener.close()
+        client = MultiplexClient(Server('http://127.0.0.1:{0}/'.format(port)))
+
+        [(_, response, error)] = client.map([multiplex.status('Simple')])
+
+        assert response is None
+        assert isinstance(error, socket.error)
+
+    def test_requests_time_out(self):
+        listener = socket.socket()
+        listener.bind(('127.0.0.1', 0))
+        listener.listen(1)
+        client = MultiplexClient(
+            Server('http://127.0.0.1:{0}/'.format(listener.getsockname()[1])), timeout=0.2)
+
+        [(_, response, error)] = client.map([multiplex.status('Simple')])
+        listener.close()
+
+        assert isinstance(error, socket.timeout)
+
+    def test_console_output_in_job_order(self):
+        instance = dict(counter=3, stages=[
+            dict(name='build', counter='1', jobs=[
+                dict(name='compile', result='Passed'),
+                dict(name='test', result='Failed'),
+                dict(name='lint', result='Unknown'),
+            ]),
+        ])
+        for job in ('compile', 'test'):
+            self.http_server.responses[
+                '/go/files/Simple/3/build/1/{0}/cruise-output/console.log'.format(job)
+            ] = [(200, {'Content-Type': 'text/plain'}, 'output of {0}'.format(job))]
+
+        output = list(multiplex.console_output(MultiplexClient(self.server), 'Simple', instance))
+
+        assert [(metadata['job'], metadata['job_result'], log.read())
+                for metadata, log in output] == [
+            ('compile', 'Passed', 'output of compile'),
+            ('test', 'Failed', 'output of test'),
+        ]
+
+    def test_console_output_raises_on_errors(self):
+        instance = dict(counter=3, stages=[
+            dict(name='build', counter='1', jobs=[dict(name='compile', result='Passed')]),
+        ])
+        path = '/go/files/Simple/3/build/1/compile/cruise-output/console.log'
+        self.http_server.responses[path] = [
+            (500, {'Content-Type': 'text/html'}, '<html>Internal error</html>'),
+        ]
+
+        with pytest.raises(HTTPError) as exc:
+            list(multiplex.console_output(MultiplexClient(self.server), 'Simple', instance))
+
+        assert exc.value.code == 500
+
+
+class TestResponseParser(object):
+    def _feed(self, parser, data, size=7):
+        return [parser.feed(data[i:i + size]) for i in range(0, len(data), size)][-1]
+
+    def test_content_length(self):
+        parser = _ResponseParser('GET')
+
+        assert self._feed(parser, 'HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello')
+        assert (parser.status, ''.join(parser.body), parser.will_close) == (200, 'hello', False)
+
+    def test_chunked(self):
+        parser = _ResponseParser('GET')
+        response = ('HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+                    '5\r\nhello\r\n7;ext=1\r\n, world\r\n0\r\nX-Trailer: 1\r\n\r\n')
+
+        assert self._feed(parser, response, size=3)
+        assert ''.join(parser.body) == 'hello, world'
+
+    def test_body_until_the_connection_closes(self):
+        parser = _ResponseParser('GET')
+
+        assert not self._feed(parser, 'HTTP/1.0 200 OK\r\n\r\nhello')
+        assert parser.feed_eof()
+        assert (''.join(parser.body), parser.will_close) == ('hello', True)
+
+    def test_not_modified_has_no_body(self):
+        parser = _ResponseParser('GET')
+
+        assert parser.feed('HTTP/1.1 304 Not Modified\r\nETag: "1"\r\n\r\n')
+        assert parser.headers['etag'] == '"1"'
+
+    def test_continue_is_skipped(self):
+        parser = _ResponseParser('POST')
+
+        assert parser.feed('HTTP/1.1 100 Continue\r\n\r\nHTTP/1.1 202 Accepted\r\n'
+                           'Content-Length: 0\r\n\r\n')
+        assert parser.status == 202
+
+    def test_incomplete_response(self):
+        parser = _ResponseParser('GET')
+        parser.feed('HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhel')
+
+        assert not parser.feed_eof()
+
+
+class TestMultiplexedCommands(object):
+    @pytest.fixture(autouse=True)
+    def setup(self, http_server, monkeypatch):
+        self.http_server = http_server
+        http_server.responses['/go/api/config/pipeline_groups'] = [(200, {}, [
+            dict(name='First', pipelines=[dict(name=name) for name in ('Green', 'Red')])])]
+        for name, result in (('Green', 'Passed'), ('Red', 'Failed')):
+            http_server.responses['/go/api/pipelines/{0}/status'.format(name)] = [
+                (200, {}, dict(paused=False, locked=False))]
+            http_server.responses['/go/api/pipelines/{0}/history/0'.format(name)] = [
+                (200, {}, dict(pipelines=[dict(counter=2, stages=[dict(
+                    name='stage', result=result, scheduled=True,
+                    jobs=[dict(state='Completed', scheduled_date=0)],
+                )])]))]
+        self.server = Server(http_server.url)
+        monkeypatch.setattr(
+            'gocd_cli.commands.pipeline.get_settings',
+            lambda section: MagicMock(get=lambda key: None)
+        )
+
+    def test_list(self, capsys):
+        List(self.server, backend='multiplex', concurrency=10, format='ndjson').run()
+        out, _ = capsys.readouterr()
+
+        assert [json.loads(line) for line in out.splitlines()] == [
+            dict(pipeline='Green', paused=False, locked=False),
+            dict(pipeline='Red', paused=False, locked=False),
+        ]
+
+    def test_check_all_gives_the_same_result_as_threads(self):
+        multiplexed = CheckAll(self.server, backend='multiplex', concurrency=10).run()
+        threads = CheckAll(self.server, concurrency=2).run()
+
+        assert multiplexed == threads
+        assert multiplexed['exit_code'] == 2
+        assert multiplexed['output'].startswith('CRITICAL: Pipeline "Red" failed')
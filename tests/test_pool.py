@@ -0,0 +1,94 @@
+import time
+import urllib2
+
+import pytest
+from mock import MagicMock
+
+from gocd_cli.pool import ConnectionPool, KeepAliveHTTPHandler
+
+
+class TestConnectionPool(object):
+    def test_returns_none_when_empty(self):
+        assert ConnectionPool().get('host') is None
+
+    def test_reuses_connections(self):
+        pool = ConnectionPool()
+        conn = MagicMock()
+        pool.put('host', conn)
+
+        assert pool.get('host') is conn
+        assert pool.get('host') is None
+
+    def test_closes_connections_that_dont_fit(self):
+        pool = ConnectionPool(size=1)
+        first, second = MagicMock(), MagicMock()
+        pool.put('host', first)
+        pool.put('host', second)
+
+        assert second.close.called
+        assert not first.close.called
+
+    def test_closes_connections_that_have_been_idle_too_long(self):
+        pool = ConnectionPool(idle_timeout=0.01)
+        conn = MagicMock()
+        pool.put('host', conn)
+        time.sleep(0.02)
+
+        assert pool.get('host') is None
+        assert conn.close.called
+
+    def test_close_closes_everything(self):
+        pool = ConnectionPool()
+        conn = MagicMock()
+        pool.put('host', conn)
+        pool.close()
+
+        assert conn.close.called
+        assert pool.get('host') is None
+
+
+class TestKeepAliveHTTPHandler(object):
+    @pytest.fixture(autouse=True)
+    def setup(self, http_server):
+        self.server = http_server
+        self.server.responses['/hello'] = [(200, {}, 'Hello there')]
+        self.pool = ConnectionPool()
+        self.opener = urllib2.build_opener(KeepAliveHTTPHandler(self.pool))
+
+    def test_reuses_the_connection_once_the_response_is_read(self):
+        for _ in range(3):
+            assert self.opener.open(self.server.url + 'hello').read() == 'Hello there'
+
+        assert self.server.connections == 1
+
+    def test_doesnt_reuse_a_connection_with_an_unread_response(self):
+        first = self.opener.open(self.server.url + 'hello')
+        assert self.opener.open(self.server.url + 'hello').read() == 'Hello there'
+        first.close()
+
+        assert self.server.connections == 2
+
+    def test_reads_in_chunks(self):
+        response = self.opener.open(self.server.url + 'hello')
+
+        assert response.read(5) == 'Hello'
+        assert response.read() == ' there'
+        assert response.code == 200
+
+    def test_error_responses_are_raised_and_readable(self):
+        self.server.responses['/missing'] = [(404, {}, 'Not here')]
+
+        with pytest.raises(urllib2.HTTPError) as exc:
+            self.opener.open(self.server.url + 'missing')
+
+        assert exc.value.code == 404
+        assert exc.value.read() == 'Not here'
+        assert self.opener.open(self.server.url + 'hello').read() == 'Hello there'
+        assert self.server.connections == 1
+
+    def test_reconnects_when_an_idle_connection_was_closed(self):
+        self.opener.open(self.server.url + 'hello').read()
+        key, = self.pool._idle.keys()
+        self.pool._idle[key][0][0].sock.close()
+
+        assert self.opener.open(self.server.url + 'hello').read() == 'Hello there'
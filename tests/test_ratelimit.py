@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+from gocd_cli.ratelimit import Governor, TokenBucket, parse_retry_after
+from gocd_cli.utils import run_concurrently
+
+
+def test_waits_for_tokens_once_the_burst_is_used(monkeypatch):
+    now = [1000.0]
+    slept = []
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    monkeypatch.setattr(time, 'sleep', lambda seconds: slept.append(seconds))
+    bucket = TokenBucket(rate=2, burst=2)
+
+    assert [bucket.acquire() for _ in range(4)] == [0, 0, 0.5, 1.0]
+
+    now[0] += 10  # The debt is paid and the bucket refilled, but no more than the burst
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, 0.5]
+    assert slept == [0.5, 1.0, 0.5]
+
+
+def test_no_limit():
+    assert TokenBucket(rate=0).acquire() == 0
+
+
+def test_try_acquire_doesnt_wait(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(time, 'time', lambda: now[0])
+    bucket = TokenBucket(rate=2)
+
+    assert bucket.try_acquire() == 0
+    assert bucket.try_acquire() == 0.5
+    now[0] += 0.5
+    assert bucket.try_acquire() == 0
+
+
+def test_parse_retry_after(monkeypatch):
+    monkeypatch.setattr(time, 'time', lambda: 1462180000.0)  # Mon, 02 May 2016 09:06:40 GMT
+
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after('Mon, 02 May 2016 09:07:00 GMT') == 20
+    assert parse_retry_after('Mon, 02 May 2016 09:00:00 GMT') == 0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+class TestGovernor(object):
+    @pytest.fixture(autouse=True)
+    def clock(self, monkeypatch):
+        self.now = [1000.0]
+        self.slept = []
+
+        def sleep(seconds):
+            self.slept.append(seconds)
+            self.now[0] += seconds
+
+        monkeypatch.setattr(time, 'time', lambda: self.now[0])
+        monkeypatch.setattr(time, 'sleep', sleep)
+
+    def test_requests_wait_for_retry_after(self):
+        governor = Governor()
+
+        assert governor.record(503, '5') == 5
+        assert governor.try_acquire() == 5
+        with governor.request():
+            pass
+
+        assert self.slept == [5]
+        assert governor.try_acquire() == 0
+
+    def test_throttled_responses_without_retry_after_back_off(self):
+        governor = Governor(max_pause=3)
+
+        assert [governor.record(503) for _ in range(4)] == [1, 2, 3, 3]
+        assert governor.record(200) == 0
+        assert governor.record(429) == 1
+
+    def test_retry_after_is_capped(self):
+        assert Governor(max_pause=10).record(503, '3600') == 10
+
+    def test_max_in_flight(self, monkeypatch):
+        monkeypatch.undo()
+        governor = Governor(max_in_flight=2)
+        lock = threading.Lock()
+        in_flight = [0, 0]  # current, max
+
+        def request(_):
+            with governor.request():
+                with lock:
+                    in_flight[0] += 1
+                    in_flight[1] = max(in_flight)
+                time.sleep(0.01)
+                with lock:
+                    in_flight[0] -= 1
+
+        list(run_concurrently(request, range(10), concurrency=5))
+
+        assert in_flight[1] == 2
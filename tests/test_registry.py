@@ -0,0 +1,99 @@
+import json
+
+import pytest
+
+import gocd_cli.utils
+from gocd_cli import registry
+
+
+class EntryPoint(object):
+    def __init__(self, name, module_name):
+        self.name = name
+        self.module_name = module_name
+        self.dist = 'gocd-cli-plugin 1.0'
+
+
+@pytest.fixture
+def manifest_path(tmpdir):
+    return str(tmpdir.join('cache', 'commands.json'))
+
+
+@pytest.fixture
+def plugin(monkeypatch):
+    entry_points = [EntryPoint('plugged', 'gocd_cli.commands.settings')]
+    monkeypatch.setattr(registry, 'list_command_entry_points', lambda: entry_points)
+
+    return entry_points
+
+
+def test_manifest_describes_all_subcommands():
+    pipeline = registry.find_command(registry.build_manifest(), 'pipeline')
+
+    assert pipeline['module'] == 'gocd_cli.commands.pipeline'
+    check = pipeline['subcommands'][0]
+    assert check['name'] == 'check'
+    assert check['summary'] == 'Check whether a pipeline has run successfully'
+    assert check['usage'].startswith('check <name> [--ran-after]')
+
+
+def test_find_subcommand():
+    manifest = registry.build_manifest()
+
+    assert registry.find_command(manifest, 'pipeline', 'check-all')['class_name'] == 'CheckAll'
+    assert registry.find_command(manifest, 'pipeline', 'no-such-command') is None
+    assert registry.find_command(manifest, 'no-such-module') is None
+
+
+def test_manifest_is_cached_until_commands_change(manifest_path, monkeypatch):
+    registry.get_manifest(manifest_path)
+    monkeypatch.setattr(registry, 'build_manifest', lambda: pytest.fail('rebuilt the manifest'))
+
+    assert registry.find_command(registry.get_manifest(manifest_path), 'pipeline')
+
+    monkeypatch.setattr(registry, 'fingerprint', lambda: 'changed')
+    with pytest.raises(pytest.fail.Exception):
+        registry.get_manifest(manifest_path)
+
+
+def test_unwritable_manifest_is_rebuilt(tmpdir):
+    path = tmpdir.join('file')
+    path.write('')
+
+    manifest = registry.get_manifest(str(path.join('commands.json')))
+
+    assert registry.find_command(manifest, 'pipeline')
+
+
+def test_corrupt_manifest_is_rebuilt(manifest_path):
+    registry.get_manifest(manifest_path)
+    with open(manifest_path, 'w') as fp:
+        fp.write('{not json')
+
+    assert registry.find_command(registry.get_manifest(manifest_path), 'pipeline')
+    with open(manifest_path) as fp:
+        assert json.load(fp)['fingerprint'] == registry.fingerprint()
+
+
+def test_commands_registered_through_entry_points(plugin):
+    manifest = registry.build_manifest()
+    plugged = registry.find_command(manifest, 'plugged')
+
+    assert plugged['module'] == 'gocd_cli.commands.settings'
+    assert [cmd['name'] for cmd in plugged['subcommands']] == ['decrypt', 'encrypt']
+
+
+def test_installing_a_plugin_changes_the_fingerprint(monkeypatch):
+    before = registry.fingerprint()
+    monkeypatch.setattr(registry, 'list_command_entry_points',
+                        lambda: [EntryPoint('plugged', 'some.module')])
+
+    assert registry.fingerprint() != before
+
+
+def test_get_command_module_from_entry_point(monkeypatch):
+    monkeypatch.setattr(
+        'pkg_resources.iter_entry_points',
+        lambda group, name: [EntryPoint('plugged', 'gocd_cli.commands.settings')],
+    )
+
+    assert gocd_cli.utils.get_command_module('plugged').__name__ == 'gocd_cli.commands.settings'
@@ -0,0 +1,214 @@
+import socket
+from StringIO import StringIO
+from urllib2 import HTTPError
+
+import pytest
+from mock import MagicMock
+
+from gocd_cli import multiplex
+from gocd_cli.commands.pipeline import Check, CheckAll
+from gocd_cli.multiplex import MultiplexClient
+from gocd_cli.retry import (
+    CircuitBreaker,
+    CircuitOpenError,
+    Retrier,
+    backoff_intervals,
+    is_transient,
+)
+from gocd_cli.server import Server
+
+
+def http_error(code):
+    return HTTPError('http://go.cd/', code, 'Error', {}, StringIO(''))
+
+
+def failing(*outcomes):
+    """A request that raises or returns each of `outcomes` in turn"""
+    outcomes = list(outcomes)
+    calls = []
+
+    def request():
+        calls.append(1)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    request.calls = calls
+    return request
+
+
+@pytest.fixture
+def slept(monkeypatch):
+    slept = []
+    monkeypatch.setattr('gocd_cli.retry.time.sleep', slept.append)
+    return slept
+
+
+def test_backoff_intervals_grow_until_the_maximum():
+    intervals = backoff_intervals(initial=1, factor=2, maximum=5, jitter=0)
+
+    assert [next(intervals) for _ in range(5)] == [1, 2, 4, 5, 5]
+
+
+def test_backoff_intervals_are_jittered_within_bounds():
+    intervals = backoff_intervals(initial=2, factor=1, maximum=10, jitter=0.5)
+
+    for interval in (next(intervals) for _ in range(50)):
+        assert 1 <= interval <= 3
+
+
+def test_transient_failures():
+    assert is_transient(http_error(502))
+    assert is_transient(http_error(504))
+    assert is_transient(socket.error(111, 'Connection refused'))
+    assert not is_transient(http_error(404))
+    assert not is_transient(ValueError('No JSON object could be decoded'))
+
+
+class TestRetrier(object):
+    def test_retries_with_growing_intervals(self, slept):
+        request = failing(http_error(502), socket.timeout('timed out'), 'response')
+
+        assert Retrier(retries=2, backoff=1).call(request) == 'response'
+        assert len(slept) == 2
+        assert 0.5 <= slept[0] <= 1.5 and 1 <= slept[1] <= 3
+
+    def test_gives_up_after_the_retries(self, slept):
+        request = failing(http_error(503), http_error(503), http_error(502))
+
+        with pytest.raises(HTTPError) as exc:
+            Retrier(retries=2).call(request)
+
+        assert exc.value.code == 502
+        assert len(request.calls) == 3
+
+    def test_doesnt_retry_what_a_retry_wont_fix(self, slept):
+        request = failing(http_error(404))
+
+        with pytest.raises(HTTPError):
+            Retrier(retries=2).call(request)
+
+        assert len(request.calls) == 1
+
+    def test_doesnt_retry_requests_that_arent_idempotent(self, slept):
+        request = failing(http_error(502))
+
+        with pytest.raises(HTTPError):
+            Retrier(retries=2).call(request, idempotent=False)
+
+        assert len(request.calls) == 1
+
+
+class TestCircuitBreaker(object):
+    def test_fails_fast_once_open(self, slept):
+        breaker = CircuitBreaker(threshold=3, reset_timeout=30)
+        retrier = Retrier(retries=5, breaker=breaker)
+        request = failing(*[http_error(502)] * 6)
+
+        with pytest.raises(CircuitOpenError):
+            retrier.call(request)
+        with pytest.raises(CircuitOpenError):
+            retrier.call(request)
+
+        assert len(request.calls) == 3
+        assert breaker.is_open
+
+    def test_tries_again_after_the_reset_timeout(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr('gocd_cli.retry.time.time', lambda: now[0])
+        breaker = CircuitBreaker(threshold=1, reset_timeout=30)
+        breaker.failed()
+
+        now[0] += 30
+        breaker.before()  # The one request trying whether the server is back
+        with pytest.raises(CircuitOpenError):
+            breaker.before()
+
+        breaker.failed()
+        with pytest.raises(CircuitOpenError):
+            breaker.before()
+
+        now[0] += 30
+        breaker.before()
+        breaker.succeeded()
+        breaker.before()
+        assert not breaker.is_open
+
+    def test_answers_close_it(self):
+        breaker = CircuitBreaker(threshold=2)
+        retrier = Retrier(retries=0, breaker=breaker)
+
+        for outcome in (http_error(502), http_error(404), http_error(502)):
+            with pytest.raises(HTTPError):
+                retrier.call(failing(outcome))
+
+        assert not breaker.is_open
+
+
+class TestServerRetries(object):
+    @pytest.fixture(autouse=True)
+    def setup(self, http_server, slept):
+        self.http_server = http_server
+        self.server = Server(http_server.url, retrier=Retrier(retries=2))
+
+    def test_gets_are_retried(self):
+        self.http_server.responses['/go/api/pipelines/Simple/status'] = [
+            (502, {}, 'Bad Gateway'),
+            (200, {}, dict(paused=False)),
+        ]
+
+        assert self.server.pipeline('Simple').status()
+        assert len(self.http_server.requests) == 2
+
+    def test_posts_arent_retried(self):
+        self.http_server.responses['/go/api/pipelines/Simple/schedule'] = [
+            (502, {}, 'Bad Gateway'),
+            (202, {}, ''),
+        ]
+
+        assert self.server.pipeline('Simple').schedule().status_code == 502
+        assert len(self.http_server.requests) == 1
+
+    def test_multiplexed_gets_are_retried(self, monkeypatch):
+        monkeypatch.setattr(self.server.retrier, 'interval', lambda retry: 0.01)
+        self.http_server.responses['/go/api/pipelines/Simple/status'] = [
+            (504, {}, 'Gateway Timeout'),
+            (200, {}, dict(paused=False)),
+        ]
+        client = MultiplexClient(self.server)
+
+        [(_, response, error)] = client.map([multiplex.status('Simple')])
+
+        assert response and error is None
+        assert len(self.http_server.requests) == 2
+
+    def test_checks_are_critical_once_open(self, monkeypatch):
+        monkeypatch.setattr(
+            'gocd_cli.commands.pipeline.get_settings',
+            lambda section: MagicMock(get=lambda key: None)
+        )
+        breaker = CircuitBreaker(threshold=1)
+        breaker.failed()
+        self.server.retrier = Retrier(retries=0, breaker=breaker)
+
+        check = Check(self.server, 'Simple').run()
+        check_all = CheckAll(self.server).run()
+
+        assert check['exit_code'] == check_all['exit_code'] == 2
+        assert check['output'].startswith(
+            'CRITICAL: The Go server is unavailable, the Go server failed 1 times in a row'
+        )
+        assert check_all['output'] == check['output']
+        assert self.http_server.requests == []
+
+    def test_multiplexed_calls_fail_fast_once_open(self):
+        self.server.retrier = Retrier(retries=0, breaker=CircuitBreaker(threshold=2))
+        self.http_server.responses['/go/api/pipelines/Simple/status'] = [(502, {}, '')]
+        client = MultiplexClient(self.server, max_in_flight=1)
+
+        results = list(client.map(multiplex.status('Simple') for _ in range(4)))
+
+        assert [response.status_code for _, response, _ in results[:2]] == [502, 502]
+        assert all(isinstance(error, CircuitOpenError) for _, _, error in results[2:])
+        assert len(self.http_server.requests) == 2
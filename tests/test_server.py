@@ -0,0 +1,48 @@
+import base64
+
+from gocd_cli.ratelimit import Governor
+from gocd_cli.server import Server
+
+
+def test_pipeline_calls_share_one_connection(http_server):
+    http_server.responses['/go/api/pipelines/Simple/status'] = [
+        (200, {}, dict(locked=False, paused=False, schedulable=True)),
+    ]
+    server = Server(http_server.url)
+
+    for _ in range(3):
+        assert server.pipeline('Simple').status()['schedulable']
+
+    assert http_server.connections == 1
+
+
+def test_credentials_are_sent_without_a_challenge(http_server):
+    http_server.responses['/go/api/pipelines/Simple/status'] = [(200, {}, dict(locked=False))]
+    server = Server(http_server.url, user='admin', password='badger')
+    server.pipeline('Simple').status()
+
+    (_, _, headers), = http_server.requests
+    assert headers['authorization'] == 'Basic {0}'.format(base64.b64encode('admin:badger'))
+
+
+def test_error_responses(http_server):
+    server = Server(http_server.url)
+    response = server.pipeline('Missing').status()
+
+    assert response.status_code == 404
+    assert not response
+
+
+def test_requests_pause_when_the_server_is_overloaded(http_server, monkeypatch):
+    slept = []
+    monkeypatch.setattr('gocd_cli.ratelimit.time.sleep', slept.append)
+    http_server.responses['/go/api/pipelines/Simple/status'] = [
+        (503, {'Retry-After': '7'}, ''),
+        (200, {}, dict(locked=False)),
+    ]
+    server = Server(http_server.url, governor=Governor())
+
+    assert server.pipeline('Simple').status().status_code == 503
+    assert server.pipeline('Simple').status()
+
+    assert len(slept) == 1 and 6 < slept[0] <= 7
@@ -1,5 +1,7 @@
 import os
 import pwd
+import sys
+import time
 
 import pytest
 from mock import MagicMock, patch
@@ -56,6 +58,19 @@ def test_format_arguments():
     }
 
 
+def test_split_global_options():
+    options, args = gocd_cli.utils.split_global_options([
+        '--no-cache',
+        '--trace-file=out.json',
+        'pipeline',
+        'list',
+        '--concurrency=2',
+    ])
+
+    assert options == dict(no_cache=True, trace_file='out.json')
+    assert args == ['pipeline', 'list', '--concurrency=2']
+
+
 def test_get_command_successfully_sets_all_args(args):
     go_server = Server('http://localhost:8153')
     command = gocd_cli.utils.get_command(go_server, *args)
@@ -81,6 +96,60 @@ def test_get_command_raises_reasonable_errors(go_server):
     assert '__init__() takes at least 3 arguments (2 given)' in str(exc)
 
 
+class TestRunConcurrently(object):
+    def test_sequential_when_concurrency_is_one(self):
+        results = gocd_cli.utils.run_concurrently(lambda x: x * 2, [1, 2, 3])
+
+        assert list(results) == [2, 4, 6]
+
+    def test_keeps_the_order_of_the_items(self):
+        def slow_first(x):
+            time.sleep(0.05 if x == 1 else 0)
+            return x
+
+        results = gocd_cli.utils.run_concurrently(slow_first, [1, 2, 3], concurrency=3)
+
+        assert list(results) == [1, 2, 3]
+
+    def test_yields_in_completion_order_when_unordered(self):
+        def slow_first(x):
+            time.sleep(0.2 if x == 1 else 0)
+            return x
+
+        results = gocd_cli.utils.run_concurrently(
+            slow_first, [1, 2, 3], concurrency=3, ordered=False
+        )
+
+        assert list(results)[-1] == 1
+
+    def test_raises_exceptions_from_the_workers(self):
+        def fail(x):
+            raise ValueError(x)
+
+        with pytest.raises(ValueError):
+            list(gocd_cli.utils.run_concurrently(fail, [1, 2], concurrency=2))
+
+
+def test_capture_output_restores_stdout(monkeypatch):
+    stdout = MagicMock()
+    monkeypatch.setattr('sys.stdout', stdout)
+
+    with gocd_cli.utils.capture_output() as outer:
+        with gocd_cli.utils.capture_output() as inner:
+            sys.stdout.write('inner')
+        sys.stdout.write('outer')
+        assert sys.stdout is not stdout
+
+    assert sys.stdout is stdout
+    assert (outer.getvalue(), inner.getvalue()) == ('outer', 'inner')
+    assert not stdout.write.called
+
+
+def test_system_exit_code():
+    for code, exit_code in ((None, 0), (0, 0), (2, 2), ('Failed', 1)):
+        assert gocd_cli.utils.system_exit_code(SystemExit(code)) == exit_code
+
+
 class TestIsFileReadable(object):
     def test_normal_file(self):
         assert gocd_cli.utils.is_file_readable(support_path())
@@ -141,6 +210,23 @@ class TestGetSettings(object):
 
         assert settings.get('server') is None
 
+    def test_cache_can_be_turned_off(self, monkeypatch):
+        monkeypatch.setenv('GOCD_CACHE', 'false')
+        settings = gocd_cli.utils.get_settings(settings_paths=support_path())
+
+        assert gocd_cli.utils.get_response_cache(settings) is None
+        assert gocd_cli.utils.get_go_server(settings).cache is None
+
+    def test_cache_ttls_from_settings(self, monkeypatch):
+        monkeypatch.delenv('GOCD_CACHE', raising=False)
+        monkeypatch.setenv('GOCD_CACHE_PIPELINE_GROUPS_TTL', '10')
+        settings = gocd_cli.utils.get_settings(settings_paths=support_path())
+        server = gocd_cli.utils.get_go_server(settings, refresh=True)
+
+        assert server.cache.ttl('go/api/config/pipeline_groups') == 10
+        assert server.cache.refresh
+        assert gocd_cli.utils.get_go_server(settings, no_cache=True).cache is None
+
     def test_prefer_environment_variable(self, monkeypatch):
         monkeypatch.setenv('GOCD_SERVER', 'http://go.cd')
         settings = gocd_cli.utils.get_settings(settings_paths=support_path())
@@ -167,6 +253,24 @@ class TestGetGoServer(object):
         assert go_server.host == settings.get('server')
         assert go_server.user == settings.get('user')
 
+    def test_records_requests_when_profiling(self):
+        settings = gocd_cli.utils.get_settings(settings_paths=support_path())
+
+        assert gocd_cli.utils.get_go_server(settings).recorder is None
+        assert gocd_cli.utils.get_go_server(settings, profile_http=True).recorder.records == []
+
+    def test_retries_from_settings(self, monkeypatch):
+        settings = gocd_cli.utils.get_settings(settings_paths=support_path())
+        retrier = gocd_cli.utils.get_go_server(settings).retrier
+
+        assert (retrier.retries, retrier.breaker.threshold) == (2, 5)
+
+        monkeypatch.setenv('GOCD_RETRIES', '0')
+        monkeypatch.setenv('GOCD_CIRCUIT_BREAKER_THRESHOLD', '0')
+        retrier = gocd_cli.utils.get_go_server(settings).retrier
+
+        assert (retrier.retries, retrier.breaker) == (0, None)
+
 
 class TestExpandUser(object):
     def test_path_that_doesnt_start_with_tilde_returns_path(self):